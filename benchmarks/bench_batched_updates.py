@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Benchmark of App.do_gui_update on a dashboard of 200 labels all changing at every tick.
+
+The updates are sent to a websocket handler writing on a socket pair, the other end
+is drained by a thread. The batched update (one message per tick) is compared with
+sending one message per changed widget, as done before batching.
+
+    python benchmarks/bench_batched_updates.py
+"""
+import os
+import socket
+import sys
+import threading
+import time
+import logging
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import server
+
+
+class BenchServer(object):
+    websocket_counters = server.WebSocketCounters()
+    websocket_compression_threshold = 1024
+    websocket_queue_length = 100000
+    websocket_queue_policy = 'disconnect'
+
+
+class BenchWebSocket(server.WebSocketsHandler):
+    def __init__(self, sock):
+        # the socket server machinery is bypassed, only the sending gets exercised
+        self.server = BenchServer()
+        self.request = sock
+        self.client_address = ('bench', 0)
+        self.handshake_done = True
+        self.raw_payload = True
+        self.counters = server.WebSocketCounters()
+        self._send_lock = threading.Lock()
+        self._log = logging.getLogger('remi.server.ws')
+        self.sent = 0
+        self._create_outbound_queue()
+        self.writer = threading.Thread(target=self._write_outbound_messages)
+        self.writer.start()
+
+    def send_message(self, message):
+        self.sent += 1
+        return server.WebSocketsHandler.send_message(self, message)
+
+
+class PerWidgetApp(server.App):
+    def _send_spontaneous_websocket_message(self, message, payload=None):
+        if message == server._MSG_BATCH:
+            # unpacks the batch, as the messages were sent before batching
+            import json
+            for msg_type, __id, content in json.loads(payload):
+                if msg_type == server._MSG_PATCH:
+                    content = json.dumps(content)
+                server.App._send_spontaneous_websocket_message(self, msg_type + __id + ',', content)
+            return
+        server.App._send_spontaneous_websocket_message(self, message, payload)
+
+
+def drain(sock):
+    while sock.recv(1 << 20):
+        pass
+
+
+def run(app_class, ticks):
+    a, b = socket.socketpair()
+    threading.Thread(target=drain, args=(b,), daemon=True).start()
+    app = app_class.__new__(app_class)
+    app.update_lock = threading.RLock()
+    app._dirty_widgets = {}
+    app._dirty_lock = threading.Lock()
+    app.update_interval = 1
+    app.page = gui.HTML()
+    app.page.add_child('body', gui.BODY())
+    ws = BenchWebSocket(a)
+    app.websockets = set([ws])
+    labels = [gui.Label('0') for i in range(200)]
+    app.set_root_widget(gui.VBox(children=labels))
+    t = time.time()
+    for tick in range(ticks):
+        for label in labels:
+            label.set_text(str(tick))
+        app.do_gui_update()
+    # a None message stops the writer thread, once everything has been sent
+    ws.outbound_queue.put(None)
+    ws.writer.join()
+    elapsed = (time.time() - t) / ticks
+    a.close()
+    print('%-12s %6.1f messages/tick %8.2f ms/tick' % (app_class.__name__, ws.sent / float(ticks), elapsed * 1000.0))
+
+
+if __name__ == '__main__':
+    run(PerWidgetApp, 100)
+    run(server.App, 100)
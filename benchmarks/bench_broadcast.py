@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Fan out of the updates of a shared App (multiple_instance=False) to many passive viewers.
+
+For each engine a server is started in a separate process and N viewers connect to it.
+A label is changed by a callback and the time until the last viewer receives the update
+is measured. 'per client frames' builds the websocket frame for each viewer, as it was
+before the frame of a broadcast message got shared.
+
+    python benchmarks/bench_broadcast.py [viewers]
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server, server
+from bench_server_engines import http_get, WebSocketClient
+
+
+class WallboardApp(App):
+    def main(self):
+        self.labels = [gui.Label('value %s' % i) for i in range(50)]
+        button = gui.Button('bench')
+        button.identifier = 'bench'
+        button.onclick.do(self.on_tick)
+        self.tick = 0
+        return gui.VBox(children=self.labels + [button])
+
+    def on_tick(self, emitter):
+        self.tick += 1
+        for label in self.labels:
+            label.set_text('tick_%s_' % self.tick)
+        self.do_gui_update()
+
+
+def run_engine(engine, viewers_count, shared):
+    if not shared:
+        text_frame = server.WebSocketProtocol._text_frame
+        server.WebSocketProtocol._text_frame = lambda self, message: text_frame(self, str(message))
+    s = Server(WallboardApp, start=False, start_browser=False, port=0, update_interval=1, engine=engine,
+               websocket_queue_length=1000)
+    s.start()
+    port = s._sserver.socket.getsockname()[1]
+    cookie = re.search(br'remi_session=\d+', http_get(port)).group(0).decode()
+
+    viewers = []
+    for _ in range(viewers_count):
+        viewer = WebSocketClient(port, cookie)
+        viewer.send('connected')
+        viewer.recv()  # ack
+        viewers.append(viewer)
+    time.sleep(0.5)
+
+    ticks = 20
+    elapsed = []
+    for tick in range(1, ticks + 1):
+        marker = ('tick_%s_' % tick).encode()
+        t = time.time()
+        viewers[0].send('callback/bench/onclick/')
+        for viewer in viewers:
+            while not marker in viewer.recv():
+                pass
+        elapsed.append(time.time() - t)
+    elapsed.sort()
+    print('%-8s %-18s %5d viewers: last viewer updated after %7.2f ms (median of %d updates)' % (
+        engine, 'shared frame' if shared else 'per client frames', viewers_count,
+        elapsed[len(elapsed) // 2] * 1000, ticks))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3:
+        run_engine(sys.argv[1], int(sys.argv[2]), sys.argv[3] == 'shared')
+    viewers_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for engine in ('threaded', 'asyncio'):
+        for mode in ('unshared', 'shared'):
+            subprocess.call([sys.executable, os.path.abspath(__file__), engine, str(viewers_count), mode],
+                            stderr=open(os.devnull, 'w'))
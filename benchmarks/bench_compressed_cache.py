@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Bytes sent and time per request of the page and of the compressible resources,
+with the compressed cache disabled (compressed_cache_size=0) and enabled.
+
+    python benchmarks/bench_compressed_cache.py
+"""
+import http.client
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+
+
+class BenchApp(App):
+    def main(self):
+        return gui.VBox(children=[gui.Label('label %s' % i) for i in range(500)])
+
+    def log_request(self, *args):
+        pass
+
+
+def run(cache_size, repeat=100):
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=0,
+               compressed_cache_size=cache_size)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        cookie = None
+        for path in ('/', '/res:style.css', '/res:logo.svg'):
+            t = time.time()
+            for _ in range(repeat):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                headers = {'Accept-Encoding': 'gzip, deflate, br'}
+                if cookie:
+                    headers['Cookie'] = cookie
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                cookie = cookie or response.getheader('Set-Cookie').split(';')[0]
+                conn.close()
+            print('cache %8d bytes: %-15s %7d bytes sent (%-8s) %7.3f ms' % (
+                cache_size, path, len(body), response.getheader('Content-Encoding') or 'identity',
+                (time.time() - t) / repeat * 1000.0))
+        print('cache %8d bytes: %s' % (cache_size, s._sserver.compressed_cache.as_dict()))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    run(0)
+    run(4 * 1024 * 1024)
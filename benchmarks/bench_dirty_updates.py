@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Cost of App.do_gui_update on big widget trees, as a function of the changed widgets.
+
+The trees are made of 100 containers of 100 or 500 labels (10k and 50k widgets).
+For each update 1, 10 or 100 labels change. 'full walk' marks the whole tree as
+stale before the update, as the whole tree was walked before the dirty tracking.
+
+    python benchmarks/bench_dirty_updates.py
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import server
+
+
+class NullWebSocket(object):
+    raw_payload = True
+
+    def encode_payload(self, payload):
+        return payload
+
+    def send_message(self, message):
+        return True
+
+
+def make_app(containers, labels_per_container):
+    app = server.App.__new__(server.App)
+    app.update_lock = threading.RLock()
+    app._dirty_widgets = {}
+    app._dirty_lock = threading.Lock()
+    app.update_interval = 1
+    app.page = gui.HTML()
+    app.page.add_child('body', gui.BODY())
+    app.websockets = set([NullWebSocket()])
+    labels = []
+    boxes = []
+    for i in range(containers):
+        box_labels = [gui.Label('0') for _ in range(labels_per_container)]
+        labels.extend(box_labels)
+        boxes.append(gui.HBox(children=box_labels))
+    app.set_root_widget(gui.VBox(children=boxes))
+    return app, labels
+
+
+def mark_all_stale(widget):
+    widget._stale = True
+    for child in widget.children.values():
+        if isinstance(child, gui.Tag):
+            mark_all_stale(child)
+
+
+def run(app, labels, changes, full_walk, repeat=20):
+    step = len(labels) // changes
+    elapsed = 0
+    for tick in range(1, repeat + 1):
+        for label in labels[::step][:changes]:
+            label.set_text(str(tick))
+        if full_walk:
+            mark_all_stale(app.root)
+        t = time.time()
+        app.do_gui_update()
+        elapsed += time.time() - t
+    return elapsed / repeat * 1000.0
+
+
+if __name__ == '__main__':
+    for labels_per_container in (100, 500):
+        app, labels = make_app(100, labels_per_container)
+        for changes in (1, 10, 100):
+            print('%6d widgets %4d changed: dirty tracking %8.3f ms   full walk %8.3f ms' % (
+                len(labels), changes, run(app, labels, changes, False), run(app, labels, changes, True)))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Memory and time of a FileDownloader download, streamed from disk or read in memory
+as the attribute calls did before the streaming responses.
+
+The memory is the peak of the Python allocations in the server, measured by tracemalloc.
+
+    python benchmarks/bench_file_download.py
+"""
+import http.client
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+from remi.server import clients
+
+FILE_SIZE = 200 * 1024 * 1024
+
+
+class ReadFileDownloader(gui.FileDownloader):
+    def download(self):
+        f, headers = super(ReadFileDownloader, self).download()
+        with f:
+            return [f.read(), headers]
+
+
+def run(downloader_class, filename, label):
+    class BenchApp(App):
+        def main(self):
+            return downloader_class('download', filename)
+
+        def log_request(self, *args):
+            pass
+
+    # the session of the previous run would be reused
+    clients.clear()
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=0)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/')
+        page = conn.getresponse().read().decode()
+        path = page.split('download="')[1].split('href="')[1].split('"')[0]
+
+        tracemalloc.start()
+        t = time.time()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', path)
+        response = conn.getresponse()
+        received = 0
+        while True:
+            data = response.read(1024 * 1024)
+            if not data:
+                break
+            received += len(data)
+        elapsed = time.time() - t
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert received == FILE_SIZE
+        print('%-8s %d MiB download %7.1f ms, peak %8.1f MiB allocated' %
+              (label, FILE_SIZE // 1024 // 1024, elapsed * 1000.0, peak / 1024.0 / 1024.0))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    fd, filename = tempfile.mkstemp()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+    try:
+        run(ReadFileDownloader, filename, 'read')
+        run(gui.FileDownloader, filename, 'stream')
+    finally:
+        os.remove(filename)
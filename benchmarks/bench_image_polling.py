@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Frames per second of an image widget polled by the browser, as the matplotlib and PIL
+examples do: each frame is a GET of /<widget id>/get_image_data?index=N.
+
+'HTTP/1.0' is the App answering as before the persistent connections, a new connection
+per frame; 'HTTP/1.1' reuses the same connection for all the frames.
+
+    python benchmarks/bench_image_polling.py
+"""
+import http.client
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+
+FRAME_SIZE = 32 * 1024
+DURATION = 3.0
+
+FRAME = os.urandom(FRAME_SIZE)
+
+
+class PollingImage(gui.Image):
+    def get_image_data(self, index=0):
+        return FRAME, {'Content-type': 'image/jpeg'}
+
+
+class BenchApp(App):
+    def main(self):
+        return PollingImage('/res:logo.png')
+
+    def log_request(self, *args):
+        pass
+
+
+class HTTP10App(BenchApp):
+    protocol_version = 'HTTP/1.0'
+
+
+def poll(port, path, persistent):
+    frames = 0
+    conn = None
+    t = time.time()
+    while time.time() - t < DURATION:
+        if conn is None:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.request('GET', path % frames)
+        body = conn.getresponse().read()
+        assert len(body) == FRAME_SIZE
+        frames += 1
+        if not persistent:
+            conn.close()
+            conn = None
+    return frames / (time.time() - t)
+
+
+def run(app_class, engine):
+    s = Server(app_class, start=False, start_browser=False, port=0, update_interval=0, engine=engine)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.request('GET', '/')
+        page = conn.getresponse().read().decode()
+        conn.close()
+        widget_id = page.split('class="Image"')[0].rsplit('id="', 1)[1].split('"')[0]
+        fps = poll(port, '/' + widget_id + '/get_image_data?index=%d', app_class.protocol_version == 'HTTP/1.1')
+        print('%-8s %-8s %4d KiB frames %8.1f fps' % (engine, app_class.protocol_version, FRAME_SIZE // 1024, fps))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    for engine in ('threaded', 'asyncio'):
+        run(HTTP10App, engine)
+        run(BenchApp, engine)
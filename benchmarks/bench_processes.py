@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Throughput of CPU bound callbacks of different sessions, with the sessions served
+by one process or sharded among worker processes (Server(..., processes=N)).
+
+Each client opens its own session, then calls repeatedly a widget method that
+burns the CPU for a few milliseconds, through the http attribute call interface.
+
+    python benchmarks/bench_processes.py [clients] [calls per client]
+"""
+import http.client
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+
+
+class Burner(gui.Label):
+    def burn(self):
+        n = 0
+        for i in range(200000):
+            n += i
+        return (str(n), {'Content-type': 'text/plain'})
+
+
+class BenchApp(App):
+    def main(self):
+        return Burner('bench')
+
+    def log_request(self, *args):
+        pass
+
+
+def client(port, calls, results):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('GET', '/')
+    response = conn.getresponse()
+    page = response.read().decode()
+    cookie = response.getheader('Set-Cookie').split(';')[0]
+    burner = re.search(r'id="(\d+)" class="Burner"', page).group(1)
+    for _ in range(calls):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/%s/burn' % burner, headers={'Cookie': cookie})
+        response = conn.getresponse()
+        response.read()
+        results.append(response.status)
+
+
+def run(processes, clients, calls):
+    s = Server(BenchApp, start=False, start_browser=False, port=0, multiple_instance=True,
+               update_interval=0, processes=processes)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        results = []
+        threads = [threading.Thread(target=client, args=(port, calls, results)) for _ in range(clients)]
+        t = time.time()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.time() - t
+        assert results == [200] * (clients * calls), results
+        return clients * calls / elapsed
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print('%d cpu cores, %d clients x %d calls' % (os.cpu_count(), clients, calls))
+    for processes in (1, 2, 4):
+        print('processes=%d: %7.1f calls/s' % (processes, run(processes, clients, calls)))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Cost of a full page render, as done for the '/' page and for each websocket
+handshake, on wide containers where one label changed between the renders.
+
+'no cache' drops the cached fragments of the whole tree before each render,
+so that every repr is rebuilt and concatenated again.
+
+    python benchmarks/bench_render_cache.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+
+
+def make_page(width):
+    page = gui.HTML()
+    page.add_child('head', gui.HEAD('bench'))
+    page.add_child('body', gui.BODY())
+    labels = [gui.Label('0') for _ in range(width)]
+    page.children['body'].append(gui.VBox(children=labels))
+    page.repr()
+    return page, labels
+
+
+def drop_cache(widget):
+    widget._stale = True
+    widget._render_fragments = []
+    widget._inner_html = None
+    for child in widget.children.values():
+        if isinstance(child, gui.Tag):
+            drop_cache(child)
+
+
+def run(page, labels, cached, repeat=20):
+    elapsed = 0
+    for tick in range(1, repeat + 1):
+        labels[len(labels) // 2].set_text(str(tick))
+        if not cached:
+            drop_cache(page)
+        t = time.time()
+        page.repr()
+        page.children['body'].innerHTML({})
+        elapsed += time.time() - t
+    return elapsed / repeat * 1000.0
+
+
+if __name__ == '__main__':
+    for width in (1000, 10000, 50000):
+        page, labels = make_page(width)
+        print('%6d children: render cache %8.3f ms   no cache %8.3f ms' % (
+            width, run(page, labels, True), run(page, labels, False)))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+Compares the 'threaded' and 'asyncio' server engines.
+
+For each engine a server is started in a separate process, N idle websocket connections
+are opened to a shared App and the threads count and the resident memory growth are reported.
+Then the callback latency (time from a websocket callback message to its ack) is measured
+on one more connection, while the idle ones stay open.
+
+    python benchmarks/bench_server_engines.py [connections]
+"""
+import base64
+import os
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server, server
+
+
+class BenchApp(App):
+    def main(self):
+        button = gui.Button('bench')
+        button.identifier = 'bench'
+        button.onclick.do(lambda emitter: None)
+        return gui.VBox(children=[button])
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            return int(re.search(r'VmRSS:\s+(\d+)', f.read()).group(1))
+    except (IOError, AttributeError):
+        return 0
+
+
+def http_get(port):
+    s = socket.create_connection(('127.0.0.1', port))
+    s.sendall(b'GET / HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n')
+    data = b''
+    while True:
+        chunk = s.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    s.close()
+    return data
+
+
+class WebSocketClient(object):
+    def __init__(self, port, cookie):
+        self.sock = socket.create_connection(('127.0.0.1', port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall(('GET / HTTP/1.1\r\nHost: 127.0.0.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                           'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\nCookie: %s\r\n\r\n' %
+                           (key, cookie)).encode())
+        self.rfile = self.sock.makefile('rb')
+        head = b''
+        while not head.endswith(b'\r\n\r\n'):
+            head += self.rfile.read(1)
+        self.recv()  # the full page message
+
+    def send(self, text):
+        payload = bytearray(text.encode())
+        mask = os.urandom(4)
+        server.websocket_unmask(payload, mask)
+        self.sock.sendall(bytes(bytearray([0x81, 0x80 | len(payload)])) + mask + bytes(payload))
+
+    def recv(self):
+        head = self.rfile.read(2)
+        length = head[1] & 127
+        if length == 126:
+            length = struct.unpack('>H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.rfile.read(8))[0]
+        return self.rfile.read(length)
+
+
+def run_engine(engine, connections):
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=0, engine=engine)
+    s.start()
+    port = s._sserver.socket.getsockname()[1]
+    cookie = re.search(br'remi_session=\d+', http_get(port)).group(0).decode()
+    time.sleep(0.5)
+
+    threads_before = threading.active_count()
+    rss_before = rss_kb()
+    idle = [WebSocketClient(port, cookie) for _ in range(connections)]
+    time.sleep(1)
+    threads_after = threading.active_count()
+    rss_after = rss_kb()
+
+    client = WebSocketClient(port, cookie)
+    latencies = []
+    for _ in range(500):
+        t = time.time()
+        client.send('callback/bench/onclick/')
+        while client.recv() != b'3':
+            pass
+        latencies.append(time.time() - t)
+    latencies.sort()
+
+    print('%-8s %5d idle connections: %5d threads, %8.1f KiB RSS per connection, '
+          'callback latency median %.3f ms p99 %.3f ms' % (
+              engine, connections, threads_after - threads_before,
+              float(rss_after - rss_before) / connections,
+              latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run_engine(sys.argv[1], int(sys.argv[2]))
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for engine in ('threaded', 'asyncio'):
+        subprocess.call([sys.executable, os.path.abspath(__file__), engine, str(connections)],
+                        stderr=open(os.devnull, 'w'))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Effect of a stalled browser on the other clients of the same session.
+
+An App updates 50 labels of 20 KiB every 50 ms. One websocket client never reads,
+another one reads the updates for 3 seconds. For each outbound queue policy the
+updates received by the reading client and the messages dropped and coalesced
+for the stalled one are reported.
+
+    python benchmarks/bench_slow_client.py [engine]
+"""
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server, server
+from bench_server_engines import http_get, WebSocketClient
+
+
+class DashboardApp(App):
+    def main(self):
+        self.tick = 0
+        self.labels = [gui.Label('') for _ in range(50)]
+        return gui.VBox(children=self.labels)
+
+    def idle(self):
+        self.tick += 1
+        for label in self.labels:
+            label.set_text(('%d ' % self.tick) * 4000)
+
+
+def run_policy(engine, policy):
+    s = Server(DashboardApp, start=False, start_browser=False, port=0, update_interval=0.05,
+               engine=engine, websocket_queue_policy=policy, websocket_queue_length=20)
+    s.start()
+    port = s._sserver.socket.getsockname()[1]
+    cookie = re.search(br'remi_session=\d+', http_get(port)).group(0).decode()
+
+    stalled = WebSocketClient(port, cookie)
+    stalled.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled.send('connected')
+    reader = WebSocketClient(port, cookie)
+    reader.send('connected')
+
+    updates = 0
+    t = time.time()
+    while time.time() - t < 3:
+        if reader.recv()[:1] == b'5':
+            updates += 1
+
+    counters = s._sserver.websocket_counters
+    connected = len(list(server.clients.values())[0].websockets)
+    print('%-8s %-12s reading client: %5.1f updates/s   stalled client: %5d dropped %5d coalesced%s' % (
+        engine, policy, updates / 3.0, counters.dropped_messages, counters.coalesced_messages,
+        '' if connected == 2 else ', disconnected'))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        run_policy(sys.argv[1], sys.argv[2])
+    engines = sys.argv[1:] or ['threaded', 'asyncio']
+    for engine in engines:
+        for policy in ('disconnect', 'drop-oldest', 'coalesce'):
+            subprocess.call([sys.executable, os.path.abspath(__file__), engine, policy],
+                            stderr=open(os.devnull, 'w'))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+Static files serving: full downloads, revalidations (304) and byte ranges.
+
+'read' overrides App._overload, that makes the server read the whole file in memory
+and write it, as all the static files were sent before sendfile and the validators.
+
+    python benchmarks/bench_static_files.py
+"""
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+
+BIG_FILE_SIZE = 50 * 1024 * 1024
+STATIC_DIR = tempfile.mkdtemp()
+
+
+class BenchApp(App):
+    def __init__(self, *args):
+        super(BenchApp, self).__init__(*args, static_file_path={'bench': STATIC_DIR})
+
+    def main(self):
+        return gui.Label('static files')
+
+    def log_request(self, *args):
+        pass
+
+
+class ReadApp(BenchApp):
+    def _overload(self, data, **kwargs):
+        return data
+
+
+def timed_get(port, path, headers, repeat):
+    t = time.time()
+    for _ in range(repeat):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        conn.request('GET', path, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+    return (time.time() - t) / repeat * 1000.0, response, body
+
+
+def run(app_class, label):
+    s = Server(app_class, start=False, start_browser=False, port=0, update_interval=0)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        ms, response, body = timed_get(port, '/res:logo.svg', {}, 200)
+        print('%-9s logo.svg (%d KiB) full     %7.3f ms' % (label, len(body) // 1024, ms))
+        etag = response.getheader('ETag')
+        if etag:
+            ms, response, body = timed_get(port, '/res:logo.svg', {'If-None-Match': etag}, 200)
+            print('%-9s logo.svg revalidated (%d) %7.3f ms' % (label, response.status, ms))
+        ms, response, body = timed_get(port, '/bench:big.bin', {}, 5)
+        print('%-9s %d MiB file full     %8.2f ms' % (label, len(body) // 1024 // 1024, ms))
+        ms, response, body = timed_get(port, '/bench:big.bin', {'Range': 'bytes=26214400-27262975'}, 20)
+        print('%-9s 1 MiB range (%d, %d KiB) %7.2f ms' % (label, response.status, len(body) // 1024, ms))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    with open(os.path.join(STATIC_DIR, 'big.bin'), 'wb') as f:
+        f.write(os.urandom(BIG_FILE_SIZE))
+    try:
+        run(ReadApp, 'read')
+        run(BenchApp, 'sendfile')
+    finally:
+        shutil.rmtree(STATIC_DIR)
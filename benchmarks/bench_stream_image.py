@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Frames per second of a video shown by an image widget, 100 KiB frames as a 720p jpeg.
+
+'xhr' is the way of the opencv editor widgets before StreamImage: each frame is a javascript
+message asking the browser to GET /<widget id>/get_image_data, served on a persistent connection.
+'push' is StreamImage.set_frame, the frame is a binary websocket message.
+
+Then a client that takes 100 ms to show a frame gets the frames of a 30 fps producer: with 'push'
+it receives only the latest ones, the others are dropped from the queue of the connection.
+
+    python benchmarks/bench_stream_image.py
+"""
+import http.client
+import os
+import re
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+from remi.server import clients
+from bench_server_engines import http_get, WebSocketClient
+
+FRAME_SIZE = 100 * 1024
+FRAMES = 300
+
+FRAME = os.urandom(FRAME_SIZE)
+
+
+class PollingImage(gui.Image):
+    def get_image_data(self, index=0):
+        return FRAME, {'Content-type': 'image/jpeg', 'Cache-Control': 'no-cache'}
+
+
+class BenchApp(App):
+    def main(self):
+        self.polling = PollingImage('')
+        self.stream = gui.StreamImage()
+        return gui.VBox(children=[self.polling, self.stream])
+
+    def log_request(self, *args):
+        pass
+
+
+def xhr(app, client, conn):
+    t = time.time()
+    for i in range(FRAMES):
+        app.execute_javascript("var url = '/%s/get_image_data?index=%d';" % (app.polling.identifier, i))
+        url = re.search(br"url = '([^']+)'", client.recv()).group(1).decode()
+        conn.request('GET', url)
+        assert len(conn.getresponse().read()) == FRAME_SIZE
+    return FRAMES / (time.time() - t)
+
+
+def push(app, client, conn):
+    t = time.time()
+    for i in range(FRAMES):
+        app.stream.set_frame(FRAME)
+        assert len(client.recv()) > FRAME_SIZE
+    return FRAMES / (time.time() - t)
+
+
+def lagging(app, client):
+    """ Returns the frames received in 3 seconds by a client showing a frame in 100 ms """
+    stop = []
+
+    def produce():
+        while not stop:
+            app.stream.set_frame(FRAME)
+            time.sleep(1.0 / 30)
+    producer = threading.Thread(target=produce)
+    producer.start()
+    received = 0
+    t = time.time()
+    while time.time() - t < 3:
+        client.recv()
+        received += 1
+        time.sleep(0.1)
+    stop.append(True)
+    producer.join()
+    return received
+
+
+def run(engine):
+    clients.clear()
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=0, engine=engine)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        cookie = re.search(br'remi_session=\d+', http_get(port)).group(0).decode()
+        client = WebSocketClient(port, cookie)
+        client.send('connected')
+        client.recv()
+        app = clients[0]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        for label, method in (('xhr', xhr), ('push', push)):
+            print('%-8s %-5s %4d KiB frames %8.1f fps' % (engine, label, FRAME_SIZE // 1024, method(app, client, conn)))
+        received = lagging(app, client)
+        print('%-8s push  30 fps to a client showing 10 fps: %d frames in 3 s, %d dropped' %
+              (engine, received, s._sserver.websocket_counters.dropped_messages))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    for engine in ('threaded', 'asyncio'):
+        run(engine)
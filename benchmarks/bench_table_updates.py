@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+A process monitoring grid of 500 rows and 20 columns, all its 10000 cells changed at each tick
+and sent to a websocket client by one update.
+
+'html' is a TableWidget as the changes were sent before the text patches: each changed item
+is sent as its whole html; 'patch' is the same TableWidget, each changed item is sent as a text patch;
+'block' is a VirtualTable of a ColumnarTableModel changed by update_block, only the items shown
+are patched.
+
+Reports the time of a tick, from the change of the values to the message received by the client,
+the size of the message and the cells per second the grid can change.
+
+    python benchmarks/bench_table_updates.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+from remi.server import clients
+from bench_server_engines import http_get, WebSocketClient
+
+ROWS = 500
+COLUMNS = 20
+TICKS = 20
+
+
+def sample(tick):
+    rnd = random.Random(tick)
+    return [[row] + [round(rnd.random() * 100, 1) for c in range(COLUMNS - 1)] for row in range(ROWS)]
+
+
+class BenchApp(App):
+    def main(self):
+        self.grid = None
+        return gui.VBox(width=800)
+
+    def log_request(self, *args):
+        pass
+
+
+def table_widget(app):
+    table = gui.TableWidget(ROWS + 1, COLUMNS)
+    app.root.append(table)
+
+    def tick(values):
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                table.item_at(r + 1, c).set_text(str(value))
+    return tick
+
+
+def columnar(app):
+    model = gui.ColumnarTableModel([[0] * ROWS for c in range(COLUMNS)], titles=['col %d' % c for c in range(COLUMNS)])
+    app.root.append(gui.VirtualTable(model, viewport_rows=30))
+
+    def tick(values):
+        model.update_block(slice(0, ROWS), slice(0, COLUMNS), values)
+    return tick
+
+
+def run(label, prepare):
+    clients.clear()
+    # the updates are sent by do_gui_update at each tick, the update thread does not interfere
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=3600)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        cookie = re.search(br'remi_session=\d+', http_get(port)).group(0).decode()
+        client = WebSocketClient(port, cookie)
+        client.send('connected')
+        client.recv()
+        app = clients[0]
+        with app.update_lock:
+            tick = prepare(app)
+        app.do_gui_update()
+        client.recv()
+
+        samples = [sample(i) for i in range(TICKS)]
+        size = 0
+        t = time.time()
+        for values in samples:
+            with app.update_lock:
+                tick(values)
+            app.do_gui_update()
+            size += len(client.recv())
+        elapsed = (time.time() - t) / TICKS
+        print('%-6s %d cells per tick: %8.1f ms, message %8.1f KiB, %9.0f cells/s' % (
+            label, ROWS * COLUMNS, elapsed * 1000.0, size / 1024.0 / TICKS, ROWS * COLUMNS / elapsed))
+    finally:
+        s.stop()
+
+
+if __name__ == '__main__':
+    text_only = gui.Tag._text_only
+    gui.Tag._text_only = lambda self: False
+    run('html', table_widget)
+    gui.Tag._text_only = text_only
+    run('patch', table_widget)
+    run('block', columnar)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Memory and time of a file upload posted to a FileUploader.
+
+'memory' is a widget receiving the whole file data, as the uploads were received before
+the streaming multipart parser; 'stream' is the FileUploader, writing the file as it is received.
+The memory is the peak of the Python allocations in the server, measured by tracemalloc.
+
+    python benchmarks/bench_upload.py
+"""
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import App, Server
+from remi.server import clients
+
+FILE_SIZE = 100 * 1024 * 1024
+BOUNDARY = b'----benchboundary'
+BODY_HEAD = b'--' + BOUNDARY + b'\r\nContent-Disposition: form-data; name="upload_file"; filename="upload.bin"\r\n\r\n'
+BODY_TAIL = b'\r\n--' + BOUNDARY + b'--\r\n'
+
+
+class MemoryUploader(gui.Widget):
+    def __init__(self, savepath, *args, **kwargs):
+        super(MemoryUploader, self).__init__(*args, **kwargs)
+        self.savepath = savepath
+
+    def ondata(self, filedata, filename):
+        with open(os.path.join(self.savepath, filename), 'wb') as f:
+            f.write(filedata)
+
+
+class BodyReader(object):
+    """ Sends the multipart body from the file, without building it in memory. """
+
+    def __init__(self, filename):
+        self._parts = [BODY_HEAD, open(filename, 'rb'), BODY_TAIL]
+
+    def read(self, size):
+        while self._parts:
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                self._parts.pop(0)
+                return part
+            data = part.read(size)
+            if data:
+                return data
+            part.close()
+            self._parts.pop(0)
+        return b''
+
+
+def run(uploader_class, filename, label):
+    savepath = tempfile.mkdtemp()
+
+    class BenchApp(App):
+        def main(self):
+            self.uploader = uploader_class(savepath)
+            return self.uploader
+
+        def log_request(self, *args):
+            pass
+
+    # the session of the previous run would be reused
+    clients.clear()
+    s = Server(BenchApp, start=False, start_browser=False, port=0, update_interval=0)
+    s.start()
+    try:
+        port = s._sserver.socket.getsockname()[1]
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('GET', '/')
+        conn.getresponse().read()
+        uploader = clients[0].uploader
+
+        length = len(BODY_HEAD) + FILE_SIZE + len(BODY_TAIL)
+        tracemalloc.start()
+        t = time.time()
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        conn.request('POST', '/', BodyReader(filename), {
+            'Content-Type': 'multipart/form-data; boundary=' + BOUNDARY.decode(), 'Content-Length': str(length),
+            'filename': 'upload.bin', 'filesize': str(FILE_SIZE),
+            'listener': str(id(uploader)), 'listener_function': 'ondata'})
+        status = conn.getresponse().status
+        elapsed = time.time() - t
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert status == 200 and os.path.getsize(os.path.join(savepath, 'upload.bin')) == FILE_SIZE
+        print('%-7s %d MiB upload %8.1f ms, peak %8.1f MiB allocated' %
+              (label, FILE_SIZE // 1024 // 1024, elapsed * 1000.0, peak / 1024.0 / 1024.0))
+    finally:
+        s.stop()
+        shutil.rmtree(savepath)
+
+
+if __name__ == '__main__':
+    fd, filename = tempfile.mkstemp()
+    with os.fdopen(fd, 'wb') as f:
+        f.write(os.urandom(FILE_SIZE))
+    try:
+        run(MemoryUploader, filename, 'memory')
+        run(gui.FileUploader, filename, 'stream')
+    finally:
+        os.remove(filename)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+A list of N tag addresses, as ListView and DropDown, with a widget per item, and as
+VirtualListView and VirtualDropDown, with widgets only for the items around the viewport.
+
+Reports the construction time, the live widgets, the page html size and, for the
+virtual widgets, the time of a search filtering the items on the server.
+
+    python benchmarks/bench_virtual_list.py
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi.server import runtimeInstances
+
+
+def run(label, cls, items):
+    gc.collect()
+    widgets = len(runtimeInstances)
+    t = time.time()
+    widget = cls.new_from_list(items)
+    html = widget.repr()
+    elapsed = time.time() - t
+    widgets = len(runtimeInstances) - widgets
+    report = '%-16s %7d items: %8.1f ms, %8d widgets, html %8.1f KiB' % (
+        label, len(items), elapsed * 1000.0, widgets, len(html) / 1024.0)
+    if isinstance(widget, (gui.VirtualListView, gui.VirtualDropDown)):
+        view = widget if isinstance(widget, gui.VirtualListView) else widget.list
+        t = time.time()
+        for i in range(10):
+            view.set_filter('DB%d.' % i)
+            widget.repr()
+        report += ', search %.2f ms' % ((time.time() - t) * 100.0)
+    print(report)
+    del widget
+    gc.collect()
+
+
+if __name__ == '__main__':
+    for count in (5000, 50000):
+        items = ['DB%d.DBX%d.%d' % (i % 10, i // 8, i % 8) for i in range(count)]
+        run('ListView', gui.ListView, items)
+        run('VirtualListView', gui.VirtualListView, items)
+        run('DropDown', gui.DropDown, items)
+        run('VirtualDropDown', gui.VirtualDropDown, items)
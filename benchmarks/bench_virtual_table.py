@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+A table of N rows and 5 columns, as TableWidget, with a widget per item, and as
+VirtualTable, with widgets only for the rows around the viewport.
+
+Reports the construction time, the live widgets, the page html size and,
+for VirtualTable, the time of a scroll callback paging down by a viewport.
+The rows of the ListTableModel are built before the measure.
+
+    python benchmarks/bench_virtual_table.py
+"""
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi.server import runtimeInstances
+
+COLUMNS = 5
+
+
+def table_widget(rows):
+    def factory():
+        table = gui.TableWidget(rows + 1, COLUMNS)
+        for r in range(1, rows + 1):
+            for c in range(COLUMNS):
+                table.item_at(r, c).set_text('%d,%d' % (r, c))
+        return table
+    return factory
+
+
+def virtual_table(rows):
+    model = gui.ListTableModel([['%d,%d' % (r, c) for c in range(COLUMNS)] for r in range(rows)],
+                               titles=['col %d' % c for c in range(COLUMNS)])
+    return lambda: gui.VirtualTable(model, viewport_rows=30)
+
+
+def run(label, prepare, rows):
+    factory = prepare(rows)
+    gc.collect()
+    widgets = len(runtimeInstances)
+    t = time.time()
+    table = factory()
+    html = table.repr()
+    elapsed = time.time() - t
+    widgets = len(runtimeInstances) - widgets
+    report = '%-12s %7d rows: %8.1f ms, %8d widgets, html %8.1f KiB' % (
+        label, rows, elapsed * 1000.0, widgets, len(html) / 1024.0)
+    if isinstance(table, gui.VirtualTable):
+        t = time.time()
+        for i in range(100):
+            table.onscroll(str(i * 30 * table.row_height), '900')
+            table.repr()
+        report += ', scroll %.2f ms' % ((time.time() - t) * 10.0)
+    print(report)
+    del table
+    gc.collect()
+
+
+if __name__ == '__main__':
+    for rows in (1000, 20000):
+        run('TableWidget', table_widget, rows)
+        run('VirtualTable', virtual_table, rows)
+    run('VirtualTable', virtual_table, 1000000)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Benchmark of the websocket payload encoding, url quoted (legacy clients) and
+plain utf-8 text (clients negotiating the remi.v2 subprotocol).
+
+The payload is the html of a table of 2000 rows with non-ascii text,
+the size is measured as utf-8 bytes on the wire.
+
+    python benchmarks/bench_websocket_payload.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+from remi import server
+
+
+class Encoder(server.WebSocketProtocol):
+    def __init__(self, raw_payload):
+        self.raw_payload = raw_payload
+
+
+def run(html, raw_payload, repeat):
+    encoder = Encoder(raw_payload)
+    t = time.time()
+    for _ in range(repeat):
+        data = server.encode_text(encoder.encode_payload(html))
+    elapsed = (time.time() - t) / repeat
+    print('%-12s %10d B %8.2f ms/msg' % ('remi.v2' if raw_payload else 'url quoted', len(data), elapsed * 1000.0))
+
+
+if __name__ == '__main__':
+    table = gui.Table.new_from_list([('Città', 'Temperatura', 'Umidità')] +
+                                    [('Zürich %d' % i, '%d°C' % (i % 40), '%d%%' % (i % 100)) for i in range(2000)])
+    html = table.repr()
+    print('html: %d characters' % len(html))
+    run(html, False, 20)
+    run(html, True, 20)
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""
+Construction time of 10000 widgets and of a 5000 rows TableWidget.
+
+'per instance' looks up the event methods of each new widget with inspect.getmembers and
+creates all its ClassEventConnector, as done before the class level cache of the events;
+'per class' finds the event methods once per class and creates a connector on its first use.
+
+    python benchmarks/bench_widget_construction.py
+"""
+import inspect
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+
+COUNT = 10000
+
+
+def per_instance_setup_event_methods(self):
+    for (method_name, method) in inspect.getmembers(self, predicate=lambda obj: hasattr(obj, '__is_event')):
+        e = gui.ClassEventConnector(self, method_name, method)
+        e._event_info = getattr(method, '_event_info', None)
+        setattr(self, method_name, e)
+
+
+def measure(factory, count=1):
+    t = time.time()
+    for i in range(count):
+        factory(i)
+    return (time.time() - t) * 1000.0
+
+
+def run(label):
+    for name, factory in (('Label', lambda i: gui.Label('label %d' % i)),
+                          ('Button', lambda i: gui.Button('button %d' % i)),
+                          ('TableItem', lambda i: gui.TableItem('item %d' % i))):
+        print('%-12s %5d %-10s %8.1f ms' % (label, COUNT, name, measure(factory, COUNT)))
+    print('%-12s TableWidget 5000x3    %8.1f ms' % (label, measure(lambda i: gui.TableWidget(5000, 3))))
+
+
+if __name__ == '__main__':
+    setup_event_methods = gui.EventSource.setup_event_methods
+    gui.EventSource.setup_event_methods = per_instance_setup_event_methods
+    run('per instance')
+    gui.EventSource.setup_event_methods = setup_event_methods
+    run('per class')
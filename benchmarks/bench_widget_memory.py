@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""
+Memory of the common leaf widgets, in bytes per widget, measured by tracemalloc
+on 10000 instances, right after the construction and after the first render.
+
+    python benchmarks/bench_widget_memory.py
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import remi.gui as gui
+
+COUNT = 10000
+
+
+def bytes_per_widget(factory, render):
+    # the classes get their first instance, and their caches, apart
+    factory(0).repr()
+    gc.collect()
+    tracemalloc.start()
+    widgets = [factory(i) for i in range(COUNT)]
+    if render:
+        for widget in widgets:
+            widget.repr()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return float(size) / COUNT
+
+
+if __name__ == '__main__':
+    for name, factory in (('Label', lambda i: gui.Label('label %d' % i)),
+                          ('Button', lambda i: gui.Button('button %d' % i)),
+                          ('TableItem', lambda i: gui.TableItem('item %d' % i)),
+                          ('TextInput', lambda i: gui.TextInput()),
+                          ('Image', lambda i: gui.Image('/res:logo.png'))):
+        print('%-10s %8.0f bytes per widget, %8.0f after the render' %
+              (name, bytes_per_widget(factory, False), bytes_per_widget(factory, True)))
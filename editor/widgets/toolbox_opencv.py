@@ -38,10 +38,11 @@ class OpencvWidget(object):
         return ()
 
 
-class OpencvImage(gui.Image, OpencvWidget):
+class OpencvImage(gui.StreamImage, OpencvWidget):
     """ OpencvImage widget.
         Allows to read an image from file.
         The event on_new_image can be connected to other Opencv widgets for further processing
+        The image is pushed to the browser as a jpeg frame, see gui.StreamImage
     """
     icon = "data:image/png;base64," + b64encoded_sample_icon
     
@@ -63,7 +64,7 @@ class OpencvImage(gui.Image, OpencvWidget):
         kwargs['style'] = self.default_style
         kwargs['width'] = kwargs['style'].get('width', kwargs.get('width','200px'))
         kwargs['height'] = kwargs['style'].get('height', kwargs.get('height','180px'))
-        super(OpencvImage, self).__init__(filename, *args, **kwargs)
+        super(OpencvImage, self).__init__('jpeg', 80, *args, **kwargs)
         OpencvWidget._setup(self)
 
     def on_new_image_listener(self, emitter):
@@ -87,39 +88,22 @@ class OpencvImage(gui.Image, OpencvWidget):
         return self.search_app_instance(node.get_parent()) 
 
     def update(self, *args):
-        if self.app_instance==None:
-            self.app_instance = self.search_app_instance(self)
-            if self.app_instance==None:
-                self.attributes['src'] = "/%s/get_image_data?index=00"%self.identifier #gui.load_resource(self.filename)
-                return
-        self.app_instance.execute_javascript("""
-            url = '/%(id)s/get_image_data?index=%(frame_index)s';
-            
-            xhr = null;
-            xhr = new XMLHttpRequest();
-            xhr.open('GET', url, true);
-            xhr.responseType = 'blob'
-            xhr.onload = function(e){
-                urlCreator = window.URL || window.webkitURL;
-                urlCreator.revokeObjectURL(document.getElementById('%(id)s').src);
-                imageUrl = urlCreator.createObjectURL(this.response);
-                document.getElementById('%(id)s').src = imageUrl;
-            }
-            xhr.send();
-            """ % {'id': self.identifier, 'frame_index':str(time.time())})
-
-    def get_image_data(self, index=0):
-        gui.Image.set_image(self, '/%(id)s/get_image_data?index=%(frame_index)s'% {'id': self.identifier, 'frame_index':str(time.time())})
-        self._set_updated()
+        if self.img is None:
+            return
         try:
-            ret, png = cv2.imencode('.png', self.img)
-            if ret:
-                headers = {'Content-type': 'image/png', 'Cache-Control':'no-cache'}
-                return [png.tostring(), headers]
+            self.set_frame(self.img)
         except Exception:
-            pass
-            #print(traceback.format_exc())
-        return None, None
+            print(traceback.format_exc())
+
+    def encode(self, image):
+        #the frames are numpy arrays, encoded by opencv instead of PIL
+        params = {'jpeg': [cv2.IMWRITE_JPEG_QUALITY, self.quality],
+                  'webp': [cv2.IMWRITE_WEBP_QUALITY, self.quality]}.get(self.image_format, [])
+        ret, data = cv2.imencode('.' + self.image_format, image, params)
+        if not ret:
+            #the frame is skipped by set_frame
+            return None
+        return data.tobytes()
 
 
 class OpencvImRead(OpencvImage, OpencvWidget):
@@ -193,45 +177,23 @@ class OpencvVideo(OpencvImage):
         super(OpencvVideo, self).__del__()
 
     def update(self, *args):
+        #the frames are read at framerate and pushed to the browser, a browser that lags gets only the latest
         while not self.thread_stop_flag:
             time.sleep(1.0/self.framerate)
             if self.app_instance==None:
                 self.app_instance = self.search_app_instance(self)
                 if self.app_instance==None:
                     continue
-
-            with self.app_instance.update_lock:
-                self.app_instance.execute_javascript("""
-                    var url = '/%(id)s/get_image_data?index=%(frame_index)s';
-                    var xhr = new XMLHttpRequest();
-                    xhr.open('GET', url, true);
-                    xhr.responseType = 'blob'
-                    xhr.onload = function(e){
-                        var urlCreator = window.URL || window.webkitURL;
-                        urlCreator.revokeObjectURL(document.getElementById('%(id)s').src);
-                        var imageUrl = urlCreator.createObjectURL(this.response);
-                        document.getElementById('%(id)s').src = imageUrl;
-                    }
-                    xhr.send();
-                    """ % {'id': self.identifier, 'frame_index':str(time.time())})
-                
-
-    def get_image_data(self, index=0):
-        gui.Image.set_image(self, '/%(id)s/get_image_data?index=%(frame_index)s'% {'id': self.identifier, 'frame_index':str(time.time())})
-        self._set_updated()
-        try:
-            ret, frame = self.capture.read()
-            if ret:
-                self.set_image_data(frame)
-                self.on_new_image()
-                ret, png = cv2.imencode('.png', frame)
-                if ret:
-                    headers = {'Content-type': 'image/png', 'Cache-Control':'no-cache'}
-                    # tostring is an alias to tobytes, which wasn't added till numpy 1.9
-                    return [png.tostring(), headers]
-        except Exception:
-            print(traceback.format_exc())
-        return None, None
+            try:
+                ret, frame = self.capture.read()
+                if not ret:
+                    continue
+                with self.app_instance.update_lock:
+                    self.set_image_data(frame)
+                    self.on_new_image()
+                self.set_frame(frame)
+            except Exception:
+                print(traceback.format_exc())
 
 
 class OpencvCrop(OpencvImage):
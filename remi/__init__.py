@@ -11,10 +11,14 @@ from .gui import (
     DropDown,
     DropDownItem,
     Image,
+    StreamImage,
     Table,
     TableRow,
     TableItem,
     TableTitle,
+    VirtualTable,
+    VirtualListView,
+    VirtualDropDown,
     Input,
     Slider,
     ColorPicker,
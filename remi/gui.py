@@ -13,12 +13,15 @@
 """
 
 import os
+import io
 import sys
 import logging
 import functools
 import threading
+import time
 import collections
-import inspect
+import math
+import weakref
 try:
     import html
     escape = html.escape
@@ -26,7 +29,10 @@ except ImportError :
     import cgi
     escape = cgi.escape
 import mimetypes
+import tempfile
 import base64
+import hashlib
+import json
 try:
     # Python 2.6-2.7
     from HTMLParser import HTMLParser
@@ -51,6 +57,10 @@ except ImportError:
 
 log = logging.getLogger('remi.gui')
 
+# the client runtime is served with the digest of its content in the name, so that it can be cached until it changes
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res', 'remi.js'), 'rb') as f:
+    INTERNAL_JS_PATH = 'res:remi.%s.js' % hashlib.sha1(f.read()).hexdigest()[:12]
+
 pyLessThan3 = sys.version_info < (3,)
 
 
@@ -114,24 +124,55 @@ class CssStyleError(Exception):
 
 
 class EventSource(object):
+    # the event method names of each class, see setup_event_methods
+    _event_methods = {}
+    _event_methods_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         self.setup_event_methods()
 
     def setup_event_methods(self):
-        def a_method_not_builtin(obj):
-            return hasattr(obj, '__is_event')
-        for (method_name, method) in inspect.getmembers(self, predicate=a_method_not_builtin):
-            # this is implicit in predicate
-            #if not hasattr(method, '__is_event'):
-            #    continue
-            
-            _event_info = None
-            if hasattr(method, "_event_info"):
-                _event_info = method._event_info
-
-            e = ClassEventConnector(self, method_name, method)
-            e._event_info = _event_info
-            setattr(self, method_name, e)
+        """ The event methods are found once per class, without evaluating the properties of the instance,
+            and get replaced in the class by an _EventMethod. The ClassEventConnector of an instance
+            is created on its first access.
+        """
+        cls = type(self)
+        if cls in EventSource._event_methods:
+            return
+        with EventSource._event_methods_lock:
+            if cls in EventSource._event_methods:
+                return
+            names = []
+            for method_name in dir(cls):
+                method = getattr(cls, method_name, None)
+                if not hasattr(method, '__is_event'):
+                    continue
+                if not isinstance(cls.__dict__.get(method_name), _EventMethod):
+                    setattr(cls, method_name, _EventMethod(method_name, method))
+                names.append(method_name)
+            EventSource._event_methods[cls] = tuple(names)
+
+
+class _EventMethod(object):
+    """ Takes the place of an event method in the class of an EventSource.
+        On the first access by an instance the ClassEventConnector of the event gets created and
+        stored in the instance. The access by a subclass instance, as by super(), gets the plain method.
+    """
+
+    def __init__(self, name, method):
+        self.name = name
+        self.method = method
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self.method
+        method_bound = self.method.__get__(instance, owner)
+        if type(instance).__dict__.get(self.name) is not self:
+            return method_bound
+        e = ClassEventConnector(instance, self.name, method_bound)
+        e._event_info = getattr(self.method, '_event_info', None)
+        instance.__dict__[self.name] = e
+        return e
 
 
 class ClassEventConnector(object):
@@ -229,19 +270,33 @@ def editor_attribute_decorator(group, description, _type, additional_data):
     return add_annotation
 
 
-class _EventDictionary(dict, EventSource):
-    """This dictionary allows to be notified if its content is changed.
+# shared by the _EventDictionary without changes
+_NO_CHANGED_KEYS = frozenset()
+
+
+class _EventDictionary(dict):
+    """This dictionary notifies the owner Tag, if any, when its content is changed.
+        The keys changed since the last align_version are collected in changed_keys.
     """
-    changed = False
-    def __init__(self, *args, **kwargs):
-        super(_EventDictionary, self).__init__(*args, **kwargs)
-        EventSource.__init__(self, *args, **kwargs)
+    __slots__ = ('changed', 'changed_keys', 'owner')
+
+    def __init__(self, owner=None):
+        super(_EventDictionary, self).__init__()
+        self.owner = owner
+        self.changed = False
+        self.changed_keys = _NO_CHANGED_KEYS
+
+    def _add_changed_keys(self, keys):
+        if self.changed_keys is _NO_CHANGED_KEYS:
+            self.changed_keys = set()
+        self.changed_keys.update(keys)
 
     def __setitem__(self, key, value):
         if key in self:
             if self[key] == value:
                 return
         ret = super(_EventDictionary, self).__setitem__(key, value)
+        self._add_changed_keys((key,))
         self.onchange()
         return ret
 
@@ -249,6 +304,7 @@ class _EventDictionary(dict, EventSource):
         if key not in self:
             return
         ret = super(_EventDictionary, self).__delitem__(key)
+        self._add_changed_keys((key,))
         self.onchange()
         return ret
 
@@ -256,16 +312,19 @@ class _EventDictionary(dict, EventSource):
         if key not in self:
             return
         ret = super(_EventDictionary, self).pop(key, d)
+        self._add_changed_keys((key,))
         self.onchange()
         return ret
 
     def clear(self):
+        self._add_changed_keys(self.keys())
         ret = super(_EventDictionary, self).clear()
         self.onchange()
         return ret
 
     def update(self, d):
         ret = super(_EventDictionary, self).update(d)
+        self._add_changed_keys(dict(d).keys())
         self.onchange()
         return ret
 
@@ -274,13 +333,14 @@ class _EventDictionary(dict, EventSource):
 
     def align_version(self):
         self.changed = False
+        self.changed_keys = _NO_CHANGED_KEYS
 
-    @decorate_event
     def onchange(self):
         """Called on content change.
         """
         self.changed = True
-        return ()
+        if self.owner is not None:
+            self.owner._need_update(self)
 
 
 class Tag(object):
@@ -288,6 +348,10 @@ class Tag(object):
     Tag is the base class of the framework. It represents an element that can be added to the GUI,
     but it is not necessarily graphically representable.
     """
+    # the core fields are slots, to keep the large trees compact. The subclasses still have a __dict__
+    __slots__ = ('_parent', '_stale', 'kwargs', '_render_children_list', '_render_fragments', '_inner_html',
+                 '_children', 'attributes', '_style', 'ignore_update', 'refresh_enabled', 'type',
+                 '_repr_attributes', '_backup_repr', '__dict__', '__weakref__')
 
     def __init__(self, attributes=None, _type='', _class=None,  **kwargs):
         """
@@ -300,20 +364,24 @@ class Tag(object):
         if attributes is None:
             attributes = {}
         self._parent = None
+        # True if the repr of self or of a descendant has to be rebuilt
+        self._stale = True
 
         self.kwargs = kwargs
 
         self._render_children_list = []
+        # cached repr of each child, in the same order of _render_children_list
+        self._render_fragments = ()
+        # cached innerHTML, the join of _render_fragments
+        self._inner_html = None
 
-        self.children = _EventDictionary()
-        self.attributes = _EventDictionary()  # properties as class id style
-        self.style = _EventDictionary()  # used by Widget, but instantiated here to make gui_updater simpler
+        # children and style are created on first use, most of the leaves have none
+        self._children = None
+        self.attributes = _EventDictionary(self)  # properties as class id style
+        self._style = None
 
         self.ignore_update = False
         self.refresh_enabled = True
-        self.children.onchange.connect(self._need_update)
-        self.attributes.onchange.connect(self._need_update)
-        self.style.onchange.connect(self._need_update)
 
         self.type = _type
         self.identifier = str(id(self))
@@ -331,6 +399,21 @@ class Tag(object):
         # this variable will contain the repr of this tag, in order to avoid useless operations
         self._backup_repr = ''
 
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = _EventDictionary(self)
+        return self._children
+
+    @property
+    def style(self):
+        """ The css properties, packed in the style attribute. Used by Widget,
+            but available here to make gui_updater simpler.
+        """
+        if self._style is None:
+            self._style = _EventDictionary(self)
+        return self._style
+
     # @editor_attribute_decorator("Generic",'''The unique object identifier''', None, {})
     @property
     def identifier(self):
@@ -346,19 +429,41 @@ class Tag(object):
         self.attributes['id'] = new_identifier
         runtimeInstances[new_identifier] = self
 
+    def _render_fragment(self, s, local_changed_widgets):
+        if isinstance(s, Tag):
+            return s.repr(local_changed_widgets)
+        elif isinstance(s, type('')):
+            return s
+        elif isinstance(s, type(u'')):
+            return s.encode('utf-8')
+        return repr(s)
+
     def innerHTML(self, local_changed_widgets):
-        ret = ''
-        for k in self._render_children_list:
-            s = self.children[k]
-            if isinstance(s, Tag):
-                ret = ret + s.repr(local_changed_widgets)
-            elif isinstance(s, type('')):
-                ret = ret + s
-            elif isinstance(s, type(u'')):
-                ret = ret + s.encode('utf-8')
-            else:
-                ret = ret + repr(s)
-        return ret
+        """Returns the html of the children. The repr of each child is cached in a fragment list,
+        only the slots of changed children are rendered again and the fragments
+        get joined only if at least one of them changed.
+        """
+        fragments = self._render_fragments
+        if (self._children is not None and self._children.changed) or \
+                len(fragments) != len(self._render_children_list):
+            # children added, removed or replaced, all the slots are taken again
+            # the unchanged Tag children return their cached repr
+            self._render_fragments = fragments = [self._render_fragment(self.children[k], local_changed_widgets)
+                                                  for k in self._render_children_list]
+        else:
+            changed = False
+            for i, k in enumerate(self._render_children_list):
+                s = self.children[k]
+                if isinstance(s, Tag):
+                    # the child repr could have been rebuilt apart, i.e. by App.do_gui_update
+                    r = s.repr(local_changed_widgets) if s._stale else s._backup_repr
+                    if r is not fragments[i]:
+                        fragments[i] = r
+                        changed = True
+            if not changed and self._inner_html is not None:
+                return self._inner_html
+        self._inner_html = ''.join(fragments)
+        return self._inner_html
 
     def repr(self, changed_widgets=None):
         """It is used to automatically represent the object to HTML format
@@ -367,47 +472,135 @@ class Tag(object):
         Args:
             changed_widgets (dict): A dictionary containing a collection of tags that have to be updated.
                 The tag that have to be updated is the key, and the value is its textual repr.
+                If only attributes and style of the tag changed, the value is a dict
+                as returned by _repr_patch instead of the textual repr.
         """
         if changed_widgets is None:
             changed_widgets = {}
+        if not self._stale:
+            # neither self nor its descendants changed, the subtree is not walked
+            return self._backup_repr
+        self._stale = False
         local_changed_widgets = {}
         _innerHTML = self.innerHTML(local_changed_widgets)
 
-        if self._ischanged() or (len(local_changed_widgets) > 0):
-            self._backup_repr = ''.join(('<', self.type, ' ', self._repr_attributes, '>',
-                                        _innerHTML, '</', self.type, '>'))
-            # faster but unsupported before python3.6
-            # self._backup_repr = f'<{self.type} {self._repr_attributes}>{_innerHTML}</{self.type}>'
+        self._backup_repr = ''.join(('<', self.type, ' ', self._repr_attributes, '>',
+                                    _innerHTML, '</', self.type, '>'))
+        # faster but unsupported before python3.6
+        # self._backup_repr = f'<{self.type} {self._repr_attributes}>{_innerHTML}</{self.type}>'
         if self._ischanged():
-            # if self changed, no matter about the children because will be updated the entire parent
-            # and so local_changed_widgets is not merged
-            changed_widgets[self] = self._backup_repr
+            if (self._children is not None and self._children.changed and not self._text_only()) or \
+                    ('id' in self.attributes.changed_keys):
+                # if self changed, no matter about the children because will be updated the entire parent
+                # and so local_changed_widgets is not merged
+                changed_widgets[self] = self._backup_repr
+            else:
+                # the element is patched in place, its changed children are sent apart
+                patch = self._repr_patch()
+                if patch:
+                    changed_widgets[self] = patch
+                changed_widgets.update(local_changed_widgets)
             self._set_updated()
         else:
             changed_widgets.update(local_changed_widgets)
         return self._backup_repr
 
+    def _repr_patch(self):
+        """Returns the attributes and style properties changed since the last update,
+        as they are parsed by the browser from the html repr, in 'attributes' and 'style'.
+        A None value means removed. If the children changed, the new text content is in 'text',
+        see _text_only. The keys without changes are omitted.
+        """
+        attributes = {}
+        for k in self.attributes.changed_keys:
+            if k == 'style':
+                # the style attribute is generated from self.style
+                continue
+            if k in self.attributes:
+                v = self.attributes[k]
+                attributes[k] = '' if v is None else unescape('%s' % v)
+            else:
+                attributes[k] = None
+        style = {}
+        if self._style is not None:
+            for k in self._style.changed_keys:
+                style[k] = unescape('%s' % self._style[k]) if k in self._style else None
+        # the unchanged parts are left out, the patches of many items are sent together
+        patch = {}
+        if attributes:
+            patch['attributes'] = attributes
+        if style:
+            patch['style'] = style
+        if self._children is not None and self._children.changed:
+            # only the text changed, see _text_only
+            patch['text'] = unescape(self._children['text'])
+        return patch
+
+    def _text_only(self):
+        """Returns True if the only child is a plain text, without markup, so that
+        a change of the children can be sent as a text patch instead of the whole html.
+        """
+        children = self._children
+        if children is None or len(children) != 1:
+            return False
+        text = children.get('text')
+        return isinstance(text, str) and not '<' in text
+
     def _need_update(self, emitter=None, child_ignore_update=False):
         # if there is an emitter, it means self is the actual changed widget
         if not emitter is None:
-            tmp = dict(self.attributes)
-            if len(self.style):
-                tmp['style'] = jsonize(self.style)
-            else:
-                tmp.pop('style', None)
-            self._repr_attributes = ' '.join('%s="%s"' % (k, v) if v is not None else k for k, v in
-                                             tmp.items())
+            # a change of the children leaves the attributes as they are
+            if not emitter is self._children:
+                tmp = dict(self.attributes)
+                if self._style:
+                    tmp['style'] = jsonize(self._style)
+                else:
+                    tmp.pop('style', None)
+                self._repr_attributes = ' '.join('%s="%s"' % (k, v) if v is not None else k for k, v in
+                                                 tmp.items())
+            self._set_dirty()
         if self.refresh_enabled:
             if self.get_parent():
                 self.get_parent()._need_update(child_ignore_update = (self.ignore_update or child_ignore_update))
 
+    def _invalidate_repr(self):
+        """Marks the repr of self and of its ancestors to be rebuilt.
+        Returns the top-most ancestor, or self if it has no parent.
+        """
+        self._stale = True
+        node = self
+        while isinstance(node._parent, Tag):
+            node = node._parent
+            node._stale = True
+        return node
+
+    def _set_dirty(self):
+        """Registers self in the dirty widgets of the App it belongs to, if any,
+        so that the App renders only the changed widgets instead of walking the whole tree.
+        This is done also if refresh is disabled, the change will be sent with the next update.
+        """
+        app = self._invalidate_repr()._parent
+        if app is not None and hasattr(app, '_add_dirty_widget'):
+            app._add_dirty_widget(self)
+
+    def _get_app(self):
+        """Returns the App showing self, or None."""
+        node = self
+        while isinstance(node._parent, Tag):
+            node = node._parent
+        app = node._parent
+        return app if hasattr(app, 'update_lock') else None
+
     def _ischanged(self):
-        return self.children.changed or self.attributes.changed or self.style.changed
+        return self.attributes.changed or (self._children is not None and self._children.changed) or \
+            (self._style is not None and self._style.changed)
 
     def _set_updated(self):
-        self.children.align_version()
         self.attributes.align_version()
-        self.style.align_version()
+        if self._children is not None:
+            self._children.align_version()
+        if self._style is not None:
+            self._style.align_version()
 
     def disable_refresh(self):
         """ Prevents the parent widgets to be notified about an update. 
@@ -471,6 +664,8 @@ class Tag(object):
 
         if key in self.children:
             self._render_children_list.remove(key)
+            # the children order changes also if the value is the same
+            self._invalidate_repr()
         self._render_children_list.append(key)
 
         self.children[key] = value
@@ -507,6 +702,9 @@ class Tag(object):
                         if k in self._render_children_list:
                             self._render_children_list.remove(k)
                         self.children.pop(k)
+                        # a detached child does not notify its changes anymore
+                        if child._parent is self:
+                            child._parent = None
                         # when the child is removed we stop the iteration
                         # this implies that a child replication should not be allowed
                         break
@@ -541,6 +739,8 @@ class Widget(Tag, EventSource):
     EVENT_ONCONTEXTMENU = "oncontextmenu"
     EVENT_ONUPDATE = 'onupdate'
 
+    oldRootWidget = None  # used when hiding the widget
+
     # None is not visible in editor
     @property
     @editor_attribute_decorator("Generic", '''The variable name used by the editor''', str, {})
@@ -897,8 +1097,6 @@ class Widget(Tag, EventSource):
         super(Widget, self).__init__(**kwargs)
         EventSource.__init__(self, *args, **kwargs)
 
-        self.oldRootWidget = None  # used when hiding the widget
-
         if 'margin' in kwargs:
             self.css_margin = kwargs.get('margin')
         self.set_size(kwargs.get('width'), kwargs.get('height'))
@@ -909,7 +1107,7 @@ class Widget(Tag, EventSource):
             Args:
                 style (str or dict): The style property dictionary or json string.
         """
-        if style is not None:
+        if style:
             try:
                 self.style.update(style)
             except ValueError:
@@ -1326,8 +1524,9 @@ class HTML(Tag):
         if changed_widgets is None:
             changed_widgets = {}
         local_changed_widgets = {}
+        _innerHTML = self.innerHTML(local_changed_widgets)
         self._set_updated()
-        return ''.join(('<', self.type, '>\n', self.innerHTML(local_changed_widgets), '\n</', self.type, '>'))
+        return ''.join(('<', self.type, '>\n', _innerHTML, '\n</', self.type, '>'))
 
 
 class HEAD(Tag):
@@ -1361,291 +1560,16 @@ class HEAD(Tag):
         self.add_child("favicon", '<link rel="%s" href="%s" type="%s" />'%(rel, base64_data, mimetype))
 
     def set_internal_js(self, app_identifier, net_interface_ip, pending_messages_queue_length, websocket_timeout_timer_ms):
+        """ Adds the client runtime, as the cacheable /res:remi.<hash>.js resource,
+            preceded by its settings for this page.
+        """
+        config = json.dumps({'host': net_interface_ip,
+                             'maxPendingMessages': int(pending_messages_queue_length),
+                             'messagingTimeout': int(websocket_timeout_timer_ms),
+                             'appIdentifier': app_identifier})
         self.add_child('internal_js',
-                """
-                <script>
-                /*'use strict';*/
-
-                var Remi = function() {
-                this._pendingSendMessages = [];
-                this._ws = null;
-                this._comTimeout = null;
-                this._failedConnections = 0;
-                this._openSocket();
-                };
-
-                // from http://stackoverflow.com/questions/5515869/string-length-in-bytes-in-javascript
-                // using UTF8 strings I noticed that the javascript .length of a string returned less
-                // characters than they actually were
-                Remi.prototype._byteLength = function(str) {
-                    // returns the byte length of an utf8 string
-                    return str.length;
-                };
-
-                Remi.prototype._paramPacketize = function (ps){
-                    var ret = '';
-                    for (var pkey in ps) {
-                        if( ret.length>0 )ret = ret + '|';
-                        var pstring = pkey+'='+ps[pkey];
-                        var pstring_length = this._byteLength(pstring);
-                        pstring = pstring_length+'|'+pstring;
-                        ret = ret + pstring;
-                    }
-                    return ret;
-                };
-
-                Remi.prototype._openSocket = function(){
-                    var ws_wss = "ws";
-                    try{
-                        ws_wss = document.location.protocol.startsWith('https')?'wss':'ws';
-                    }catch(ex){}
-
-                    var self = this;
-                    try{
-                        host = '%(host)s'
-                        if (host !== ''){
-                            wss_url = `${ws_wss}://${host}/`
-                        }
-                        else{
-                            host = document.location.host;
-                            pathname = document.location.pathname;
-                            wss_url = `${ws_wss}://${document.location.host}${pathname}`;
-                        }
-
-                        this._ws = new WebSocket(wss_url);
-                        console.debug('opening websocket');
-
-                        this._ws.onopen = function(evt){
-                            if(self._ws.readyState == 1){
-                                self._ws.send('connected');
-
-                                try {
-                                    document.getElementById("loading").style.display = 'none';
-                                } catch(err) {
-                                    console.log('Error hiding loading overlay ' + err.message);
-                                }
-
-                                self._failedConnections = 0;
-
-                                while(self._pendingSendMessages.length>0){
-                                    self._ws.send(self._pendingSendMessages.shift()); /*without checking ack*/
-                                }
-                            }
-                            else{
-                                console.debug('onopen fired but the socket readyState was not 1');
-                            }
-                        };
-
-                        this._ws.onmessage = function(evt){
-                            var received_msg = evt.data;
-
-                            if( received_msg[0]=='0' ){ /*show_window*/
-                                var index = received_msg.indexOf(',')+1;
-                                /*var idRootNodeWidget = received_msg.substr(0,index-1);*/
-                                var content = received_msg.substr(index,received_msg.length-index);
-
-                                document.body.innerHTML = decodeURIComponent(content);
-                            }else if( received_msg[0]=='1' ){ /*update_widget*/
-                                var focusedElement=-1;
-                                var caretStart=-1;
-                                var caretEnd=-1;
-                                if (document.activeElement)
-                                {
-                                    focusedElement = document.activeElement.id;
-                                    try{
-                                        caretStart = document.activeElement.selectionStart;
-                                        caretEnd = document.activeElement.selectionEnd;
-                                    }catch(e){console.debug(e.message);}
-                                }
-                                var index = received_msg.indexOf(',')+1;
-                                var idElem = received_msg.substr(1,index-2);
-                                var content = received_msg.substr(index,received_msg.length-index);
-
-                                var elem = document.getElementById(idElem);
-                                try{
-                                    elem.insertAdjacentHTML('afterend',decodeURIComponent(content));
-                                    elem.parentElement.removeChild(elem);
-                                }catch(e){
-                                    /*Microsoft EDGE doesn't support insertAdjacentHTML for SVGElement*/
-                                    var ns = document.createElementNS("http://www.w3.org/2000/svg",'tmp');
-                                    ns.innerHTML = decodeURIComponent(content);
-                                    elem.parentElement.replaceChild(ns.firstChild, elem);
-                                    console.debug(e.message);
-                                }
-
-                                var elemToFocus = document.getElementById(focusedElement);
-                                if( elemToFocus != null ){
-                                    elemToFocus.focus();
-                                    try{
-                                        elemToFocus = document.getElementById(focusedElement);
-                                        if(caretStart>-1 && caretEnd>-1) elemToFocus.setSelectionRange(caretStart, caretEnd);
-                                    }catch(e){console.debug(e.message);}
-                                }
-                            }else if( received_msg[0]=='2' ){ /*javascript*/
-                                var content = received_msg.substr(1,received_msg.length-1);
-                                try{
-                                    eval(content);
-                                }catch(e){console.debug(e.message);};
-                            }else if( received_msg[0]=='3' ){ /*ack*/
-                                self._pendingSendMessages.shift() /*remove the oldest*/
-                                if(self._comTimeout!==null)
-                                    clearTimeout(self._comTimeout);
-                            }
-                        };
-
-                        this._ws.onclose = function(evt){
-                            /* websocket is closed. */
-                            console.debug('Connection is closed... event code: ' + evt.code + ', reason: ' + evt.reason);
-                            // Some explanation on this error: http://stackoverflow.com/questions/19304157/getting-the-reason-why-websockets-closed
-                            // In practice, on a unstable network (wifi with a lot of traffic for example) this error appears
-                            // Got it with Chrome saying:
-                            // WebSocket connection to 'ws://x.x.x.x:y/' failed: Could not decode a text frame as UTF-8.
-                            // WebSocket connection to 'ws://x.x.x.x:y/' failed: Invalid frame header
-
-                            try {
-                                document.getElementById("loading").style.display = '';
-                            } catch(err) {
-                                console.log('Error hiding loading overlay ' + err.message);
-                            }
-
-                            self._failedConnections += 1;
-
-                            console.debug('failed connections=' + self._failedConnections + ' queued messages=' + self._pendingSendMessages.length);
-
-                            if(self._failedConnections > 3) {
-
-                                // check if the server has been restarted - which would give it a new websocket address,
-                                // new state, and require a reload
-                                console.debug('Checking if GUI still up ' + location.href);
-
-                                var http = new XMLHttpRequest();
-                                http.open('HEAD', location.href);
-                                http.onreadystatechange = function() {
-                                    if (http.status == 200) {
-                                        // server is up but has a new websocket address, reload
-                                        location.reload();
-                                    }
-                                };
-                                http.send();
-
-                                self._failedConnections = 0;
-                            }
-
-                            if(evt.code == 1006){
-                                self._renewConnection();
-                            }
-                        };
-
-                        this._ws.onerror = function(evt){
-                            /* websocket is closed. */
-                            /* alert('Websocket error...');*/
-                            console.debug('Websocket error... event code: ' + evt.code + ', reason: ' + evt.reason);
-                        };
-
-                    }catch(ex){this._ws=false;alert('websocketnot supported or server unreachable');}
-                }
-
-
-                /*this uses websockets*/
-                Remi.prototype.sendCallbackParam = function (widgetID,functionName,params /*a dictionary of name:value*/){
-                    var paramStr = '';
-                    if(params!==null) paramStr=this._paramPacketize(params);
-                    var message = encodeURIComponent(unescape('callback' + '/' + widgetID+'/'+functionName + '/' + paramStr));
-                    this._pendingSendMessages.push(message);
-                    if( this._pendingSendMessages.length < %(max_pending_messages)s ){
-                        if (this._ws !== null && this._ws.readyState == 1)
-                            this._ws.send(message);
-                            if(this._comTimeout===null)
-                                this._comTimeout = setTimeout(this._checkTimeout, %(messaging_timeout)s);
-                    }else{
-                        console.debug('Renewing connection, this._ws.readyState when trying to send was: ' + this._ws.readyState)
-                        this._renewConnection();
-                    }
-                };
-
-                /*this uses websockets*/
-                Remi.prototype.sendCallback = function (widgetID,functionName){
-                    this.sendCallbackParam(widgetID,functionName,null);
-                };
-
-                Remi.prototype._renewConnection = function(){
-                    // ws.readyState:
-                    //A value of 0 indicates that the connection has not yet been established.
-                    //A value of 1 indicates that the connection is established and communication is possible.
-                    //A value of 2 indicates that the connection is going through the closing handshake.
-                    //A value of 3 indicates that the connection has been closed or could not be opened.
-                    if( this._ws.readyState == 1){
-                        try{
-                            this._ws.close();
-                        }catch(err){};
-                    }
-                    else if(this._ws.readyState == 0){
-                    // Don't do anything, just wait for the connection to be stablished
-                    }
-                    else{
-                        this._openSocket();
-                    }
-                };
-
-                Remi.prototype._checkTimeout = function(){
-                    if(this._pendingSendMessages.length > 0)
-                        this._renewConnection();
-                };
-
-                Remi.prototype.uploadFile = function(widgetID, eventSuccess, eventFail, eventData, file){
-                    var url = '/';
-                    var xhr = new XMLHttpRequest();
-                    xhr.upload.addEventListener('progress', function(e) {
-                        console.log('progress!', widgetID, %(emitter_identifier)s, e.loaded, e.total);
-                        if(event.lengthComputable){
-                            var params={};
-                            params['filename'] = 'filename'/* file.name*/;
-                            params['loaded'] = event.loaded;
-                            params['total'] = event.total;
-                            console.log("length is computable; sending callback");
-                            remi.sendCallbackParam(widgetID,'onprogress',params);
-                        }
-                    });
-
-                    var fd = new FormData();
-                    xhr.open('POST', url, true);
-                    xhr.setRequestHeader('filename', file.name);
-                    xhr.setRequestHeader('listener', widgetID);
-                    xhr.setRequestHeader('listener_function', eventData);
-                    xhr.onreadystatechange = function() {
-                        if (xhr.readyState == 4 && xhr.status == 200) {
-                            /* Every thing ok, file uploaded */
-                            var params={};params['filename']=file.name;
-                            remi.sendCallbackParam(widgetID, eventSuccess,params);
-                            console.log('upload success: ' + file.name);
-                        }else if(xhr.status == 400){
-                            var params={};params['filename']=file.name;
-                            remi.sendCallbackParam(widgetID,eventFail,params);
-                            console.log('upload failed: ' + file.name);
-                        }
-                    };
-
-                    fd.append('upload_file', file);
-                    xhr.send(fd);
-                };
-
-                window.onerror = function(message, source, lineno, colno, error) {
-                    var params={};params['message']=message;
-                    params['source']=source;
-                    params['lineno']=lineno;
-                    params['colno']=colno;
-                    params['error']=JSON.stringify(error);
-                    remi.sendCallbackParam('%(emitter_identifier)s','%(event_name)s',params);
-                    return false;
-                };
-                
-                window.remi = new Remi();
-
-                </script>""" % {'host':net_interface_ip,
-                                'max_pending_messages':pending_messages_queue_length,
-                                'messaging_timeout':websocket_timeout_timer_ms,
-                                'emitter_identifier':app_identifier,
-                                'event_name':'onerror'})
+                """<script>var remiConfig = %s;</script>
+                <script src="/%s"></script>""" % (config.replace('</', '<\\/'), INTERNAL_JS_PATH))
 
     def set_title(self, title):
         self.add_child('title', "<title>%s</title>" % title)
@@ -1661,8 +1585,9 @@ class HEAD(Tag):
         if changed_widgets is None:
             changed_widgets = {}
         local_changed_widgets = {}
+        _innerHTML = self.innerHTML(local_changed_widgets)
         self._set_updated()
-        return ''.join(('<', self.type, '>\n', self.innerHTML(local_changed_widgets), '\n</', self.type, '>'))
+        return ''.join(('<', self.type, '>\n', _innerHTML, '\n</', self.type, '>'))
 
 
 class BODY(Container):
@@ -2950,6 +2875,71 @@ class Image(Widget):
         self.attributes['src'] = image
 
 
+class StreamImage(Image):
+    """ Image widget showing a stream of frames, like the ones of a camera or of an animated plot.
+        The frames are pushed to the browsers as binary websocket messages, without a request per frame.
+        A browser that lags gets only the latest frame, the ones not yet sent or shown are dropped.
+        The last frame is also served at the image url, for the pages loaded in the meantime.
+    """
+
+    def __init__(self, image_format='jpeg', quality=80, *args, **kwargs):
+        """
+        Args:
+            image_format (str): the format of the frames, 'jpeg', 'webp' or 'png'
+            quality (int): the quality of the frames encoded by set_frame, 1 to 100
+            kwargs: See Widget.__init__()
+        """
+        super(StreamImage, self).__init__('', *args, **kwargs)
+        self.image_format = image_format
+        self.quality = quality
+        self._frame = None
+        self.attributes['src'] = "/%s/get_frame" % self.identifier
+
+    @property
+    def mimetype(self):
+        return 'image/' + self.image_format.lower()
+
+    def set_frame(self, frame):
+        """ Shows a new frame. Can be called by any thread.
+
+        Args:
+            frame (bytes or PIL.Image.Image): the image already encoded in image_format,
+                or a PIL image, encoded in image_format with the configured quality
+
+        Returns:
+            bool: False if the widget is not shown by an App, the frame is kept for the next page load,
+                or if the image could not be encoded, the frame is skipped
+        """
+        if not isinstance(frame, (bytes, bytearray)):
+            frame = self.encode(frame)
+            if frame is None:
+                return False
+        self._frame = frame
+        app = self._get_app()
+        if app is None:
+            return False
+        app.send_stream_frame(self, frame, self.mimetype)
+        return True
+
+    def encode(self, image):
+        """ Encodes a PIL image in image_format, with the configured quality if the format is lossy.
+            Returns None if the image cannot be encoded, i.e. an RGBA image in jpeg.
+        """
+        params = {'quality': self.quality} if self.image_format.lower() in ('jpeg', 'jpg', 'webp') else {}
+        buf = io.BytesIO()
+        try:
+            image.save(buf, format=self.image_format.upper(), **params)
+        except (IOError, OSError, ValueError, KeyError):
+            log.error('error encoding a frame of %s' % self.identifier, exc_info=True)
+            return None
+        return buf.getvalue()
+
+    def get_frame(self, index=0):
+        if self._frame is None:
+            return None, None
+        return [self._frame, {'Content-type': self.mimetype, 'Cache-Control': 'no-store'}]
+
+
 class Table(Container):
     """
     table widget - it will contains TableRow
@@ -3257,6 +3247,622 @@ class TableTitle(TableItem, _MixinTextualWidget):
         self.type = 'th'
 
 
+class TableModel(object):
+    """ The data of a VirtualTable, read on demand: only the rows shown get widgets.
+        Subclasses implement row_count and get_row, and set_item if the table is editable.
+    """
+    titles = None  # the column titles, or None for a table without title row
+    _views = None  # the tables showing the model, notified of the changes
+
+    @property
+    def row_count(self):
+        raise NotImplementedError()
+
+    @property
+    def column_count(self):
+        if self.titles is not None:
+            return len(self.titles)
+        return len(self.get_row(0)) if self.row_count else 0
+
+    def get_row(self, index):
+        """ Returns the values of the row at index, a sequence of column_count items """
+        raise NotImplementedError()
+
+    def get_item(self, row, column):
+        return self.get_row(row)[column]
+
+    def set_item(self, row, column, value):
+        """ Called when an item of an editable table is changed by the user """
+        raise NotImplementedError('%s is read-only' % self.__class__.__name__)
+
+    def _add_view(self, view):
+        if self._views is None:
+            self._views = weakref.WeakSet()
+        self._views.add(view)
+
+    def cells_changed(self, rows, columns):
+        """Updates the shown items of the tables showing the model.
+        To be called when values of the model change.
+
+        Args:
+            rows (sequence): the indexes of the changed rows, i.e. a range
+            columns (sequence): the indexes of the changed columns
+        """
+        for view in list(self._views or ()):
+            view._cells_changed(rows, columns)
+
+    def rows_changed(self):
+        """ Shows again the rows of the tables showing the model. To be called when rows are added or removed. """
+        for view in list(self._views or ()):
+            view.refresh()
+
+
+class ListTableModel(TableModel):
+    """ TableModel of a list of rows, each one a sequence of values """
+
+    def __init__(self, rows=None, titles=None):
+        """
+        Args:
+            rows (list): the rows, each one a sequence of values
+            titles (list): the column titles, or None
+        """
+        self.rows = list(rows) if rows is not None else []
+        self.titles = titles
+
+    @property
+    def row_count(self):
+        return len(self.rows)
+
+    def get_row(self, index):
+        return self.rows[index]
+
+    def set_item(self, row, column, value):
+        values = list(self.rows[row])
+        values[column] = value
+        self.rows[row] = values
+
+
+class ColumnarTableModel(TableModel):
+    """ TableModel storing the values by column, each one a list or a one dimensional NumPy array.
+        Blocks of cells are changed at once by update_block, the tables showing the model
+        update only the items shown.
+    """
+
+    def __init__(self, columns, titles=None):
+        """
+        Args:
+            columns (list): the columns, lists or NumPy arrays of the same length
+            titles (list): the column titles, or None
+        """
+        self.columns = list(columns)
+        self.titles = titles
+
+    @property
+    def row_count(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def column_count(self):
+        return len(self.columns)
+
+    def get_row(self, index):
+        return [column[index] for column in self.columns]
+
+    def get_item(self, row, column):
+        return self.columns[column][row]
+
+    def set_item(self, row, column, value):
+        self.columns[column][row] = value
+
+    def update_block(self, row_slice, col_slice, values):
+        """Replaces the values of a block of cells. The changed items are updated
+        in a single pass, so that they are sent to the browser by the same message.
+
+        Args:
+            row_slice (slice or int): the rows of the block
+            col_slice (slice or int): the columns of the block
+            values: the new values, a sequence of rows, each one a sequence with a value
+                per column of the block, or a two dimensional NumPy array
+        """
+        if not isinstance(row_slice, slice):
+            row_slice = slice(row_slice, row_slice + 1 or None)
+        if not isinstance(col_slice, slice):
+            col_slice = slice(col_slice, col_slice + 1 or None)
+        start, stop, step = row_slice.indices(self.row_count)
+        rows = range(start, stop, step)
+        columns = range(*col_slice.indices(self.column_count))
+        if len(values) != len(rows):
+            raise ValueError('the block has %d rows, %d given' % (len(rows), len(values)))
+        # the dimensions are checked before any change, a wrong block leaves the model as it is
+        by_column = hasattr(values, 'ndim')
+        if by_column and (values.ndim != 2 or values.shape[1] != len(columns)):
+            raise ValueError('the block has %d columns, an array of shape %s given' % (len(columns), values.shape))
+        if not by_column:
+            for i, row in enumerate(values):
+                if len(row) != len(columns):
+                    raise ValueError('the block has %d columns, %d given at row %d' % (len(columns), len(row), i))
+        # the normalized slice, a negative stop would count from the end
+        target = slice(start, stop if stop >= 0 else None, step)
+        for j, column in enumerate(columns):
+            self.columns[column][target] = values[:, j] if by_column else [row[j] for row in values]
+        self.cells_changed(rows, columns)
+
+
+class _VirtualRows(Container):
+    """ Base of the scrollable widgets showing only the rows around the viewport, plus buffer_rows
+        before and after them. The others are replaced by spacers of the same height, so that
+        the rows must have a fixed height. When the viewport gets near to the end of the rows shown,
+        the browser notifies onscroll and the rows around the new viewport are shown.
+        Subclasses implement _row_count and _show_rows, that shows the rows given by _window.
+    """
+
+    _SCROLL_JS = "var el=this;clearTimeout(el.remiScroll);el.remiScroll=setTimeout(function(){" \
+        "var top=el.scrollTop;" \
+        "if(top>=parseFloat(el.dataset.scrollMin)&&top+el.clientHeight<=parseFloat(el.dataset.scrollMax))return;" \
+        "var params={};params['scroll_top']=top;params['height']=el.clientHeight;" \
+        "remi.sendCallbackParam('%(emitter_identifier)s','%(event_name)s',params);},50);"
+
+    def __init__(self, row_height, viewport_rows, buffer_rows, *args, **kwargs):
+        super(_VirtualRows, self).__init__(*args, **kwargs)
+        self.row_height = row_height
+        self.viewport_rows = viewport_rows
+        self.buffer_rows = viewport_rows if buffer_rows is None else buffer_rows
+        self.first_row = 0
+        # the rows shown, by index
+        self._rows = {}
+
+        self.style.update({'overflow-y': 'auto', 'display': 'block'})
+        self.attributes['onscroll'] = self._SCROLL_JS % {
+            'emitter_identifier': self.identifier, 'event_name': 'onscroll'}
+
+    def _row_count(self):
+        raise NotImplementedError()
+
+    def _header_height(self):
+        return 0
+
+    def _window(self):
+        """ Returns the (first, last, row_count) rows to show, last excluded """
+        row_count = self._row_count()
+        first = max(0, min(self.first_row, row_count - self.viewport_rows) - self.buffer_rows)
+        last = min(row_count, self.first_row + self.viewport_rows + self.buffer_rows)
+        return min(first, last), last, row_count
+
+    def _replace_children(self, container):
+        for child in container.children.values():
+            child._parent = None
+        container._render_children_list = []
+        container.children.clear()
+
+    def _set_scroll_range(self, first, last, row_count):
+        # the browser notifies the scroll when the viewport gets near the ends of the rows shown
+        margin = self.buffer_rows // 2
+        offset = self._header_height()
+        self.attributes['data-scroll-min'] = str(offset + (first + margin) * self.row_height if first > 0 else 0)
+        self.attributes['data-scroll-max'] = str(offset + (last - margin) * self.row_height
+                                                 if last < row_count else 'Infinity')
+
+    def refresh(self):
+        """ Shows the rows again. To be called when the rows change. """
+        self._rows = {}
+        self._show_rows()
+
+    @decorate_set_on_listener("(self, emitter, first_row, last_row)")
+    @decorate_event
+    def onscroll(self, scroll_top, height):
+        """Called by the browser when the viewport gets near the ends of the rows shown.
+        The rows around the new viewport are shown.
+
+        Args:
+            scroll_top (float): the scroll position in pixels
+            height (float): the height of the viewport in pixels
+        """
+        row_count = self._row_count()
+        self.viewport_rows = max(1, int(math.ceil(float(height) / self.row_height)))
+        first = int((float(scroll_top) - self._header_height()) // self.row_height)
+        self.first_row = max(0, min(first, row_count - 1))
+        self._show_rows()
+        return (self.first_row, min(row_count, self.first_row + self.viewport_rows))
+
+
+class VirtualTable(_VirtualRows):
+    """ Scrollable table showing the rows of a TableModel. Only the rows around the viewport
+        get widgets, the others are read from the model as the user scrolls, see _VirtualRows.
+    """
+
+    def __init__(self, model, row_height=30, viewport_rows=20, buffer_rows=None, editable=False, *args, **kwargs):
+        """
+        Args:
+            model (TableModel): the data of the table
+            row_height (int): the height of the rows in pixels
+            viewport_rows (int): the rows visible before the browser notifies the actual height
+            buffer_rows (int): the rows shown before and after the viewport, defaults to viewport_rows
+            editable (bool): the items are TableEditableItem and the changes are stored by model.set_item
+            kwargs: See Container.__init__()
+        """
+        if 'height' not in kwargs and 'height' not in kwargs.get('style', {}):
+            kwargs['height'] = row_height * (viewport_rows + (1 if model.titles is not None else 0))
+        super(VirtualTable, self).__init__(row_height, viewport_rows, buffer_rows, *args, **kwargs)
+        self.model = model
+        self._editable = editable
+        # the table is replaced by the browser when the rows change, the container keeps the scroll position
+        self.table = Table(width='100%')
+        self.table.style.update({'table-layout': 'fixed', 'white-space': 'nowrap'})
+        self.table.on_table_row_click.connect(self.on_table_row_click)
+        self.append(self.table, 'table')
+        self.refresh()
+        model._add_view(self)
+
+    def _row_count(self):
+        return self.model.row_count
+
+    def _header_height(self):
+        return self.row_height if self.model.titles is not None else 0
+
+    def _spacer(self, rows):
+        spacer = TableRow()
+        item = TableItem()
+        item.attributes['colspan'] = str(max(1, self.model.column_count))
+        item.style.update({'height': to_pix(rows * self.row_height), 'padding': '0px', 'border': 'none'})
+        spacer.append(item)
+        return spacer
+
+    def _new_row(self, index):
+        tr = TableRow()
+        tr.style['height'] = to_pix(self.row_height)
+        cl = TableEditableItem if self._editable else TableItem
+        for column, value in enumerate(self.model.get_row(index)):
+            item = cl(self._format(value))
+            tr.append(item, str(column))
+            if self._editable:
+                item.onchange.connect(self._on_item_edited, index, column)
+        return tr
+
+    @staticmethod
+    def _format(value):
+        return '' if value is None else str(value)
+
+    def _show_rows(self):
+        first, last, row_count = self._window()
+        shown = {}
+        for index in range(first, last):
+            shown[index] = self._rows.get(index) or self._new_row(index)
+
+        table = self.table
+        self._replace_children(table)
+        if self.model.titles is not None:
+            title = TableRow()
+            title.style.update({'height': to_pix(self.row_height), 'position': 'sticky', 'top': '0px'})
+            for column, text in enumerate(self.model.titles):
+                title.append(TableTitle(str(text)), str(column))
+            table.append(title, 'title')
+        if first > 0:
+            table.add_child('top', self._spacer(first))
+        for index in range(first, last):
+            table.append(shown[index], str(index))
+        if last < row_count:
+            table.add_child('bottom', self._spacer(row_count - last))
+        self._rows = shown
+        self._set_scroll_range(first, last, row_count)
+
+    def _cells_changed(self, rows, columns):
+        app = self._get_app()
+        if app is None:
+            self._update_items(rows, columns)
+            return
+        # all the items get changed before the next update, and are sent together
+        with app.update_lock:
+            self._update_items(rows, columns)
+
+    def _update_items(self, rows, columns):
+        shown = self._rows
+        if len(rows) > len(shown):
+            rows = [index for index in sorted(shown) if index in rows]
+        get_item = self.model.get_item
+        for index in rows:
+            row = shown.get(index)
+            if row is None:
+                continue
+            for column in columns:
+                row.children[str(column)].set_text(self._format(get_item(index, column)))
+
+    def item_coords(self, table_item):
+        """Returns table_item's (row, column) model coordinates, or None if not shown.
+
+        Args:
+            table_item (TableItem): an item instance
+        """
+        for index, row in self._rows.items():
+            for key, item in row.children.items():
+                if item is table_item:
+                    return (index, int(key))
+        return None
+
+    def _on_item_edited(self, item, new_value, row, column):
+        self.model.set_item(row, column, new_value)
+        self.on_item_changed(item, new_value, row, column)
+
+    @decorate_set_on_listener("(self, emitter, row, item)")
+    @decorate_event
+    def on_table_row_click(self, emitter, row, item):
+        """Event on the click of an item. See Table.on_table_row_click.
+
+        Args:
+            emitter (VirtualTable): The emitter of the event.
+            row (TableRow): The clicked row.
+            item (TableItem): The clicked item, its model coordinates are given by item_coords.
+        """
+        return (row, item)
+
+    @decorate_set_on_listener("(self, emitter, item, new_value, row, column)")
+    @decorate_event
+    def on_item_changed(self, item, new_value, row, column):
+        """Event for the change of an item of an editable table, already stored by model.set_item.
+
+        Args:
+            emitter (VirtualTable): The emitter of the event.
+            item (TableEditableItem): The TableEditableItem instance.
+            new_value (str): New text content.
+            row (int): row index in the model.
+            column (int): column index.
+        """
+        return (item, new_value, row, column)
+
+
+class VirtualListView(_VirtualRows):
+    """ Scrollable list of a large number of items, kept as plain values and not as ListItems.
+        Only the items around the viewport get a ListItem, the others are shown as the user scrolls,
+        see _VirtualRows. set_filter shows only the items matching a text, filtered on the server,
+        so that the browser never gets the whole list.
+        A single click listener of the list notifies onselection(index, value), the clicks on items
+        no longer shown, because the items changed in the meantime, are ignored.
+    """
+
+    # the items have no listener, the click is notified by the list for the item clicked
+    _CLICK_JS = "var li=event.target.closest('li[data-index]');if(!li)return;" \
+        "var params={};params['index']=li.dataset.index;" \
+        "remi.sendCallbackParam('%(emitter_identifier)s','%(event_name)s',params);"
+
+    def __init__(self, items=None, row_height=24, viewport_rows=20, buffer_rows=None, selectable=True, *args, **kwargs):
+        """
+        Args:
+            items (list): the items, shown as text
+            row_height (int): the height of the items in pixels
+            viewport_rows (int): the items visible before the browser notifies the actual height
+            buffer_rows (int): the items shown before and after the viewport, defaults to viewport_rows
+            selectable (bool): the item clicked is shown as selected
+            kwargs: See Container.__init__()
+        """
+        if 'height' not in kwargs and 'height' not in kwargs.get('style', {}):
+            kwargs['height'] = row_height * viewport_rows
+        super(VirtualListView, self).__init__(row_height, viewport_rows, buffer_rows, *args, **kwargs)
+        self._selectable = selectable
+        self._selected_index = None
+        self.filter_text = ''
+        # the indexes of the items matching filter_text, None if not filtered
+        self._filtered = None
+        self._search_keys = None
+
+        self.list = Container(width='100%', _class='ListView')
+        self.list.type = 'ul'
+        self.list.style.update({'overflow': 'visible', 'margin': '0px'})
+        self.list.attributes[self.EVENT_ONCLICK] = self._CLICK_JS % {
+            'emitter_identifier': self.identifier, 'event_name': '_on_item_click'}
+        self.append(self.list, 'list')
+        self.set_items(items if items is not None else [])
+
+    @classmethod
+    def new_from_list(cls, items, **kwargs):
+        return cls(items, **kwargs)
+
+    def set_items(self, items):
+        """Replaces the items, the filter is applied to the new ones.
+
+        Args:
+            items (list): the items, shown as text
+        """
+        self.items = list(items)
+        self._selected_index = None
+        self._search_keys = None
+        self.set_filter(self.filter_text)
+
+    def filter_items(self, text):
+        """Returns the indexes of the items matching text, by default the ones containing it ignoring the case.
+        It can be overridden for a different search.
+
+        Args:
+            text (str): the filter text, not empty
+        """
+        if self._search_keys is None:
+            self._search_keys = [str(item).lower() for item in self.items]
+        text = text.lower()
+        return [index for index, key in enumerate(self._search_keys) if text in key]
+
+    def set_filter(self, text):
+        """Shows only the items matching text, see filter_items. An empty text shows all the items.
+
+        Args:
+            text (str): the filter text
+        """
+        self.filter_text = text
+        self._filtered = self.filter_items(text) if text else None
+        self.first_row = 0
+        self.refresh()
+        app = self._get_app()
+        if app is not None:
+            app.execute_javascript("var el=document.getElementById('%s');if(el)el.scrollTop=0;" % self.identifier)
+
+    def _row_count(self):
+        return len(self.items) if self._filtered is None else len(self._filtered)
+
+    def _spacer(self, rows):
+        spacer = Tag(_type='li')
+        spacer.style.update({'height': to_pix(rows * self.row_height), 'padding': '0px', 'border': 'none'})
+        return spacer
+
+    def _new_item(self, index):
+        item = ListItem(str(self.items[index]))
+        item.style['height'] = to_pix(self.row_height)
+        item.attributes['data-index'] = str(index)
+        item.attributes['selected'] = self._selectable and index == self._selected_index
+        return item
+
+    def _show_rows(self):
+        first, last, row_count = self._window()
+        indexes = range(first, last) if self._filtered is None else self._filtered[first:last]
+        shown = {}
+        for index in indexes:
+            shown[index] = self._rows.get(index) or self._new_item(index)
+
+        ul = self.list
+        self._replace_children(ul)
+        if first > 0:
+            ul.add_child('top', self._spacer(first))
+        for index in indexes:
+            ul.add_child(str(index), shown[index])
+        if last < row_count:
+            ul.add_child('bottom', self._spacer(row_count - last))
+        self._rows = shown
+        self._set_scroll_range(first, last, row_count)
+
+    def select_by_index(self, index):
+        """Selects an item by its index in items, None to clear the selection.
+
+        Args:
+            index (int): the index of the item
+        """
+        if self._selectable:
+            if self._selected_index in self._rows:
+                self._rows[self._selected_index].attributes['selected'] = False
+            if index in self._rows:
+                self._rows[index].attributes['selected'] = True
+        self._selected_index = index
+
+    def set_value(self, value):
+        self.select_by_value(value)
+
+    def select_by_value(self, value):
+        """Selects the first item equal to value, or clears the selection if there is none.
+
+        Args:
+            value: the item to select
+        """
+        self.select_by_index(self.items.index(value) if value in self.items else None)
+
+    def get_index(self):
+        """
+        Returns:
+            int: The index of the selected item or None
+        """
+        return self._selected_index
+
+    def get_value(self):
+        """
+        Returns:
+            The selected item or None
+        """
+        if self._selected_index is None:
+            return None
+        return self.items[self._selected_index]
+
+    def _on_item_click(self, index):
+        # the click may refer to an item removed by set_items or set_filter before it arrived
+        try:
+            index = int(index)
+        except ValueError:
+            return
+        if index in self._rows and index < len(self.items):
+            self.onselection(index)
+
+    @decorate_set_on_listener("(self, emitter, index, value)")
+    @decorate_event
+    def onselection(self, index):
+        """Called when an item gets clicked in the list.
+
+        Args:
+            index (int): the index of the item in items
+        """
+        index = int(index)
+        self.select_by_index(index)
+        return (index, self.items[index])
+
+
+class VirtualDropDown(Container):
+    """ Drop down selection of a large number of items, typing in its TextInput filters
+        the items of a VirtualListView shown below it. Implements the onchange(value) event.
+    """
+
+    def __init__(self, items=None, row_height=24, viewport_rows=10, hint='search', *args, **kwargs):
+        """
+        Args:
+            items (list): the items, shown as text
+            row_height (int): the height of the items in pixels
+            viewport_rows (int): the items visible in the drop down list
+            hint (str): the placeholder of the TextInput
+            kwargs: See Container.__init__()
+        """
+        super(VirtualDropDown, self).__init__(*args, **kwargs)
+        self.style['position'] = 'relative'
+        self.input = TextInput(single_line=True, hint=hint, width='100%')
+        self.input.oninput.connect(self._on_search)
+        self.input.onfocus.connect(self._on_focus)
+        self.append(self.input, 'input')
+        self.list = VirtualListView(items, row_height, viewport_rows, width='100%')
+        self.list.style.update({'position': 'absolute', 'z-index': '1', 'display': 'none'})
+        self.list.onselection.connect(self._on_list_selection)
+        self.append(self.list, 'list')
+
+    @classmethod
+    def new_from_list(cls, items, **kwargs):
+        return cls(items, **kwargs)
+
+    def _show_list(self, visible):
+        self.list.style['display'] = 'block' if visible else 'none'
+
+    def _on_focus(self, emitter):
+        self._show_list(True)
+
+    def _on_search(self, emitter, text):
+        self.input.disable_update()
+        self.input.set_value(text)
+        self.input.enable_update()
+        self.list.set_filter(text)
+        self._show_list(True)
+
+    def _on_list_selection(self, emitter, index, value):
+        self.input.set_value(str(value))
+        self._show_list(False)
+        self.onchange(value)
+
+    def set_items(self, items):
+        self.list.set_items(items)
+
+    def set_value(self, value):
+        self.select_by_value(value)
+
+    def select_by_value(self, value):
+        """Selects the first item equal to value and shows it in the TextInput.
+
+        Args:
+            value: the item to select
+        """
+        self.list.select_by_value(value)
+        self.input.set_value('' if self.list.get_value() is None else str(value))
+
+    def get_value(self):
+        """
+        Returns:
+            The selected item or None.
+        """
+        return self.list.get_value()
+
+    @decorate_set_on_listener("(self, emitter, new_value)")
+    @decorate_event
+    def onchange(self, value):
+        """Called when an item gets selected from the list."""
+        return (value, )
+
+
 class Input(Widget):
 
     def __init__(self, input_type='', default_value='', *args, **kwargs):
@@ -4089,11 +4695,123 @@ class TreeItem(Container, _MixinTextualWidget):
         return super(TreeItem, self).onclick()
 
 
+class FileUpload(object):
+    """ A file being uploaded by a FileUploader. The data is written to a temporary file in the
+        savepath as it is received, and the file gets its name once complete, so that a partial
+        upload never replaces a file. The onprogress event is emitted at most once per percent.
+
+        A resumable upload (with an upload_id) is received in chunks, in any order and possibly
+        more than once, each one written at its offset. The chunks completely received are
+        recorded, the client asks them by FileUploader.upload_status to send only the missing ones.
+        A chunk must be one already received, sent again, or not overlap any other, and the file
+        is complete once its chunks cover it from the start to the end.
+    """
+
+    def __init__(self, uploader, filename, size, upload_id=None):
+        self.uploader = uploader
+        self.filename = os.path.basename(filename)
+        self.size = size
+        self.upload_id = upload_id
+        self.loaded = 0
+        # offset: length of the chunks received, for resumable uploads
+        self.chunks = {}
+        # the end of the chunks received contiguously from the start of the file
+        self.received = 0
+        self.last_activity = time.time()
+        self._notified = 0
+        self._position = 0
+        fd, self._temp_path = tempfile.mkstemp(prefix='.%s.' % self.filename, suffix='.part',
+                                               dir=uploader.savepath)
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, data, offset=None):
+        """ Writes the data following the previous one, or at offset for the chunks of a resumable upload. """
+        self.last_activity = time.time()
+        if self._file is None:
+            # closed between the chunks, an abandoned upload does not keep a file open
+            self._file = open(self._temp_path, 'r+b')
+            self._position = 0
+        if offset is not None and offset != self._position:
+            self._file.seek(offset)
+            self._position = offset
+        self._position += len(data)
+        if self.uploader.max_size is not None and self._position > self.uploader.max_size:
+            self.abort()
+            raise ValueError('upload of %s exceeds %d bytes' % (self.filename, self.uploader.max_size))
+        self._file.write(data)
+        if offset is None:
+            self._progress(len(data))
+
+    def check_chunk(self, offset, length):
+        """ Raises ValueError if a chunk of a resumable upload does not line up with the chunks
+            received, called before its data is written.
+        """
+        if offset < 0 or offset + length > self.size or (length <= 0 and self.size > 0):
+            raise ValueError('upload chunk %d+%d out of %s' % (offset, length, self.filename))
+        for chunk_offset, chunk_length in self.chunks.items():
+            if chunk_offset == offset and chunk_length == length:
+                continue
+            if chunk_offset < offset + length and offset < chunk_offset + chunk_length:
+                raise ValueError('upload chunk %d+%d overlaps %d+%d of %s' % (
+                    offset, length, chunk_offset, chunk_length, self.filename))
+
+    def add_chunk(self, offset, length):
+        """ Records a chunk of a resumable upload as completely written.
+            Returns True if the file is complete.
+        """
+        self.last_activity = time.time()
+        if offset not in self.chunks:
+            self.chunks[offset] = length
+            self._progress(length)
+            while self.received < self.size and self.received in self.chunks:
+                self.received += self.chunks[self.received]
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return self.received >= self.size
+
+    def _progress(self, length):
+        self.loaded += length
+        if self.loaded - self._notified >= self.size / 100.0:
+            self._notified = self.loaded
+            self.uploader.onprogress(self.filename, self.loaded, max(self.size, self.loaded))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.uploader._finish_upload(self)
+        path = os.path.join(self.uploader.savepath, self.filename)
+        # os.replace is not available in python 2
+        getattr(os, 'replace', os.rename)(self._temp_path, path)
+        if self._notified < self.loaded or self.loaded < self.size:
+            self.uploader.onprogress(self.filename, self.loaded, self.loaded)
+        if self.uploader.ondata.callback:
+            with open(path, 'rb') as f:
+                self.uploader.ondata(f.read(), self.filename)
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.uploader._uploads.pop(self.upload_id, None)
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
+
+
 class FileUploader(Container):
     """
     FileUploader widget:
         allows to upload multiple files to a specified folder.
         implements the onsuccess and onfailed events.
+        The files are written to disk as they are received, up to max_size bytes each (None for no limit).
+        With a chunk_size, the files are uploaded in chunks of that size, max_parallel_chunks at a time.
+        The chunks failed because of a network error are sent again, and an upload interrupted
+        is resumed from the chunks already received when the same file is selected again.
+        An upload not receiving chunks for upload_timeout seconds is discarded with its partial file,
+        and the chunks sent again for an upload complete are ignored for as long.
     """
     @property
     @editor_attribute_decorator("WidgetSpecific",'''If True multiple files can be 
@@ -4114,9 +4832,16 @@ class FileUploader(Container):
     def savepath(self, value): 
         self._savepath = value
 
-    def __init__(self, savepath='./', multiple_selection_allowed=False, accepted_files='*.*', *args, **kwargs):
+    def __init__(self, savepath='./', multiple_selection_allowed=False, accepted_files='*.*', max_size=None,
+                 chunk_size=None, max_parallel_chunks=4, upload_timeout=3600, *args, **kwargs):
         super(FileUploader, self).__init__(*args, **kwargs)
         self._savepath = savepath
+        self.max_size = max_size
+        self.upload_timeout = upload_timeout
+        # upload_id: FileUpload, the resumable uploads not complete
+        self._uploads = {}
+        # upload_id: (filename, size, chunk offsets, time), the resumable uploads complete
+        self._finished = {}
         self._multiple_selection_allowed = multiple_selection_allowed
         self.type = 'input'
         self.attributes['type'] = 'file'
@@ -4127,12 +4852,21 @@ class FileUploader(Container):
         self.EVENT_ON_FAILED = 'onfailed'
         self.EVENT_ON_DATA = 'ondata'
 
-        self.attributes[self.EVENT_ONCHANGE] = \
-            "var files = this.files;" \
-            "for(var i=0; i<files.length; i++){" \
-            "remi.uploadFile('%(id)s','%(evt_success)s','%(evt_failed)s','%(evt_data)s',files[i]);}" % {
-                'id': self.identifier, 'evt_success': self.EVENT_ON_SUCCESS, 'evt_failed': self.EVENT_ON_FAILED,
-                'evt_data': self.EVENT_ON_DATA}
+        if chunk_size:
+            self.attributes[self.EVENT_ONCHANGE] = \
+                "var files = this.files;" \
+                "for(var i=0; i<files.length; i++){" \
+                "remi.uploadFileChunked('%(id)s','%(evt_success)s','%(evt_failed)s',files[i],%(chunk_size)d," \
+                "%(max_parallel_chunks)d);}" % {
+                    'id': self.identifier, 'evt_success': self.EVENT_ON_SUCCESS, 'evt_failed': self.EVENT_ON_FAILED,
+                    'chunk_size': chunk_size, 'max_parallel_chunks': max_parallel_chunks}
+        else:
+            self.attributes[self.EVENT_ONCHANGE] = \
+                "var files = this.files;" \
+                "for(var i=0; i<files.length; i++){" \
+                "remi.uploadFile('%(id)s','%(evt_success)s','%(evt_failed)s','%(evt_data)s',files[i]);}" % {
+                    'id': self.identifier, 'evt_success': self.EVENT_ON_SUCCESS, 'evt_failed': self.EVENT_ON_FAILED,
+                    'evt_data': self.EVENT_ON_DATA}
 
     @decorate_set_on_listener("(self, emitter, filename)")
     @decorate_event
@@ -4144,11 +4878,69 @@ class FileUploader(Container):
     def onfailed(self, filename):
         return (filename, )
 
+    def open_upload(self, filename, size, upload_id=None):
+        """ Called by the server at the beginning of an upload, and for each chunk of a resumable upload.
+
+        Args:
+            filename (str): the name of the uploaded file
+            size (int): the file size in bytes
+            upload_id (str): the identifier of a resumable upload, given by the client
+
+        Returns:
+            FileUpload: the object writing the data as it is received,
+                None for a chunk of a resumable upload already complete
+        """
+        if self.max_size is not None and size > self.max_size:
+            raise ValueError('upload of %s exceeds %d bytes' % (filename, self.max_size))
+        if upload_id is None:
+            return FileUpload(self, filename, size)
+        self._expire_uploads()
+        finished = self._finished.get(upload_id)
+        if finished is not None:
+            if finished[:2] == (os.path.basename(filename), size):
+                return None
+            del self._finished[upload_id]
+        upload = self._uploads.get(upload_id)
+        if upload is not None and (upload.filename, upload.size) != (os.path.basename(filename), size):
+            upload.abort()
+            upload = None
+        if upload is None:
+            upload = self._uploads[upload_id] = FileUpload(self, filename, size, upload_id)
+        return upload
+
+    def upload_status(self, upload_id):
+        """ Returns the offsets of the chunks received of a resumable upload, as a json list.
+            Requested by the client before sending the chunks.
+        """
+        self._expire_uploads()
+        upload = self._uploads.get(upload_id)
+        if upload is not None:
+            offsets = sorted(upload.chunks)
+        else:
+            offsets = self._finished[upload_id][2] if upload_id in self._finished else []
+        return [json.dumps(offsets), {'Content-type': 'application/json', 'Cache-Control': 'no-store'}]
+
+    def _finish_upload(self, upload):
+        self._uploads.pop(upload.upload_id, None)
+        if upload.upload_id is not None:
+            self._finished[upload.upload_id] = (upload.filename, upload.size, sorted(upload.chunks), time.time())
+
+    def _expire_uploads(self):
+        """ Discards the resumable uploads idle for upload_timeout seconds, and forgets the ones complete. """
+        if self.upload_timeout is None:
+            return
+        expiry = time.time() - self.upload_timeout
+        for upload in [u for u in self._uploads.values() if u.last_activity < expiry]:
+            upload.abort()
+        for upload_id in [k for k, v in self._finished.items() if v[3] < expiry]:
+            del self._finished[upload_id]
+
     @decorate_set_on_listener("(self, emitter, filedata, filename)")
     @decorate_event
     def ondata(self, filedata, filename):
-        with open(os.path.join(self._savepath, filename), 'wb') as f:
-            f.write(filedata)
+        """ Emitted once the file is saved in the savepath, only if a listener is connected.
+            The whole file content is read back from disk, onsuccess is preferable for big files.
+        """
         return (filedata, filename)
 
     @decorate_set_on_listener("(self, emitter, filename, loaded, total)")
@@ -4176,12 +4968,12 @@ class FileDownloader(Container, _MixinTextualWidget):
         self._path_separator = path_separator
 
     def download(self):
-        with open(self._filename, 'rb') as f:
-            content = f.read()
+        # the file is streamed from disk by the server, and closed once sent
+        f = open(self._filename, 'rb')
         filename = quote(os.path.basename(self._filename))
         headers = {'Content-type': 'application/octet-stream',
                    'Content-Disposition': 'attachment; filename="{0}"; filename*=UTF-8\'\'{0}'.format(filename)}
-        return [content, headers]
+        return [f, headers]
 
 
 class Link(Container, _MixinTextualWidget):
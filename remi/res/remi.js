@@ -0,0 +1,512 @@
+/*
+   remi client runtime, served as /res:remi.<hash>.js where hash is the digest of this file,
+   so that browsers can cache it until it changes.
+   The settings of the page are in the remiConfig object, inlined by HEAD.set_internal_js:
+   host, maxPendingMessages, messagingTimeout, appIdentifier.
+*/
+/*'use strict';*/
+
+/*the same of remi.server._WEBSOCKET_SUBPROTOCOL*/
+var REMI_SUBPROTOCOL = 'remi.v2';
+
+var Remi = function() {
+this._pendingSendMessages = [];
+this._pendingUpdates = [];
+this._streams = {};
+this._ws = null;
+this._comTimeout = null;
+this._failedConnections = 0;
+this._openSocket();
+};
+
+// from http://stackoverflow.com/questions/5515869/string-length-in-bytes-in-javascript
+// using UTF8 strings I noticed that the javascript .length of a string returned less
+// characters than they actually were
+Remi.prototype._byteLength = function(str) {
+    // returns the byte length of an utf8 string
+    return str.length;
+};
+
+Remi.prototype._paramPacketize = function (ps){
+    var ret = '';
+    for (var pkey in ps) {
+        if( ret.length>0 )ret = ret + '|';
+        var pstring = pkey+'='+ps[pkey];
+        var pstring_length = this._byteLength(pstring);
+        pstring = pstring_length+'|'+pstring;
+        ret = ret + pstring;
+    }
+    return ret;
+};
+
+/*the DOM updates received are applied together, once per animation frame*/
+Remi.prototype._queueUpdate = function(update){
+    this._pendingUpdates.push(update);
+    if( document.hidden ){
+        /*animation frames are suspended for hidden pages*/
+        this._applyUpdates();
+    }else if( this._pendingUpdates.length==1 ){
+        var self = this;
+        window.requestAnimationFrame(function(){ self._applyUpdates(); });
+    }
+};
+
+Remi.prototype._applyUpdates = function(){
+    var updates = this._pendingUpdates;
+    this._pendingUpdates = [];
+    for(var i=0; i<updates.length; i++){
+        try{
+            updates[i]();
+        }catch(e){console.debug(e.message);}
+    }
+};
+
+/*an image frame of a StreamImage: the header length in 2 bytes big endian, the header 'widgetID,mimetype' and the image.
+  While an image is decoding the previous frame, only the latest frame received is kept*/
+Remi.prototype._onStreamFrame = function(buffer){
+    var data = new Uint8Array(buffer);
+    var end = 2 + ((data[0] << 8) | data[1]);
+    var head = String.fromCharCode.apply(null, data.subarray(2, end)).split(',');
+    var blob = new Blob([data.subarray(end)], {type: head[1]});
+    var stream = this._streams[head[0]];
+    if( !stream ){
+        stream = this._streams[head[0]] = {busy: false, next: null};
+    }
+    if( stream.busy ){
+        stream.next = blob;
+        return;
+    }
+    this._showStreamFrame(head[0], stream, blob);
+};
+
+Remi.prototype._showStreamFrame = function(widgetID, stream, blob){
+    var img = document.getElementById(widgetID);
+    if( !img ) return;
+    var self = this;
+    var url = URL.createObjectURL(blob);
+    var done = function(){
+        img.removeEventListener('load', done);
+        img.removeEventListener('error', done);
+        URL.revokeObjectURL(url);
+        stream.busy = false;
+        if( stream.next ){
+            var next = stream.next;
+            stream.next = null;
+            self._showStreamFrame(widgetID, stream, next);
+        }
+    };
+    stream.busy = true;
+    img.addEventListener('load', done);
+    img.addEventListener('error', done);
+    img.src = url;
+};
+
+Remi.prototype._updateWidget = function(idElem, content){
+    var focusedElement=-1;
+    var caretStart=-1;
+    var caretEnd=-1;
+    if (document.activeElement)
+    {
+        focusedElement = document.activeElement.id;
+        try{
+            caretStart = document.activeElement.selectionStart;
+            caretEnd = document.activeElement.selectionEnd;
+        }catch(e){console.debug(e.message);}
+    }
+
+    var elem = document.getElementById(idElem);
+    try{
+        elem.insertAdjacentHTML('afterend',content);
+        elem.parentElement.removeChild(elem);
+    }catch(e){
+        /*Microsoft EDGE doesn't support insertAdjacentHTML for SVGElement*/
+        var ns = document.createElementNS("http://www.w3.org/2000/svg",'tmp');
+        ns.innerHTML = content;
+        elem.parentElement.replaceChild(ns.firstChild, elem);
+        console.debug(e.message);
+    }
+
+    var elemToFocus = document.getElementById(focusedElement);
+    if( elemToFocus != null ){
+        elemToFocus.focus();
+        try{
+            elemToFocus = document.getElementById(focusedElement);
+            if(caretStart>-1 && caretEnd>-1) elemToFocus.setSelectionRange(caretStart, caretEnd);
+        }catch(e){console.debug(e.message);}
+    }
+};
+
+Remi.prototype._patchWidget = function(idElem, patch){
+    var elem = document.getElementById(idElem);
+    if( elem != null ){
+        this._patchElement(elem, patch);
+    }
+};
+
+/*the payloads are url encoded, unless the server accepted the raw text subprotocol*/
+Remi.prototype._decodePayload = function(content){
+    if(this._ws.protocol == REMI_SUBPROTOCOL) return content;
+    return decodeURIComponent(content);
+};
+
+/*with remi.v2 the message is sent as plain utf-8 text. The legacy protocol url encodes it,
+  unescaping its %xx sequences first as the former client did, so a text typed with such
+  sequences reaches the server changed only with the legacy protocol*/
+Remi.prototype._wsSend = function(message){
+    if(this._ws.protocol != REMI_SUBPROTOCOL) message = encodeURIComponent(unescape(message));
+    this._ws.send(message);
+};
+
+Remi.prototype._openSocket = function(){
+    var ws_wss = "ws";
+    try{
+        ws_wss = document.location.protocol.startsWith('https')?'wss':'ws';
+    }catch(ex){}
+
+    var self = this;
+    try{
+        host = remiConfig.host
+        if (host !== ''){
+            wss_url = `${ws_wss}://${host}/`
+        }
+        else{
+            host = document.location.host;
+            pathname = document.location.pathname;
+            wss_url = `${ws_wss}://${document.location.host}${pathname}`;
+        }
+
+        this._ws = new WebSocket(wss_url, REMI_SUBPROTOCOL);
+        this._ws.binaryType = 'arraybuffer';
+        console.debug('opening websocket');
+
+        this._ws.onopen = function(evt){
+            if(self._ws.readyState == 1){
+                self._ws.send('connected');
+
+                try {
+                    document.getElementById("loading").style.display = 'none';
+                } catch(err) {
+                    console.log('Error hiding loading overlay ' + err.message);
+                }
+
+                self._failedConnections = 0;
+
+                while(self._pendingSendMessages.length>0){
+                    self._wsSend(self._pendingSendMessages.shift()); /*without checking ack*/
+                }
+            }
+            else{
+                console.debug('onopen fired but the socket readyState was not 1');
+            }
+        };
+
+        this._ws.onmessage = function(evt){
+            var received_msg = evt.data;
+
+            if( typeof received_msg !== 'string' ){ /*binary, an image frame*/
+                self._onStreamFrame(received_msg);
+                return;
+            }
+
+            if( received_msg[0]=='0' ){ /*show_window*/
+                var index = received_msg.indexOf(',')+1;
+                /*var idRootNodeWidget = received_msg.substr(0,index-1);*/
+                var content = self._decodePayload(received_msg.substr(index,received_msg.length-index));
+                self._queueUpdate(function(){ document.body.innerHTML = content; });
+            }else if( received_msg[0]=='1' ){ /*update_widget*/
+                var index = received_msg.indexOf(',')+1;
+                var idElem = received_msg.substr(1,index-2);
+                var content = self._decodePayload(received_msg.substr(index,received_msg.length-index));
+                self._queueUpdate(function(){ self._updateWidget(idElem, content); });
+            }else if( received_msg[0]=='4' ){ /*patch_widget attributes and style*/
+                var index = received_msg.indexOf(',')+1;
+                var idElem = received_msg.substr(1,index-2);
+                var patch = JSON.parse(self._decodePayload(received_msg.substr(index)));
+                self._queueUpdate(function(){ self._patchWidget(idElem, patch); });
+            }else if( received_msg[0]=='5' ){ /*batch of widget updates and patches*/
+                var updates = JSON.parse(self._decodePayload(received_msg.substr(1)));
+                self._queueUpdate(function(){
+                    for(var i=0; i<updates.length; i++){
+                        if( updates[i][0]=='1' ){
+                            self._updateWidget(updates[i][1], updates[i][2]);
+                        }else if( updates[i][0]=='4' ){
+                            self._patchWidget(updates[i][1], updates[i][2]);
+                        }
+                    }
+                });
+            }else if( received_msg[0]=='2' ){ /*javascript*/
+                var content = received_msg.substr(1,received_msg.length-1);
+                var run = function(){
+                    try{
+                        eval(content);
+                    }catch(e){console.debug(e.message);};
+                };
+                /*the code may refer to the widgets of the updates still pending*/
+                if( self._pendingUpdates.length>0 ){
+                    self._queueUpdate(run);
+                }else{
+                    run();
+                }
+            }else if( received_msg[0]=='3' ){ /*ack*/
+                self._pendingSendMessages.shift() /*remove the oldest*/
+                if(self._comTimeout!==null)
+                    clearTimeout(self._comTimeout);
+            }
+        };
+
+        this._ws.onclose = function(evt){
+            /* websocket is closed. */
+            console.debug('Connection is closed... event code: ' + evt.code + ', reason: ' + evt.reason);
+            // Some explanation on this error: http://stackoverflow.com/questions/19304157/getting-the-reason-why-websockets-closed
+            // In practice, on a unstable network (wifi with a lot of traffic for example) this error appears
+            // Got it with Chrome saying:
+            // WebSocket connection to 'ws://x.x.x.x:y/' failed: Could not decode a text frame as UTF-8.
+            // WebSocket connection to 'ws://x.x.x.x:y/' failed: Invalid frame header
+
+            try {
+                document.getElementById("loading").style.display = '';
+            } catch(err) {
+                console.log('Error hiding loading overlay ' + err.message);
+            }
+
+            self._failedConnections += 1;
+
+            console.debug('failed connections=' + self._failedConnections + ' queued messages=' + self._pendingSendMessages.length);
+
+            if(self._failedConnections > 3) {
+
+                // check if the server has been restarted - which would give it a new websocket address,
+                // new state, and require a reload
+                console.debug('Checking if GUI still up ' + location.href);
+
+                var http = new XMLHttpRequest();
+                http.open('HEAD', location.href);
+                http.onreadystatechange = function() {
+                    if (http.status == 200) {
+                        // server is up but has a new websocket address, reload
+                        location.reload();
+                    }
+                };
+                http.send();
+
+                self._failedConnections = 0;
+            }
+
+            if(evt.code == 1006){
+                self._renewConnection();
+            }
+        };
+
+        this._ws.onerror = function(evt){
+            /* websocket is closed. */
+            /* alert('Websocket error...');*/
+            console.debug('Websocket error... event code: ' + evt.code + ', reason: ' + evt.reason);
+        };
+
+    }catch(ex){this._ws=false;alert('websocketnot supported or server unreachable');}
+}
+
+
+Remi.prototype._patchElement = function(elem, patch){
+    /* a null value means removed, the parts without changes are omitted */
+    for (var name in patch.attributes) {
+        var value = patch.attributes[name];
+        if( value === null ){
+            elem.removeAttribute(name);
+        }else{
+            elem.setAttribute(name, value);
+        }
+        /* these attributes set only the default state, once the user interacted */
+        if( name == 'value' ){
+            elem.value = (value === null) ? '' : value;
+        }else if( name == 'checked' || name == 'selected' ){
+            elem[name] = (value !== null);
+        }
+    }
+    for (var property in patch.style) {
+        var value = patch.style[property];
+        if( value === null ){
+            elem.style.removeProperty(property);
+        }else{
+            var priority = '';
+            var i = value.indexOf('!');
+            if( i > -1 && value.substr(i+1).trim() == 'important' ){
+                priority = 'important';
+                value = value.substr(0, i);
+            }
+            elem.style.setProperty(property, value, priority);
+        }
+    }
+    if( 'text' in patch ){
+        elem.textContent = patch.text;
+        if( elem.tagName == 'TEXTAREA' ){
+            elem.value = patch.text;
+        }
+    }
+};
+
+/*this uses websockets*/
+Remi.prototype.sendCallbackParam = function (widgetID,functionName,params /*a dictionary of name:value*/){
+    var paramStr = '';
+    if(params!==null) paramStr=this._paramPacketize(params);
+    var message = 'callback' + '/' + widgetID+'/'+functionName + '/' + paramStr;
+    this._pendingSendMessages.push(message);
+    if( this._pendingSendMessages.length < remiConfig.maxPendingMessages ){
+        if (this._ws !== null && this._ws.readyState == 1)
+            this._wsSend(message);
+            if(this._comTimeout===null)
+                this._comTimeout = setTimeout(this._checkTimeout, remiConfig.messagingTimeout);
+    }else{
+        console.debug('Renewing connection, this._ws.readyState when trying to send was: ' + this._ws.readyState)
+        this._renewConnection();
+    }
+};
+
+/*this uses websockets*/
+Remi.prototype.sendCallback = function (widgetID,functionName){
+    this.sendCallbackParam(widgetID,functionName,null);
+};
+
+Remi.prototype._renewConnection = function(){
+    // ws.readyState:
+    //A value of 0 indicates that the connection has not yet been established.
+    //A value of 1 indicates that the connection is established and communication is possible.
+    //A value of 2 indicates that the connection is going through the closing handshake.
+    //A value of 3 indicates that the connection has been closed or could not be opened.
+    if( this._ws.readyState == 1){
+        try{
+            this._ws.close();
+        }catch(err){};
+    }
+    else if(this._ws.readyState == 0){
+    // Don't do anything, just wait for the connection to be stablished
+    }
+    else{
+        this._openSocket();
+    }
+};
+
+Remi.prototype._checkTimeout = function(){
+    if(this._pendingSendMessages.length > 0)
+        this._renewConnection();
+};
+
+Remi.prototype.uploadFile = function(widgetID, eventSuccess, eventFail, eventData, file){
+    var url = '/';
+    var xhr = new XMLHttpRequest();
+    /* the onprogress event is emitted by the server, as the file is written */
+    var fd = new FormData();
+    xhr.open('POST', url, true);
+    xhr.setRequestHeader('filename', file.name);
+    xhr.setRequestHeader('filesize', file.size);
+    xhr.setRequestHeader('listener', widgetID);
+    xhr.setRequestHeader('listener_function', eventData);
+    xhr.onreadystatechange = function() {
+        if (xhr.readyState == 4 && xhr.status == 200) {
+            /* Every thing ok, file uploaded */
+            var params={};params['filename']=file.name;
+            remi.sendCallbackParam(widgetID, eventSuccess,params);
+            console.log('upload success: ' + file.name);
+        }else if(xhr.readyState == 4){
+            var params={};params['filename']=file.name;
+            remi.sendCallbackParam(widgetID,eventFail,params);
+            console.log('upload failed: ' + file.name);
+        }
+    };
+
+    fd.append('upload_file', file);
+    xhr.send(fd);
+};
+
+/* Resumable upload: the file is sent in chunks, maxParallel at a time. A chunk failed because of
+   a network or server error is sent again after a delay, up to UPLOAD_CHUNK_RETRIES times; a chunk
+   rejected (400) fails the upload. The chunks already received by the server, as for an upload
+   interrupted before, are asked first and not sent again. */
+var UPLOAD_CHUNK_RETRIES = 5;
+Remi.prototype.uploadFileChunked = function(widgetID, eventSuccess, eventFail, file, chunkSize, maxParallel){
+    var uploadID = [file.size, file.lastModified, file.name.replace(/[^\w.-]/g, '_')].join('-');
+    var pending = [];
+    for(var offset = 0; offset < file.size || offset == 0; offset += chunkSize){
+        pending.push(offset);
+    }
+    var active = 0;
+    var failed = false;
+
+    var fail = function(){
+        if(failed) return;
+        failed = true;
+        remi.sendCallbackParam(widgetID, eventFail, {'filename': file.name});
+        console.log('upload failed: ' + file.name);
+    };
+    var next = function(){
+        if(failed) return;
+        if(active == 0 && pending.length == 0){
+            remi.sendCallbackParam(widgetID, eventSuccess, {'filename': file.name});
+            console.log('upload success: ' + file.name);
+            return;
+        }
+        while(active < maxParallel && pending.length > 0){
+            send(pending.shift(), 0);
+        }
+    };
+    var retry = function(offset, attempt){
+        if(attempt >= UPLOAD_CHUNK_RETRIES){
+            fail();
+            return;
+        }
+        active++;
+        setTimeout(function(){
+            active--;
+            if(!failed) send(offset, attempt + 1);
+        }, 500 * Math.pow(2, attempt));
+    };
+    var send = function(offset, attempt){
+        active++;
+        var xhr = new XMLHttpRequest();
+        xhr.open('POST', '/', true);
+        xhr.setRequestHeader('filename', file.name);
+        xhr.setRequestHeader('filesize', file.size);
+        xhr.setRequestHeader('listener', widgetID);
+        xhr.setRequestHeader('upload_id', uploadID);
+        xhr.setRequestHeader('upload_offset', offset);
+        xhr.onload = function(){
+            active--;
+            if(xhr.status == 200){
+                next();
+            }else if(xhr.status == 400){
+                fail();
+            }else{
+                retry(offset, attempt);
+            }
+        };
+        xhr.onerror = xhr.ontimeout = function(){
+            active--;
+            retry(offset, attempt);
+        };
+        xhr.send(file.slice(offset, offset + chunkSize));
+    };
+
+    var status = new XMLHttpRequest();
+    status.open('GET', '/' + widgetID + '/upload_status?upload_id=' + uploadID, true);
+    status.onload = function(){
+        if(status.status == 200){
+            var received = JSON.parse(status.responseText);
+            pending = pending.filter(function(offset){ return received.indexOf(offset) < 0; });
+        }
+        next();
+    };
+    status.onerror = next;
+    status.send();
+};
+
+window.onerror = function(message, source, lineno, colno, error) {
+    var params={};params['message']=message;
+    params['source']=source;
+    params['lineno']=lineno;
+    params['colno']=colno;
+    params['error']=JSON.stringify(error);
+    remi.sendCallbackParam(remiConfig.appIdentifier,'onerror',params);
+    return false;
+};
+
+window.remi = new Remi();
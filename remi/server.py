@@ -47,67 +47,150 @@ except ImportError:
     from urllib.parse import unquote_to_bytes
     from urllib.parse import urlparse
     from urllib.parse import parse_qs
-import io
+import json
+import collections
 import weakref
-
-# cgi.FieldStorage was removed in Python 3.13 (deprecated since 3.11).
-# Provide a minimal replacement using email.parser when cgi is absent.
-try:
-    from cgi import FieldStorage as _FieldStorage
-    _HAS_CGI = True
-except ImportError:
-    import email.parser as _email_parser
-    _HAS_CGI = False
-
-    class _FieldItem:
-        """Minimal stand-in for a cgi.FieldStorage field (file upload part)."""
-        def __init__(self, filename, data):
-            self.filename = filename
-            self.file = io.BytesIO(data if data is not None else b'')
-
-    class _FieldStorage:
-        """Minimal stand-in for cgi.FieldStorage, used only in do_POST (file uploads)."""
-        def __init__(self, fp, headers, environ):
-            self._fields = {}
-            content_length = int(headers.get('Content-Length', 0))
-            body = fp.read(content_length)
-            content_type = environ.get('CONTENT_TYPE', headers.get('Content-Type', ''))
-            raw = ('Content-Type: %s\r\n\r\n' % content_type).encode('utf-8') + body
-            msg = _email_parser.BytesParser().parsebytes(raw)
-            if msg.is_multipart():
-                for part in msg.get_payload():
-                    name = part.get_param('name', header='content-disposition')
-                    filename = part.get_param('filename', header='content-disposition')
-                    if name:
-                        data = part.get_payload(decode=True)
-                        self._fields[name] = _FieldItem(filename, data)
-
-        def keys(self):
-            return self._fields.keys()
-
-        def __getitem__(self, key):
-            return self._fields[key]
+import stat
+import email.utils
 
 import zlib
 
-import select
+# optional, brotli compressed responses are sent only if available
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 
-def gzip_encode(content):
-    gzip_compress = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+def gzip_encode(content, level=9):
+    gzip_compress = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
     data = gzip_compress.compress(content) + gzip_compress.flush()
     return data
 
+
+# the content compressed at each request, like the page, gets a fast level,
+# the static files are compressed once for the cache and get the best one
+_DYNAMIC_GZIP_LEVEL = 6
+_DYNAMIC_BROTLI_QUALITY = 5
+_STATIC_BROTLI_QUALITY = 11
+
+
+def compress_content(content, encoding, dynamic=False):
+    """ Compresses content with encoding, 'br' or 'gzip'.
+        dynamic selects the fast compression level, for the content that is not cached.
+    """
+    if encoding == 'br':
+        return brotli.compress(content, quality=_DYNAMIC_BROTLI_QUALITY if dynamic else _STATIC_BROTLI_QUALITY)
+    return gzip_encode(content, _DYNAMIC_GZIP_LEVEL if dynamic else 9)
+
+
+def select_content_encoding(accept_encoding):
+    """ Returns the content encoding to use among the ones accepted by the client
+        ('br' if brotli is available, 'gzip'), None for no compression.
+    """
+    accepted = set()
+    for token in (accept_encoding or '').split(','):
+        coding, _, params = token.partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                pass
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+class CompressedCache(object):
+    """ Size bounded in-memory cache of the compressed variants of the static files,
+        the least recently used ones are discarded first. The max_size 0 disables the compression.
+        Entries bigger than a quarter of the cache are not compressed at all, and are
+        sent as they are.
+    """
+
+    # mimetypes worth to be compressed, besides text/*
+    COMPRESSIBLE = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def compressible(cls, mimetype):
+        return mimetype.startswith('text/') or mimetype in cls.COMPRESSIBLE
+
+    def fits(self, length):
+        return length <= self.max_size // 4
+
+    def get(self, key, encoding, load):
+        """ Returns the content identified by key compressed with encoding.
+            load is called on miss, and returns the uncompressed content.
+        """
+        key = (key, encoding)
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is not None:
+                # reinserted, to move it at the end
+                self._entries[key] = data
+                self.hits += 1
+                return data
+            self.misses += 1
+        data = compress_content(load(), encoding)
+        with self._lock:
+            if not key in self._entries:
+                self._entries[key] = data
+                self.size += len(data)
+            while self.size > self.max_size:
+                self.size -= len(self._entries.popitem(last=False)[1])
+        return data
+
+    def as_dict(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': self.size, 'entries': len(self._entries)}
+
 clients = {}
 runtimeInstances = weakref.WeakValueDictionary()
 
 pyLessThan3 = sys.version_info < (3,)
 
 
+_MSG_BATCH = '5'
+_MSG_PATCH = '4'
 _MSG_ACK = '3'
 _MSG_JS = '2'
 _MSG_UPDATE = '1'
 
+# the json of the patches and of the batches, the same whether a patch is sent alone or in a batch
+_UPDATE_JSON_OPTIONS = {'ensure_ascii': False, 'separators': (',', ':')}
+
+_OPCODE_TEXT = 0x1
+_OPCODE_BINARY = 0x2
+_OPCODE_CLOSE = 0x8
+_OPCODE_PING = 0x9
+_OPCODE_PONG = 0xA
+
+# close status code of a received message bigger than websocket_max_message_size
+_CLOSE_MESSAGE_TOO_BIG = 1009
+
+# incoming frames up to this size are read into a per-connection buffer that is reused
+_FRAME_BUFFER_KEEP_SIZE = 1024 * 1024
+
+# websocket subprotocol of the clients that exchange plain utf-8 text, instead of url quoted payloads
+_WEBSOCKET_SUBPROTOCOL = 'remi.v2'
+
+# RFC 7692, the tail that a sync flush appends to a deflate stream and that is not sent on the wire
+_DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
 
 def to_websocket(data):
     # encoding end decoding utility function
@@ -123,6 +206,44 @@ def from_websocket(data):
     return unquote(data, encoding='utf-8')
 
 
+def websocket_frame_header(opcode, length, compressed=False):
+    # builds the header of a final, unmasked websocket frame
+    # compressed frames have the RSV1 bit set, as defined by permessage-deflate
+    out = bytearray()
+    out.append(0x80 | (0x40 if compressed else 0) | opcode)
+    if length <= 125:
+        out.append(length)
+    elif length <= 65535:
+        out.append(126)
+        out += struct.pack('>H', length)
+    else:
+        out.append(127)
+        out += struct.pack('>Q', length)
+    return out
+
+
+def websocket_unmask(data, mask):
+    """ Unmasks in place the payload of a client websocket frame.
+        The whole buffer gets XORed at once as a big integer, instead of byte per byte.
+
+        Args:
+            data (bytearray, memoryview): the writable frame payload
+            mask (bytes): the 4 bytes masking key
+    """
+    length = len(data)
+    if length == 0:
+        return
+    if pyLessThan3:
+        mask = bytearray(mask)
+        unmasked = bytearray(data)
+        for i in range(length):
+            unmasked[i] ^= mask[i % 4]
+        data[:] = bytes(unmasked)
+        return
+    mask = (mask * (length // 4 + 1))[:length]
+    data[:] = (int.from_bytes(data, 'little') ^ int.from_bytes(mask, 'little')).to_bytes(length, 'little')
+
+
 def encode_text(data):
     if not pyLessThan3:
         return data.encode('utf-8')
@@ -141,6 +262,500 @@ def get_method_by_id(_id):
     return runtimeInstances.get(str(_id), None)
 
 
+def parse_byte_range(header, size):
+    """ Parses the value of a Range request header, for a resource of the given size.
+        Returns the (first, last) positions of the requested bytes, both included,
+        None if the header is not a single byte range and so the whole resource has to be sent,
+        False if the range can't be satisfied.
+    """
+    unit, _, ranges = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, sep, last = ranges.strip().partition('-')
+    try:
+        if not sep:
+            return None
+        if not first:
+            # suffix range, the last bytes
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(0, size - length), size - 1
+        first = int(first)
+        last = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        return False
+    if first > last:
+        return None
+    return first, min(last, size - 1)
+
+
+def parse_websocket_extensions(header):
+    """ Parses the Sec-WebSocket-Extensions header
+        returns a list of offers like [('permessage-deflate', {'server_max_window_bits': '10'})]
+        parameters without value are given as None
+    """
+    offers = []
+    for offer in header.split(','):
+        tokens = [t.strip() for t in offer.split(';')]
+        if not tokens[0]:
+            continue
+        params = {}
+        for tok in tokens[1:]:
+            if not tok:
+                continue
+            name, sep, value = tok.partition('=')
+            params[name.strip()] = value.strip().strip('"') if sep else None
+        offers.append((tokens[0], params))
+    return offers
+
+
+def parse_header_params(value):
+    """ Returns the parameters of a header value like 'form-data; name="a"; filename="b.txt"'
+        as a dict with lowercase names, {'name': 'a', 'filename': 'b.txt'}
+    """
+    params = {}
+    for m in re.finditer(r';\s*([\w*-]+)\s*=\s*(?:"((?:[^"\\]|\\.)*)"|([^;\s]*))', ';' + value):
+        params[m.group(1).lower()] = m.group(2) if m.group(2) is not None else m.group(3)
+    return params
+
+
+class MultipartPart(object):
+    """ A part of a multipart/form-data body, with its headers, field name and file name
+        (None for a regular field). Iterating it gives its data chunks as they are read.
+    """
+
+    def __init__(self, headers, chunks):
+        self.headers = headers
+        params = parse_header_params(headers.get('content-disposition', ''))
+        self.name = params.get('name')
+        self.filename = params.get('filename')
+        self._chunks = chunks
+
+    def __iter__(self):
+        return self._chunks
+
+
+class MultipartParser(object):
+    """ Incremental parser of a multipart/form-data request body, read in chunks of fixed size
+        and never beyond its Content-Length, so that a part is never held in memory as a whole.
+        Iterating the parser gives the parts, the data of a part not consumed is skipped.
+        A malformed or truncated body raises ValueError.
+    """
+
+    # maximum length of the headers of a part
+    max_head_length = 16384
+
+    def __init__(self, fp, content_type, content_length, chunk_size=65536):
+        boundary = parse_header_params(content_type).get('boundary')
+        if not boundary:
+            raise ValueError('multipart boundary missing')
+        self._fp = fp
+        self._delimiter = b'\r\n--' + boundary.encode('latin-1')
+        self._remaining = content_length
+        self._chunk_size = chunk_size
+        # the first delimiter is not preceded by a line break
+        self._buffer = b'\r\n'
+
+    def __iter__(self):
+        for _ in self._until(self._delimiter):
+            # the preamble
+            pass
+        while True:
+            self._fill_to(2)
+            marker, self._buffer = self._buffer[:2], self._buffer[2:]
+            if marker == b'--':
+                break
+            if marker != b'\r\n':
+                raise ValueError('malformed multipart body')
+            self._fill_to(2)
+            if self._buffer.startswith(b'\r\n'):
+                self._buffer = self._buffer[2:]
+                head = b''
+            else:
+                head = b''.join(self._until(b'\r\n\r\n', self.max_head_length))
+            headers = {}
+            for line in head.decode('utf-8', 'replace').split('\r\n'):
+                name, sep, value = line.partition(':')
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            part = MultipartPart(headers, self._until(self._delimiter))
+            yield part
+            for _ in part:
+                pass
+        # the epilogue, the body is consumed to its end as the connection can be reused
+        while self._remaining > 0:
+            data = self._fp.read(min(self._chunk_size, self._remaining))
+            if not data:
+                break
+            self._remaining -= len(data)
+
+    def _until(self, separator, limit=None):
+        """ Yields the data up to the separator, that is consumed. """
+        keep = len(separator) - 1
+        length = 0
+        while True:
+            i = self._buffer.find(separator)
+            if i >= 0:
+                data, self._buffer = self._buffer[:i], self._buffer[i + len(separator):]
+                if data:
+                    yield data
+                return
+            if len(self._buffer) > keep:
+                data, self._buffer = self._buffer[:-keep], self._buffer[-keep:]
+                length += len(data)
+                if limit is not None and length > limit:
+                    raise ValueError('multipart part head too long')
+                yield data
+            self._fill()
+
+    def _fill_to(self, length):
+        while len(self._buffer) < length:
+            self._fill()
+
+    def _fill(self):
+        data = self._fp.read(min(self._chunk_size, self._remaining)) if self._remaining > 0 else b''
+        if not data:
+            raise ValueError('multipart body truncated')
+        self._remaining -= len(data)
+        self._buffer = self._buffer + data
+
+
+class WebSocketCounters(object):
+    """ Websocket traffic counters. The bytes are counted as sent on the wire (frame headers excluded),
+        the payload bytes as they are before compression, their ratio is the compression saving.
+        Outgoing messages discarded by the outbound queue are counted as dropped or coalesced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.payload_bytes_in = 0
+        self.payload_bytes_out = 0
+        self.dropped_messages = 0
+        self.coalesced_messages = 0
+
+    def count_in(self, wire_length, payload_length):
+        with self._lock:
+            self.bytes_in += wire_length
+            self.payload_bytes_in += payload_length
+
+    def count_out(self, wire_length, payload_length):
+        with self._lock:
+            self.bytes_out += wire_length
+            self.payload_bytes_out += payload_length
+
+    def count_discarded(self, dropped, coalesced):
+        with self._lock:
+            self.dropped_messages += dropped
+            self.coalesced_messages += coalesced
+
+    def as_dict(self):
+        with self._lock:
+            return {'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                    'payload_bytes_in': self.payload_bytes_in, 'payload_bytes_out': self.payload_bytes_out,
+                    'dropped_messages': self.dropped_messages, 'coalesced_messages': self.coalesced_messages}
+
+
+class BroadcastMessage(str):
+    """ A message queued to several websocket clients. The frame is built by the first writer
+        and shared by the connections that do not compress it, so that an update sent to
+        many viewers gets serialized once.
+    """
+    # (frame, payload length), set by the first writer
+    frame = None
+
+
+class BinaryMessage(bytes):
+    """ A binary message queued to websocket clients. Binary messages are not compressed,
+        so the frame is built once and shared by all the connections.
+        A message with a key replaces the one with the same key still waiting in the queue,
+        so that a client that lags gets only the latest.
+    """
+    key = None
+    _frame = None
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            # concurrent writers could build it twice, the result is the same
+            self._frame = websocket_frame_header(_OPCODE_BINARY, len(self)) + self
+        return self._frame
+
+
+def stream_frame_message(widget_id, mimetype, data):
+    """ Returns the binary message of an image frame for a widget, see gui.StreamImage.
+        The payload is the length of the header 'widget_id,mimetype' in 2 bytes big endian,
+        the header and the data.
+    """
+    head = encode_text('%s,%s' % (widget_id, mimetype))
+    if len(head) > 0xffff:
+        raise ValueError('stream frame header of %d bytes, the limit is 65535' % len(head))
+    message = BinaryMessage(struct.pack('!H', len(head)) + head + data)
+    message.key = widget_id
+    return message
+
+
+class OutboundQueue(object):
+    """ Bounded queue of the messages waiting to be written to a websocket client.
+        Messages are put by any thread (App updates, callbacks acks) and taken by the writer
+        of the connection, so that a slow client does not block the App.
+        A binary message with a key replaces the queued one with the same key, if any.
+        When the queue is full, the policy decides what happens:
+          'disconnect'   the queue gets closed, the client will reconnect and get a full refresh
+          'drop-oldest'  the oldest queued widget update is discarded
+          'coalesce'     the queued widget updates replaced by the new message are discarded,
+                         then the oldest widget update if the queue is still full
+        Only the widget updates and the stream frames are discarded, never the callbacks acks
+        nor the javascript: without a widget update to discard the queue gets closed as by 'disconnect'.
+    """
+
+    POLICIES = ('disconnect', 'drop-oldest', 'coalesce')
+
+    _UNPARSED = object()
+
+    def __init__(self, maxlen, policy, decode_payload=None, counters=()):
+        if not policy in self.POLICIES:
+            raise ValueError('outbound queue policy must be one of %s' % (self.POLICIES,))
+        self.maxlen = maxlen
+        self.policy = policy
+        self._decode_payload = decode_payload or (lambda payload: payload)
+        self._counters = counters
+        self._messages = collections.deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        self.max_depth = 0
+        # called after a message is queued or the queue is closed, by writers that can't wait on get
+        self.notify = None
+
+    @property
+    def depth(self):
+        return len(self._messages)
+
+    def put(self, message):
+        """ Returns False if the message can't be queued because the queue is closed """
+        dropped = coalesced = 0
+        with self._condition:
+            if self.closed:
+                return False
+            if self._replace(message):
+                dropped = 1
+            else:
+                if len(self._messages) >= self.maxlen:
+                    if self.policy == 'disconnect':
+                        self.close()
+                        return False
+                    if self.policy == 'coalesce':
+                        coalesced = self._coalesce(message)
+                    while len(self._messages) >= self.maxlen:
+                        if not self._drop_oldest_update():
+                            self.close()
+                            return False
+                        dropped += 1
+                # the widget identifiers of the message are parsed only if required to coalesce it
+                self._messages.append([message, self._UNPARSED])
+                self.max_depth = max(self.max_depth, len(self._messages))
+            self._condition.notify()
+        if dropped or coalesced:
+            for counters in self._counters:
+                counters.count_discarded(dropped, coalesced)
+        if self.notify is not None:
+            self.notify()
+        return True
+
+    def get(self, timeout=None):
+        """ Waits and returns the next message, None once the queue gets closed """
+        with self._condition:
+            while not self._messages and not self.closed:
+                if not self._condition.wait(timeout) and timeout is not None:
+                    return None
+            if self.closed:
+                return None
+            return self._messages.popleft()[0]
+
+    def pop(self):
+        """ Returns the next message without waiting, None if the queue is empty or closed """
+        with self._condition:
+            if self.closed or not self._messages:
+                return None
+            return self._messages.popleft()[0]
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._messages.clear()
+            self._condition.notify_all()
+        if self.notify is not None:
+            self.notify()
+
+    def _replace(self, message):
+        """ Replaces the queued message with the same key of the given one, returns True if found """
+        key = getattr(message, 'key', None)
+        if key is None:
+            return False
+        for queued in self._messages:
+            if getattr(queued[0], 'key', None) == key:
+                queued[0] = message
+                return True
+        return False
+
+    def _drop_oldest_update(self):
+        """ Discards the oldest queued widget update or stream frame, returns False if there is none """
+        for i, queued in enumerate(self._messages):
+            message = queued[0]
+            if isinstance(message, BinaryMessage):
+                droppable = getattr(message, 'key', None) is not None
+            else:
+                droppable = message[:1] in (_MSG_UPDATE, _MSG_PATCH, _MSG_BATCH)
+            if droppable:
+                del self._messages[i]
+                return True
+        return False
+
+    def _coalesce(self, message):
+        new_ids = self._widget_ids(message)
+        if new_ids is None:
+            return 0
+        replaced = new_ids[0]
+        kept = collections.deque()
+        for queued in self._messages:
+            if queued[1] is self._UNPARSED:
+                queued[1] = self._widget_ids(queued[0])
+            ids = queued[1]
+            # a show window message replaces every update, otherwise all the widgets of the
+            # queued message must be replaced by the new one
+            if ids is not None and (replaced is None or (ids[0] is not None and ids[0] | ids[1] <= replaced)):
+                continue
+            kept.append(queued)
+        coalesced = len(self._messages) - len(kept)
+        self._messages = kept
+        return coalesced
+
+    def _widget_ids(self, message):
+        """ Returns the sets (replaced, patched) of the widget identifiers updated by the message,
+            replaced is None for the show window message. Returns None for the other messages.
+        """
+        msg_type = message[:1]
+        if msg_type == '0':
+            return None, set()
+        if msg_type in (_MSG_UPDATE, _MSG_PATCH):
+            __id = message[1:message.index(',')]
+            return (set([__id]), set()) if msg_type == _MSG_UPDATE else (set(), set([__id]))
+        if msg_type == _MSG_BATCH:
+            updates = json.loads(self._decode_payload(message[1:]))
+            return (set(u[1] for u in updates if u[0] == _MSG_UPDATE),
+                    set(u[1] for u in updates if u[0] == _MSG_PATCH))
+        return None
+
+
+class SessionManager(object):
+    """ Keeps track of the activity of the sessions stored in the global clients dict
+        and evicts the ones idle for more than session_timeout seconds, or the least
+        recently used ones when there are more than max_sessions.
+        A session with connected websockets is never idle.
+        None disables the respective limit.
+    """
+
+    def __init__(self, session_timeout=None, max_sessions=None):
+        self.session_timeout = session_timeout
+        self.max_sessions = max_sessions
+        self.evicted_sessions = 0
+        self._lock = threading.Lock()
+        # session -> time of the last activity, the least recently used first
+        self._last_access = collections.OrderedDict()
+        self._log = logging.getLogger('remi.server.sessions')
+
+    def add(self, session, app):
+        """ Stores a new session, evicting the least recently used ones if max_sessions is exceeded.
+        """
+        with self._lock:
+            clients[session] = app
+            self._last_access.pop(session, None)
+            self._last_access[session] = time.time()
+            evicted = []
+            if self.max_sessions:
+                while len(self._last_access) > self.max_sessions:
+                    evicted.append(self._last_access.popitem(last=False)[0])
+            evicted = [(s, clients.pop(s, None)) for s in evicted]
+        self._evicted(evicted, 'max_sessions exceeded')
+
+    def touch(self, session):
+        with self._lock:
+            # reinserted, to move it at the end
+            if self._last_access.pop(session, None) is not None:
+                self._last_access[session] = time.time()
+
+    def evict_idle(self):
+        """ Evicts the sessions idle for more than session_timeout seconds.
+        """
+        if not self.session_timeout:
+            return
+        now = time.time()
+        evicted = []
+        with self._lock:
+            for session, last_access in list(self._last_access.items()):
+                if now - last_access <= self.session_timeout:
+                    # the following ones are more recent
+                    break
+                app = clients.get(session)
+                if app is not None and len(app.websockets):
+                    # the page is still open
+                    del self._last_access[session]
+                    self._last_access[session] = now
+                    continue
+                del self._last_access[session]
+                evicted.append((session, clients.pop(session, None)))
+        self._evicted(evicted, 'idle')
+
+    def _evicted(self, evicted, reason):
+        for session, app in evicted:
+            self.evicted_sessions += 1
+            if app is None:
+                continue
+            self._log.info('session evicted (%s), %s sessions left' % (reason, len(self._last_access)))
+            # noinspection PyBroadException
+            try:
+                app.on_session_evicted()
+            except Exception:
+                self._log.error('exception in App.on_session_evicted method', exc_info=True)
+            app.on_close()
+
+    @staticmethod
+    def count_widgets(tag):
+        """ Returns the number of tags in the tree of tag, tag included.
+        """
+        count = 0
+        stack = [tag]
+        while stack:
+            tag = stack.pop()
+            count += 1
+            stack.extend(child for child in tag.children.values() if hasattr(child, 'children'))
+        return count
+
+    def stats(self):
+        """ Returns the number of live sessions and, for each one, the idle time,
+            the connected websockets and the approximate number of widgets.
+        """
+        now = time.time()
+        with self._lock:
+            items = list(self._last_access.items())
+        sessions = []
+        for session, last_access in items:
+            app = clients.get(session)
+            if app is None:
+                continue
+            with app.update_lock:
+                widgets = self.count_widgets(app.page)
+            sessions.append({'idle_seconds': round(now - last_access, 1),
+                             'websockets': len(app.websockets), 'widgets': widgets})
+        return {'live_sessions': len(sessions), 'evicted_sessions': self.evicted_sessions,
+                'session_timeout': self.session_timeout, 'max_sessions': self.max_sessions,
+                'sessions': sessions}
+
+
 def parse_session_cookie(cookie_to_cook):
     """ cookie_to_cook = http_header['cookie']
     """
@@ -157,14 +772,279 @@ def parse_session_cookie(cookie_to_cook):
     return session_value
 
 
-class WebSocketsHandler(socketserver.StreamRequestHandler):
+class _MessageTooBig(ValueError):
+    """ A received websocket message, or its inflated payload, exceeds websocket_max_message_size """
+
+
+class WebSocketProtocol(object):
+    """ Websocket protocol logic that does not depend on the way the connection is served.
+        It is shared by the handlers of the threaded and of the asyncio server engines,
+        that only have to provide the socket reading and _write(data), that writes
+        the bytes to the client and can be called by any thread.
+    """
 
     magic = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
 
+    _fragments = None
+    _fragments_compressed = False
+    _deflate_params = None
+
+    # True if the client negotiated the remi.v2 subprotocol, its payloads are not url quoted
+    raw_payload = False
+
+    # the messages waiting to be written, created at handshake
+    outbound_queue = None
+
+    def _handshake_response(self):
+        """ Checks the session of the connecting client and returns the http upgrade response,
+            or None if the handshake has to be refused.
+        """
+        key = self.headers['Sec-WebSocket-Key']
+        self.session = None
+        if 'cookie' in self.headers:
+            if self.headers['cookie']!=None:
+                self.session = parse_session_cookie(self.headers['cookie'])
+        if self.session == None:
+            return None
+        if not self.session in clients.keys():
+            return None
+
+        digest = hashlib.sha1((key.encode("utf-8")+self.magic))
+        digest = digest.digest()
+        digest = base64.b64encode(digest)
+        response = 'HTTP/1.1 101 Switching Protocols\r\n'
+        response += 'Upgrade: websocket\r\n'
+        response += 'Connection: Upgrade\r\n'
+        extension = self._negotiate_compression()
+        if extension:
+            response += 'Sec-WebSocket-Extensions: %s\r\n' % extension
+        protocols = [p.strip() for p in (self.headers.get('Sec-WebSocket-Protocol') or '').split(',')]
+        self.raw_payload = _WEBSOCKET_SUBPROTOCOL in protocols
+        if self.raw_payload:
+            response += 'Sec-WebSocket-Protocol: %s\r\n' % _WEBSOCKET_SUBPROTOCOL
+        self._create_outbound_queue()
+        response += 'Sec-WebSocket-Accept: %s\r\n\r\n' % digest.decode("utf-8")
+        return response.encode("utf-8")
+
+    def _negotiate_compression(self):
+        """ Accepts the first permessage-deflate offer (RFC 7692) whose parameters can be honoured.
+            Returns the value of the Sec-WebSocket-Extensions response header, or None if
+            compression is disabled or not offered by the client.
+        """
+        self._deflate_params = None
+        if not self.server.websocket_compression:
+            return None
+        for name, params in parse_websocket_extensions(self.headers.get('Sec-WebSocket-Extensions') or ''):
+            if name != 'permessage-deflate':
+                continue
+            window_bits = self.server.websocket_compression_window_bits
+            no_context_takeover = False
+            extension = [name]
+            accepted = True
+            for param, value in params.items():
+                valid_bits = value is not None and value.isdigit() and 8 <= int(value) <= 15
+                if param == 'server_no_context_takeover' and value is None:
+                    no_context_takeover = True
+                elif param == 'client_no_context_takeover' and value is None:
+                    extension.append(param)
+                elif param == 'server_max_window_bits' and valid_bits:
+                    window_bits = min(window_bits, int(value))
+                elif param == 'client_max_window_bits' and (value is None or valid_bits):
+                    # the inflater uses the maximum window, any client window size can be decoded
+                    pass
+                else:
+                    accepted = False
+            # zlib does not produce raw deflate streams with a 256 bytes window
+            if not accepted or window_bits < 9:
+                continue
+            if no_context_takeover:
+                extension.append('server_no_context_takeover')
+            if window_bits < 15:
+                extension.append('server_max_window_bits=%d' % window_bits)
+            self._deflate_params = (window_bits, no_context_takeover)
+            self._deflater = None
+            self._inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+            return '; '.join(extension)
+        return None
+
+    def _create_outbound_queue(self):
+        self.outbound_queue = OutboundQueue(self.server.websocket_queue_length, self.server.websocket_queue_policy,
+                                            None if self.raw_payload else from_websocket,
+                                            (self.counters, self.server.websocket_counters))
+
+    def _compress(self, payload):
+        window_bits, no_context_takeover = self._deflate_params
+        if self._deflater is None or no_context_takeover:
+            self._deflater = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -window_bits)
+        data = self._deflater.compress(payload) + self._deflater.flush(zlib.Z_SYNC_FLUSH)
+        # the sync flush tail is implied by the protocol, it is not sent
+        return data[:-len(_DEFLATE_TAIL)]
+
+    def _text_frame(self, message):
+        """ Encodes a text message in a websocket frame, compressed if negotiated with the client
+            and if the message is not smaller than the configured threshold.
+            Frames have to be built and written in the same order, the deflate context is shared.
+        """
+        if self._deflate_params is None and isinstance(message, BroadcastMessage):
+            if message.frame is None:
+                # concurrent writers could build it twice, the result is the same
+                payload = encode_text(message)
+                message.frame = (websocket_frame_header(_OPCODE_TEXT, len(payload)) + payload, len(payload))
+            frame, payload_length = message.frame
+            self._count_out(payload_length, payload_length)
+            return frame
+        payload = encode_text(message)
+        payload_length = len(payload)
+        compressed = self._deflate_params is not None and \
+            payload_length >= self.server.websocket_compression_threshold
+        if compressed:
+            payload = self._compress(payload)
+        self._count_out(len(payload), payload_length)
+        return websocket_frame_header(_OPCODE_TEXT, len(payload), compressed) + payload
+
+    def _message_frame(self, message):
+        """ Returns the websocket frame of a queued message, text or binary """
+        if isinstance(message, BinaryMessage):
+            self._count_out(len(message), len(message))
+            return message.frame
+        return self._text_frame(message)
+
+    def _count_in(self, wire_length, payload_length):
+        self.counters.count_in(wire_length, payload_length)
+        self.server.websocket_counters.count_in(wire_length, payload_length)
+
+    def _count_out(self, wire_length, payload_length):
+        self.counters.count_out(wire_length, payload_length)
+        self.server.websocket_counters.count_out(wire_length, payload_length)
+
+    def _log_counters(self):
+        c = self.counters
+        self._log.info('ws ending websocket service, bytes in: %d (%d uncompressed) out: %d (%d uncompressed), '
+                       'messages dropped: %d coalesced: %d, max queue depth: %d' % (
+                       c.bytes_in, c.payload_bytes_in, c.bytes_out, c.payload_bytes_out,
+                       c.dropped_messages, c.coalesced_messages, self.outbound_queue.max_depth))
+
+    def _check_frame_length(self, length):
+        """ Raises _MessageTooBig if a frame of the declared length, added to the fragments
+            already received, exceeds websocket_max_message_size. To be called before reading the frame.
+        """
+        max_size = self.server.websocket_max_message_size
+        if max_size is None:
+            return
+        if self._fragments is not None:
+            length += len(self._fragments)
+        if length > max_size:
+            raise _MessageTooBig('websocket message of %d bytes, the maximum is %d' % (length, max_size))
+
+    def _inflate(self, data):
+        max_size = self.server.websocket_max_message_size
+        if max_size is None:
+            return self._inflater.decompress(data + _DEFLATE_TAIL)
+        # a small frame can inflate to gigabytes, the output is limited
+        message = self._inflater.decompress(data + _DEFLATE_TAIL, max_size + 1)
+        if len(message) > max_size or self._inflater.unconsumed_tail:
+            raise _MessageTooBig('inflated websocket message bigger than %d bytes' % max_size)
+        return message
+
+    def _close_frame(self, code):
+        payload = struct.pack('>H', code)
+        return websocket_frame_header(_OPCODE_CLOSE, len(payload)) + payload
+
+    def _on_frame(self, fin, opcode, frame_data, compressed=False):
+        """ Processes a received (and already unmasked) data or control frame.
+            Returns the decoded message once it is complete, None otherwise.
+            Close frames have to be managed by the caller.
+            compressed is the RSV1 bit, that is set on the first frame of a deflated message.
+        """
+        if opcode == _OPCODE_PING:
+            self._send_frame(_OPCODE_PONG, bytes(frame_data))
+            return None
+        if opcode == _OPCODE_PONG:
+            return None
+
+        wire_length = len(frame_data)
+        if fin and self._fragments is None:
+            # single frame message, the most common case, no copy required
+            message = frame_data
+        else:
+            if self._fragments is None:
+                self._fragments = bytearray()
+                self._fragments_compressed = compressed
+            self._fragments += frame_data
+            if not fin:
+                self._count_in(wire_length, 0)
+                return None
+            message = self._fragments
+            compressed = self._fragments_compressed
+            self._fragments = None
+
+        if compressed:
+            if self._deflate_params is None:
+                raise ValueError('compressed frame received without permessage-deflate negotiation')
+            message = self._inflate(bytes(message))
+        self._count_in(wire_length, len(message))
+
+        # the payload gets decoded once, directly from the buffer
+        decoded = bytes(message).decode('utf-8') if pyLessThan3 else str(message, 'utf-8')
+        self._log.debug('read_message: %s...' % (decoded[:10]))
+        return decoded if self.raw_payload else from_websocket(decoded)
+
+    def encode_payload(self, payload):
+        """ Encodes the payload of an outgoing message as expected by the client protocol """
+        return payload if self.raw_payload else to_websocket(payload)
+
+    def _send_frame(self, opcode, payload):
+        self._write(websocket_frame_header(opcode, len(payload)) + payload)
+
+    def on_message(self, message):
+        global runtimeInstances
+
+        self.send_message(_MSG_ACK)
+
+        client = clients.get(self.session)
+        if client is None:
+            # the session has been evicted
+            return
+        self.server.sessions.touch(self.session)
+        with client.update_lock:
+            # noinspection PyBroadException
+            try:
+                # saving the websocket in order to update the client
+                if self not in client.websockets:
+                    client.websockets.add(self)
+
+                # parsing messages
+                chunks = message.split('/')
+                self._log.debug('on_message: %s' % chunks[0])
+
+                if len(chunks) > 3:  # msgtype,widget,function,params
+                    # if this is a callback
+                    msg_type = 'callback'
+                    if chunks[0] == msg_type:
+                        widget_id = chunks[1]
+                        function_name = chunks[2]
+                        params = message[
+                            len(msg_type) + len(widget_id) + len(function_name) + 3:]
+
+                        param_dict = parse_parametrs(params)
+
+                        callback = get_method_by_name(runtimeInstances[widget_id], function_name)
+                        if callback is not None:
+                            callback(**param_dict)
+
+            except Exception:
+                self._log.error('error parsing websocket', exc_info=True)
+
+
+class WebSocketsHandler(WebSocketProtocol, socketserver.StreamRequestHandler):
+
     def __init__(self, headers, request, client_address, server, *args, **kwargs):
         self.headers = headers
         self.server = server
         self.handshake_done = False
+        self._frame_buffer = bytearray(4096)
+        self._send_lock = threading.Lock()
+        self.counters = WebSocketCounters()
         self._log = logging.getLogger('remi.server.ws')
         #self._log.setLevel(logging.DEBUG)
         socketserver.StreamRequestHandler.__init__(self, request, client_address, server, *args, **kwargs)
@@ -183,9 +1063,11 @@ class WebSocketsHandler(socketserver.StreamRequestHandler):
         if self.handshake():
             while True:
                 if not self.read_next_message():
-                    clients[self.session].websockets.discard(self)
+                    if self.session in clients:
+                        clients[self.session].websockets.discard(self)
                     self.handshake_done = False
-                    self._log.debug('ws ending websocket service')
+                    self.outbound_queue.close()
+                    self._log_counters()
                     break
 
     @staticmethod
@@ -194,108 +1076,116 @@ class WebSocketsHandler(socketserver.StreamRequestHandler):
             b = ord(b)
         return b
 
+    def _read_exactly(self, length):
+        """ Reads *length* bytes from the socket into the reusable frame buffer
+            and returns a memoryview on them, or None if the socket gets closed.
+            Frames bigger than _FRAME_BUFFER_KEEP_SIZE get a one-shot buffer,
+            so that a single huge message does not pin memory for the whole connection.
+        """
+        if length > _FRAME_BUFFER_KEEP_SIZE:
+            buf = bytearray(length)
+        else:
+            if len(self._frame_buffer) < length:
+                self._frame_buffer = bytearray(max(length, 2 * len(self._frame_buffer)))
+            buf = self._frame_buffer
+        view = memoryview(buf)[:length]
+        received = 0
+        while received < length:
+            n = self.rfile.readinto(view[received:])
+            if not n:
+                return None
+            received += n
+        return view
+
     def read_next_message(self):
         # noinspection PyBroadException
         try:
-            decoded = ''
-            fin = 0
-            while fin == 0:
-                head = None
+            message = None
+            while message is None:
                 try:
                     head = self.rfile.read(2)
                 except ValueError:
                     # socket was closed, just return without errors
                     return False
-                if head is None:
-                    return False
-                if len(head) < 2:
+                if head is None or len(head) < 2:
                     return False
-                opcode = head[0] & 0b1111
+                head = bytearray(head)
                 fin = head[0] >> 7 & 1
+                rsv1 = head[0] >> 6 & 1
+                opcode = head[0] & 0b1111
                 is_masked = head[1] >> 7 & 1
-                length = self.bytetonum(head[1]) & 127
+                length = head[1] & 127
 
                 if length == 126:
                     length = struct.unpack('>H', self.rfile.read(2))[0]
                 elif length == 127:
                     length = struct.unpack('>Q', self.rfile.read(8))[0]
 
-                masks = []
+                mask = self.rfile.read(4) if is_masked else None
+
+                # the length is declared by the client, it is checked before allocating the buffer
+                self._check_frame_length(length)
+                frame_data = self._read_exactly(length)
+                if frame_data is None:
+                    return False
                 if is_masked:
-                    masks = [self.bytetonum(byte) for byte in self.rfile.read(4)]
-
-                frame_data = ''
-                for char in self.rfile.read(length):
-                    if is_masked:
-                        next_data = chr(self.bytetonum(char) ^ masks[len(frame_data) % 4])
-                        frame_data += next_data
-                    else:
-                        frame_data += chr(self.bytetonum(char))
-
-                decoded += frame_data
-                self._log.debug('read_message: %s...' % (decoded[:10]))
-            self.on_message(from_websocket(decoded))
+                    websocket_unmask(frame_data, mask)
+
+                if opcode == _OPCODE_CLOSE:
+                    return False
+                message = self._on_frame(fin, opcode, frame_data, rsv1)
+
+            self.on_message(message)
         except socket.timeout:
             return False
+        except _MessageTooBig as e:
+            self._log.warning('closing websocket: %s' % e)
+            self._write(self._close_frame(_CLOSE_MESSAGE_TOO_BIG))
+            return False
         except Exception:
             self._log.error('Error managing incoming websocket message', exc_info=True)
             return False
         return True
 
+    def _write(self, data):
+        with self._send_lock:
+            self.request.sendall(data)
+
+    def _write_outbound_messages(self):
+        """ Writer thread, it sends the queued messages until the queue gets closed """
+        # noinspection PyBroadException
+        try:
+            while True:
+                message = self.outbound_queue.get()
+                if message is None:
+                    break
+                # frames are built in the writing order, as required by the deflate context
+                self._write(self._message_frame(message))
+        except Exception:
+            self._log.debug('websocket writer ending, client not reachable', exc_info=True)
+        finally:
+            self.outbound_queue.close()
+
     def send_message(self, message):
+        """ Queues the message for the writer thread, returns False if the client has been disconnected """
         if not self.handshake_done:
             self._log.warning("ignoring message %s (handshake not done)" % message[:10])
             return False
-        
-        if message[0] == "2":
-            i = 0
-
-        self._log.debug('send_message: %s... -> %s' % (message[:10], self.client_address))
-        out = bytearray()
-        out.append(129)
-        length = len(message)
-        if length <= 125:
-            out.append(length)
-        elif 126 <= length <= 65535:
-            out.append(126)
-            out += struct.pack('>H', length)
-        else:
-            out.append(127)
-            out += struct.pack('>Q', length)
-        if not pyLessThan3:
-            message = message.encode('utf-8')
-        out = out + message
-
-        readable, writable, errors = select.select([], [self.request,], [], self.server.websocket_timeout_timer_ms) #last parameter is timeout, when 0 is non blocking
-        #self._log.debug('socket status readable=%s writable=%s errors=%s'%((self.request in readable), (self.request in writable), (self.request in error$
-        writable = self.request in writable
-        if not writable:
-            return False
-        self.request.sendall(out)
-        return True
+
+        self._log.debug('send_message: %s... -> %s', message[:10], self.client_address)
+        return self.outbound_queue.put(message)
 
     def handshake(self):
         self._log.debug('handshake')
-        key = self.headers['Sec-WebSocket-Key']
-        self.session = None
-        if 'cookie' in self.headers:
-            if self.headers['cookie']!=None:
-                self.session = parse_session_cookie(self.headers['cookie'])
-        if self.session == None:
-            return False
-        if not self.session in clients.keys():
+        response = self._handshake_response()
+        if response is None:
             return False
-
-        digest = hashlib.sha1((key.encode("utf-8")+self.magic))
-        digest = digest.digest()
-        digest = base64.b64encode(digest)
-        response = 'HTTP/1.1 101 Switching Protocols\r\n'
-        response += 'Upgrade: websocket\r\n'
-        response += 'Connection: Upgrade\r\n'
-        response += 'Sec-WebSocket-Accept: %s\r\n\r\n' % digest.decode("utf-8")
         self._log.info('handshake complete')
-        self.request.sendall(response.encode("utf-8"))
+        self.request.sendall(response)
         self.handshake_done = True
+        writer = threading.Thread(target=self._write_outbound_messages)
+        writer.daemon = True
+        writer.start()
 
         #if an update happens since the websocket connection to its handshake, 
         # it gets not displayed. it is required to inform App about handshake done, 
@@ -304,42 +1194,10 @@ class WebSocketsHandler(socketserver.StreamRequestHandler):
 
         return True
 
-    def on_message(self, message):
-        global runtimeInstances
-
-        self.send_message(_MSG_ACK)
-
-        with clients[self.session].update_lock:
-            # noinspection PyBroadException
-            try:
-                # saving the websocket in order to update the client
-                if self not in clients[self.session].websockets:
-                    clients[self.session].websockets.add(self)
-
-                # parsing messages
-                chunks = message.split('/')
-                self._log.debug('on_message: %s' % chunks[0])
-
-                if len(chunks) > 3:  # msgtype,widget,function,params
-                    # if this is a callback
-                    msg_type = 'callback'
-                    if chunks[0] == msg_type:
-                        widget_id = chunks[1]
-                        function_name = chunks[2]
-                        params = message[
-                            len(msg_type) + len(widget_id) + len(function_name) + 3:]
-
-                        param_dict = parse_parametrs(params)
-
-                        callback = get_method_by_name(runtimeInstances[widget_id], function_name)
-                        if callback is not None:
-                            callback(**param_dict)
-
-            except Exception:
-                self._log.error('error parsing websocket', exc_info=True)
-
     def close(self, terminate_server=True):
         try:
+            if self.outbound_queue is not None:
+                self.outbound_queue.close()
             self.request.setblocking(False)
             self.request.shutdown(socket.SHUT_RDWR)
             self.finish()
@@ -382,12 +1240,38 @@ class App(BaseHTTPRequestHandler, object):
     re_static_file = re.compile(r"^([\/]*[\w\d]+:[-_. $@?#£'%=()\/\[\]!+°§^,\w\d]+)") #https://regex101.com/r/uK1sX1/6
     re_attr_call = re.compile(r"^/*(\w+)\/(\w+)\?{0,1}(\w*\={1}([^&])+\&{0,1})*$") #https://regex101.com/r/UTJB6N/1
 
+    # persistent connections, all the responses are delimited by their Content-Length
+    protocol_version = 'HTTP/1.1'
+    # seconds an idle persistent connection is kept open
+    keep_alive_timeout = 60
+    # the headers and the body of a response are written apart, they must not wait each other ack
+    disable_nagle_algorithm = True
+
     def __init__(self, request, client_address, server, **app_args):
         self._app_args = app_args
         self.root = None
+        # the widgets changed since the last update, in order of change (dict used as ordered set), see Tag._set_dirty
+        self._dirty_widgets = {}
+        self._dirty_lock = threading.Lock()
         self._log = logging.getLogger('remi.request')
         super(App, self).__init__(request, client_address, server)
 
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        # the websocket handler sets its own timeout, taking over the connection
+        self.connection.settimeout(self.keep_alive_timeout)
+
+    def end_headers(self):
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        BaseHTTPRequestHandler.end_headers(self)
+
+    def _send_status(self, code):
+        """ Sends a response without body. """
+        self.send_response(code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
     def _get_list_from_app_args(self, name):
         try:
             v = self._app_args[name]
@@ -408,6 +1292,8 @@ class App(BaseHTTPRequestHandler, object):
         multiple clients" or "multiple instance for multiple clients" execution way
         """
 
+        self.server.sessions.evict_idle()
+
         self.session = 0
         #checking previously defined session
         if 'cookie' in self.headers:
@@ -422,6 +1308,10 @@ class App(BaseHTTPRequestHandler, object):
         if self.session == 0:
             if self.server.multiple_instance:
                 self.session = int(time.time()*1000)
+                if self.server.session_shard:
+                    # the session id identifies the worker process owning it, see server_multiprocess
+                    index, processes = self.server.session_shard
+                    self.session = self.session * processes + index
             #send session to browser
             del self.headers['cookie']
 
@@ -461,10 +1351,17 @@ class App(BaseHTTPRequestHandler, object):
                     self._update_thread.start()
 
             runtimeInstances[str(id(self))] = self
-            clients[self.session] = self
+            self.server.sessions.add(self.session, self)
+            # this handler is now the App of the session, it must not serve the requests of other sessions
+            # on the same connection. The browser reconnects, also reaching the right worker process
+            self.close_connection = True
+            app_identifier = str(id(self))
         else:
             #restore instance attributes
             client = clients[self.session]
+            self.server.sessions.touch(self.session)
+            # the App events are received by the instance of the session
+            app_identifier = str(id(client))
 
             self.websockets = client.websockets
             self.page = client.page
@@ -479,7 +1376,7 @@ class App(BaseHTTPRequestHandler, object):
         net_interface_ip = self._net_interface_ip() if not self.server.dynamic_web_address else ''
         websocket_timeout_timer_ms = str(self.server.websocket_timeout_timer_ms)
         pending_messages_queue_length = str(self.server.pending_messages_queue_length)
-        self.page.children['head'].set_internal_js(str(id(self)), net_interface_ip, pending_messages_queue_length, websocket_timeout_timer_ms)
+        self.page.children['head'].set_internal_js(app_identifier, net_interface_ip, pending_messages_queue_length, websocket_timeout_timer_ms)
 
     def _net_interface_ip(self):
         return self.headers.get('Host', "%s:%s"%(self.connection.getsockname()[0],self.server.server_address[1]))
@@ -518,7 +1415,7 @@ class App(BaseHTTPRequestHandler, object):
             # client update and to reset the changed flags of changed widget.
             # Otherwise it will be updated on next update cycle.
             changed_widget_dict = {}
-            self.root.repr(changed_widget_dict)
+            self._repr_dirty_widgets(changed_widget_dict)
             return
 
         if self.update_interval == 0:
@@ -528,22 +1425,61 @@ class App(BaseHTTPRequestHandler, object):
             #will be updated after idle loop
             self._need_update_flag = True
                 
+    def _add_dirty_widget(self, widget):
+        with self._dirty_lock:
+            self._dirty_widgets[widget] = None
+        # the root widget has the App as parent, but its repr is included in the page body
+        self.page.children['body']._invalidate_repr()
+
+    def _repr_dirty_widgets(self, changed_widgets):
+        """ Collects the changes of the root widget tree in changed_widgets, as Tag.repr does.
+            Only the top-most dirty widgets get rendered, walking only the changed branches
+            below them. Dirty widgets no more in the root tree are ignored.
+        """
+        with self._dirty_lock:
+            dirty = self._dirty_widgets
+            self._dirty_widgets = {}
+        for widget in dirty:
+            node = widget
+            while not node._parent in (None, self) and not node._parent in dirty:
+                node = node._parent
+            if node._parent in dirty:
+                # rendered with its dirty ancestor
+                continue
+            if node is self.root:
+                widget.repr(changed_widgets)
+
     def do_gui_update(self):
         """ This method gets called also by Timer, a new thread, and so needs to lock the update
         """
         with self.update_lock:
             changed_widget_dict = {}
-            self.root.repr(changed_widget_dict)
+            self._repr_dirty_widgets(changed_widget_dict)
+            updates = []
             for widget in changed_widget_dict.keys():
                 html = changed_widget_dict[widget]
                 __id = str(widget.identifier)
-                self._send_spontaneous_websocket_message(_MSG_UPDATE + __id + ',' + to_websocket(self._overload(html, filename="internal")))
+                if isinstance(html, dict):
+                    # only attributes, style or text changed
+                    updates.append((_MSG_PATCH, __id, html))
+                    continue
+                updates.append((_MSG_UPDATE, __id, self._overload(html, filename="internal")))
+
+            if len(updates) == 1:
+                msg_type, __id, content = updates[0]
+                if msg_type == _MSG_PATCH:
+                    content = json.dumps(content, **_UPDATE_JSON_OPTIONS)
+                self._send_spontaneous_websocket_message(msg_type + __id + ',', content)
+            elif updates:
+                # all the changes of this pass in a single message, applied at once by the client
+                self._send_spontaneous_websocket_message(_MSG_BATCH, json.dumps(updates, **_UPDATE_JSON_OPTIONS))
         self._need_update_flag = False
 
     def websocket_handshake_done(self, ws_instance_to_update):
         msg = ""
         with self.update_lock:
-            msg = "0" + self.root.identifier + ',' + to_websocket(self._overload(self.page.children['body'].innerHTML({}), filename="internal"))
+            msg = "0" + self.root.identifier + ',' + ws_instance_to_update.encode_payload(
+                self._overload(self.page.children['body'].innerHTML({}), filename="internal"))
         ws_instance_to_update.send_message(msg)
 
     def set_root_widget(self, widget):
@@ -554,14 +1490,27 @@ class App(BaseHTTPRequestHandler, object):
         self.root._parent = self
         self.root.enable_refresh()
 
-        msg = "0" + self.root.identifier + ',' + to_websocket(self._overload(self.page.children['body'].innerHTML({}), filename="internal"))
-        self._send_spontaneous_websocket_message(msg)
+        self._send_spontaneous_websocket_message("0" + self.root.identifier + ',',
+            self._overload(self.page.children['body'].innerHTML({}), filename="internal"))
         
-    def _send_spontaneous_websocket_message(self, message):
-        for ws in list(self.websockets):
+    def _send_spontaneous_websocket_message(self, message, payload=None):
+        """ Sends the message to all the connected clients.
+            The payload, if given, is appended to the message encoded as required by the
+            protocol of each client. It gets encoded only once per protocol, and the
+            uncompressed frame gets built only once for all the clients.
+        """
+        messages = {}
+        websockets = list(self.websockets)
+        for ws in websockets:
             # noinspection PyBroadException
             try:
-                if ws.send_message(message):
+                if not ws.raw_payload in messages:
+                    encoded = message if payload is None else message + ws.encode_payload(payload)
+                    # the frame of a message sent to several clients is built once
+                    if len(websockets) > 1 and not isinstance(encoded, BinaryMessage):
+                        encoded = BroadcastMessage(encoded)
+                    messages[ws.raw_payload] = encoded
+                if ws.send_message(messages[ws.raw_payload]):
                     #if message sent ok, continue with next client
                     continue
             except Exception:
@@ -576,6 +1525,10 @@ class App(BaseHTTPRequestHandler, object):
             else:
                 ws.close(terminate_server=False)
             
+    def send_stream_frame(self, widget, data, mimetype):
+        """ Pushes an image frame to the widget shown by all the clients, see gui.StreamImage """
+        self._send_spontaneous_websocket_message(stream_frame_message(widget.identifier, mimetype, data))
+
     def execute_javascript(self, code):
         self._send_spontaneous_websocket_message(_MSG_JS + code)
 
@@ -604,50 +1557,102 @@ class App(BaseHTTPRequestHandler, object):
 
     def do_POST(self):
         self._instance()
-        file_data = None
-        # listener_widget = None
-        # listener_function = None
         try:
-            # Parse the form data posted
             filename = self.headers['filename']
             listener_widget = runtimeInstances[self.headers['listener']]
             listener_function = self.headers['listener_function']
-            form = _FieldStorage(fp=self.rfile,
-                                 headers=self.headers,
-                                 environ={'REQUEST_METHOD': 'POST',
-                                          'CONTENT_TYPE': self.headers['Content-Type']})
-            # Echo back information about what was posted in the form
-            for field in form.keys():
-                field_item = form[field]
-                if field_item.filename:
-                    # The field contains an uploaded file
-                    file_data = field_item.file.read()
-                    file_len = len(file_data)
-                    self._log.debug('post: uploaded %s as "%s" (%d bytes)\n' % (field, field_item.filename, file_len))
-                    get_method_by_name(listener_widget, listener_function)(file_data, filename)
-                else:
-                    # Regular form value
-                    self._log.debug('post: %s=%s\n' % (field, form[field].value))
-
-            if file_data is not None:
-                # the filedata is sent to the listener
-                self._log.debug('GUI - server.py do_POST: fileupload name= %s' % (filename))
-                self.send_response(200)
+            content_length = int(self.headers['Content-Length'])
+            file_size = int(self.headers.get('filesize') or content_length)
+            if self.headers.get('upload_id'):
+                # a chunk of a resumable upload, the body is the file data at upload_offset
+                self._receive_chunk(listener_widget, filename, file_size, self.headers['upload_id'],
+                                    int(self.headers['upload_offset']), content_length)
+            else:
+                self._receive_form(listener_widget, listener_function, filename, file_size, content_length)
+            self.send_response(200)
         except Exception:
             self._log.error('post: failed', exc_info=True)
+            # the request body may be left unread
+            self.close_connection = True
             self.send_response(400)
         self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
+    def _receive_form(self, widget, listener_function, filename, size, content_length):
+        # the body is parsed as it is received, the files are never held in memory as a whole
+        for part in MultipartParser(self.rfile, self.headers['Content-Type'], content_length):
+            if part.filename is None:
+                # Regular form value
+                self._log.debug('post: %s=%s' % (part.name, b''.join(part)))
+            elif hasattr(widget, 'open_upload'):
+                self._log.debug('post: uploading %s as "%s" (%d bytes)' % (part.name, filename, size))
+                self._receive_upload(widget, part, filename, size)
+            else:
+                # a widget receiving the whole file data
+                file_data = b''.join(part)
+                self._log.debug('post: uploaded %s as "%s" (%d bytes)' % (part.name, filename, len(file_data)))
+                with self.update_lock:
+                    get_method_by_name(widget, listener_function)(file_data, filename)
+
+    def _receive_upload(self, widget, chunks, filename, size):
+        """ Writes the uploaded data by the upload object of the widget, see gui.FileUploader.open_upload.
+            The gui is locked chunk by chunk, the listeners of the upload events can update it.
+        """
+        with self.update_lock:
+            upload = widget.open_upload(filename, size)
+        try:
+            for data in chunks:
+                with self.update_lock:
+                    upload.write(data)
+        except Exception:
+            with self.update_lock:
+                upload.abort()
+            raise
+        with self.update_lock:
+            upload.close()
+
+    def _receive_chunk(self, widget, filename, size, upload_id, offset, length):
+        """ Writes a chunk of a resumable upload, see gui.FileUploader.open_upload.
+            The file is complete when all its chunks have been received.
+        """
+        with self.update_lock:
+            upload = widget.open_upload(filename, size, upload_id)
+            if upload is not None:
+                upload.check_chunk(offset, length)
+        if upload is None:
+            # sent again after the upload is complete, the response to the first one was lost
+            self._log.debug('post: chunk %d of the upload %s already complete' % (offset, upload_id))
+            while length > 0:
+                data = self.rfile.read(min(65536, length))
+                if not data:
+                    break
+                length -= len(data)
+            return
+        position = offset
+        while length > 0:
+            data = self.rfile.read(min(65536, length))
+            if not data:
+                raise ValueError('upload chunk truncated')
+            length -= len(data)
+            with self.update_lock:
+                upload.write(data, position)
+            position += len(data)
+        with self.update_lock:
+            if upload.add_chunk(offset, position - offset):
+                upload.close()
+
     def do_HEAD(self):
         self.send_response(200)
         self.end_headers()
 
-    def do_AUTHHEAD(self):
+    def do_AUTHHEAD(self, content=b''):
         self.send_response(401)
         self.send_header('WWW-Authenticate', 'Basic realm=\"Protected\"')
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(content)))
         self.end_headers()
+        self.wfile.write(content)
 
     def do_GET(self):
         # check here request header to identify the type of req, if http or ws
@@ -657,6 +1662,7 @@ class App(BaseHTTPRequestHandler, object):
                 #passing arguments to websocket handler, otherwise it will lost the last message, 
                 # and will be unable to handshake
                 ws = WebSocketsHandler(self.headers, self.request, self.client_address, self.server)
+                self.close_connection = True
                 return
 
         """Handler for the GET requests."""
@@ -666,17 +1672,18 @@ class App(BaseHTTPRequestHandler, object):
         else:
             if not ('Authorization' in self.headers) or self.headers['Authorization'] is None:
                 self._log.info("Authenticating")
-                self.do_AUTHHEAD()
-                self.wfile.write(encode_text('no auth header received'))
+                self.do_AUTHHEAD(encode_text('no auth header received'))
             elif self.headers['Authorization'] == 'Basic ' + self.server.auth.decode():
                 do_process = True
             else:
-                self.do_AUTHHEAD()
-                self.wfile.write(encode_text(self.headers['Authorization']))
-                self.wfile.write(encode_text('not authenticated'))
+                self.do_AUTHHEAD(encode_text(self.headers['Authorization'] + 'not authenticated'))
 
         if do_process:
             path = str(unquote(self.path))
+            if self.server.session_stats and path == '/remi:sessions':
+                # served apart, it does not create a session
+                self._send_session_stats()
+                return
             # noinspection PyBroadException
             try:
                 self._instance()
@@ -689,6 +1696,16 @@ class App(BaseHTTPRequestHandler, object):
                 self._process_all(path)
             except Exception:
                 self._log.error('error processing GET request', exc_info=True)
+                # the response may be incomplete
+                self.close_connection = True
+
+    def _send_session_stats(self):
+        content = encode_text(json.dumps(self.server.sessions.stats()))
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
 
     def all_paths(self):
         paths = {'res': os.path.join(os.path.dirname(__file__), "res")}
@@ -707,11 +1724,209 @@ class App(BaseHTTPRequestHandler, object):
         key = filename[:__i]
         path = filename[__i+1:]
         key = key.replace("/","")
+        from remi import gui
+        if '%s:%s' % (key, path) == gui.INTERNAL_JS_PATH:
+            path = 'remi.js'
         paths = self.all_paths()
         if not key in paths:
             return None
         return os.path.join(paths[key], path)
     
+    def _send_static_file(self, filename, immutable=False):
+        """ Sends a static file with the validators (ETag, Last-Modified) the browser uses to revalidate
+            its cached copy, answering 304 if still valid, and honouring single byte ranges, as required
+            by the media players to seek. The content is sent by zero-copy sendfile where available.
+            An immutable file is cached by the browser for good, its url changes with its content.
+        """
+        cache_control = None
+        if immutable:
+            cache_control = 'public, max-age=31536000, immutable'
+        elif self.server.enable_file_cache:
+            cache_control = 'public, max-age=86400'
+        try:
+            f = open(filename, 'rb')
+        except (IOError, OSError):
+            self._send_status(404)
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if not stat.S_ISREG(st.st_mode):
+                self._send_status(404)
+                return
+            mimetype, encoding = mimetypes.guess_type(filename)
+            mimetype = mimetype if mimetype else 'application/octet-stream'
+
+            if type(self)._overload is not App._overload:
+                # the content can be changed by the subclass, it is sent as it is returned
+                content = self._overload(f.read(), filename=filename)
+                self.send_response(200)
+                self.send_header('Content-type', mimetype)
+                self.send_header('Content-Length', str(len(content)))
+                if cache_control:
+                    self.send_header('Cache-Control', cache_control)
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
+            size = st.st_size
+            cache = self.server.compressed_cache
+            compressible = cache.max_size > 0 and cache.compressible(mimetype) and cache.fits(size)
+            encoding = None
+            if compressible and not self.headers.get('Range'):
+                encoding = select_content_encoding(self.headers.get('Accept-Encoding'))
+            # each encoding is a different representation, with its own entity tag
+            etag = '"%x-%x%s"' % (int(st.st_mtime * 1000000), size, ('-' + encoding) if encoding else '')
+            last_modified = self.date_time_string(st.st_mtime)
+            validators = (('ETag', etag), ('Last-Modified', last_modified))
+            if compressible:
+                validators = validators + (('Vary', 'Accept-Encoding'),)
+            if cache_control:
+                validators = validators + (('Cache-Control', cache_control),)
+
+            if self._is_not_modified(etag, st.st_mtime):
+                self.send_response(304)
+                for k, v in validators:
+                    self.send_header(k, v)
+                self.end_headers()
+                return
+
+            if encoding:
+                content = cache.get((filename, st.st_mtime, size), encoding, f.read)
+                self.send_response(200)
+                self.send_header('Content-type', mimetype)
+                self.send_header('Content-Encoding', encoding)
+                self.send_header('Content-Length', str(len(content)))
+                for k, v in validators:
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(content)
+                return
+
+            byte_range = None
+            if_range = self.headers.get('If-Range')
+            if self.headers.get('Range') and (if_range is None or if_range in (etag, last_modified)):
+                byte_range = parse_byte_range(self.headers['Range'], size)
+            if byte_range is False:
+                self.send_response(416)
+                self.send_header('Content-Range', 'bytes */%d' % size)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            first, last = byte_range or (0, size - 1)
+            if byte_range:
+                self.send_response(206)
+                self.send_header('Content-Range', 'bytes %d-%d/%d' % (first, last, size))
+            else:
+                self.send_response(200)
+            self.send_header('Content-type', mimetype)
+            self.send_header('Content-Length', str(last - first + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            for k, v in validators:
+                self.send_header(k, v)
+            self.end_headers()
+            self._send_file_content(f, first, last - first + 1)
+
+    def _is_not_modified(self, etag, mtime):
+        """ Evaluates the conditional request headers, If-None-Match takes precedence on If-Modified-Since """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or etag in tags or ('W/' + etag) in tags
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            t = email.utils.parsedate_tz(if_modified_since)
+            if t is not None:
+                return int(mtime) <= email.utils.mktime_tz(t)
+        return False
+
+    def _send_file_content(self, f, offset, count):
+        self.wfile.flush()
+        if hasattr(self.connection, 'sendfile'):
+            # os.sendfile if supported by the platform and the socket, otherwise a send loop
+            self.connection.sendfile(f, offset, count)
+            return
+        f.seek(offset)
+        while count > 0:
+            data = f.read(min(count, 65536))
+            if not data:
+                break
+            self.wfile.write(data)
+            count -= len(data)
+
+    @staticmethod
+    def _is_stream(content):
+        """ Returns True for the file objects, generators and iterators returned by the attribute calls. """
+        return hasattr(content, 'read') or hasattr(content, '__next__') or hasattr(content, 'next')
+
+    @staticmethod
+    def _iter_stream(stream):
+        if hasattr(stream, 'read'):
+            while True:
+                chunk = stream.read(65536)
+                if not chunk:
+                    return
+                yield chunk if isinstance(chunk, (bytes, bytearray)) else encode_text(chunk)
+        for chunk in stream:
+            if chunk:
+                yield chunk if isinstance(chunk, (bytes, bytearray)) else encode_text(chunk)
+
+    def _send_stream(self, stream, headers):
+        """ Sends the content of a file object, generator or iterator returned by an attribute call,
+            as it is read, without holding it in memory. A regular file is sent by sendfile with
+            its Content-Length, the other streams by chunked encoding (to HTTP/1.0 clients
+            until the connection is closed). The stream is closed at the end.
+        """
+        has_length = 'content-length' in (k.lower() for k in headers)
+        try:
+            if type(self)._overload is not App._overload:
+                # the content can be changed by the subclass, it is read in full
+                data = self._overload(b''.join(self._iter_stream(stream)), filename="internal")
+                self.send_response(200)
+                for k in headers:
+                    self.send_header(k, headers[k])
+                if not has_length:
+                    self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            size = None
+            try:
+                st = os.fstat(stream.fileno())
+                if stat.S_ISREG(st.st_mode):
+                    offset = stream.tell()
+                    size = st.st_size - offset
+            except (AttributeError, IOError, OSError, ValueError):
+                pass
+
+            self.send_response(200)
+            for k in headers:
+                self.send_header(k, headers[k])
+            if size is not None:
+                if not has_length:
+                    self.send_header('Content-Length', str(size))
+                self.end_headers()
+                self._send_file_content(stream, offset, size)
+                return
+
+            chunked = not has_length and self.request_version == 'HTTP/1.1'
+            if chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            elif not has_length:
+                # the end of the content is signalled by closing the connection
+                self.close_connection = True
+            self.end_headers()
+            for chunk in self._iter_stream(stream):
+                if chunked:
+                    chunk = encode_text('%x\r\n' % len(chunk)) + chunk + b'\r\n'
+                self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+
     def _overload(self, data, **kwargs):
         """Used to overload the content before sent back to client"""
         return data
@@ -722,32 +1937,36 @@ class App(BaseHTTPRequestHandler, object):
         attr_call = self.re_attr_call.match(func)
 
         if (func == '/') or (not func):
-            self.send_response(200)
-            self.send_header("Set-Cookie", "remi_session=%s; SameSite=Lax"%(self.session))
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            
             with self.update_lock:
                 # render the HTML
                 page_content = self.page.repr()
+            content = encode_text("<!DOCTYPE html>\n") + encode_text(self._overload(page_content, filename="internal"))
+
+            encoding = None
+            if self.server.compressed_cache.max_size > 0:
+                encoding = select_content_encoding(self.headers.get('Accept-Encoding'))
+            if encoding:
+                # the page differs for each session, it is compressed fast and not cached
+                content = compress_content(content, encoding, dynamic=True)
 
-            self.wfile.write(encode_text("<!DOCTYPE html>\n"))
-            self.wfile.write(encode_text(self._overload(page_content, filename="internal")))
+            self.send_response(200)
+            self.send_header("Set-Cookie", "remi_session=%s; SameSite=Lax"%(self.session))
+            self.send_header('Content-type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            self.wfile.write(content)
             
         elif static_file:
             filename = self._get_static_file(static_file.groups()[0])
             if not filename:
-                self.send_response(404)
+                self._send_status(404)
                 return
-            mimetype, encoding = mimetypes.guess_type(filename)
-            self.send_response(200)
-            self.send_header('Content-type', mimetype if mimetype else 'application/octet-stream')
-            if self.server.enable_file_cache:
-                self.send_header('Cache-Control', 'public, max-age=86400')
-            self.end_headers()
-            with open(filename, 'rb') as f:
-                content = f.read()
-                self.wfile.write(self._overload(content, filename=filename))
+            from remi import gui
+            # the versioned client runtime never changes
+            self._send_static_file(filename, immutable=static_file.groups()[0].lstrip('/') == gui.INTERNAL_JS_PATH)
         elif attr_call:
             with self.update_lock:
                 param_dict = parse_qs(urlparse(func).query)
@@ -759,25 +1978,32 @@ class App(BaseHTTPRequestHandler, object):
                 try:
                     content, headers = get_method_by_name(get_method_by_id(widget), func)(**param_dict)
                     if content is None:
-                        self.send_response(503)
+                        self._send_status(503)
                         return
-                    self.send_response(200)
                 except IOError:
                     self._log.error('attr %s/%s call error' % (widget, func), exc_info=True)
-                    self.send_response(404)
+                    self._send_status(404)
                     return
                 except (TypeError, AttributeError):
                     self._log.error('attr %s/%s not available' % (widget, func))
-                    self.send_response(503)
+                    self._send_status(503)
                     return
 
+            if self._is_stream(content):
+                self._send_stream(content, headers)
+                return
+            data = self._overload(content, filename="internal")
+            if not isinstance(data, (bytes, bytearray)):
+                data = self._overload(encode_text(content), filename="internal")
+            self.send_response(200)
             for k in headers:
                 self.send_header(k, headers[k])
+            if not 'content-length' in (k.lower() for k in headers):
+                self.send_header('Content-Length', str(len(data)))
             self.end_headers()
-            try:
-                self.wfile.write(self._overload(content, filename="internal"))
-            except TypeError:
-                self.wfile.write(self._overload(encode_text(content), filename="internal"))
+            self.wfile.write(data)
+        else:
+            self._send_status(404)
 
     def close(self):
         """ Command to initiate an App to close
@@ -785,6 +2011,12 @@ class App(BaseHTTPRequestHandler, object):
         self._log.debug('shutting down...')
         self.server.server_starter_instance.stop()
 
+    def on_session_evicted(self):
+        """ Called when the session is evicted by the server, because idle for more than
+            session_timeout seconds or to stay within max_sessions. The App gets closed afterwards.
+        """
+        self._log.debug('App.on_session_evicted event occurred')
+
     def on_close(self):
         """ Called by the server when the App have to be terminated
         """
@@ -824,17 +2056,40 @@ class App(BaseHTTPRequestHandler, object):
         self._log.debug('App.onresize event occurred. Width:%s Height:%s'%(width, height))
 
 
+def init_server_options(httpd, websocket_compression=False, websocket_compression_window_bits=15,
+                        websocket_compression_threshold=1024, websocket_queue_length=100,
+                        websocket_queue_policy='disconnect', session_timeout=None, max_sessions=None,
+                        session_stats=False, compressed_cache_size=4*1024*1024,
+                        websocket_max_message_size=16*1024*1024):
+    """ Sets up the settings of an http server given as keyword arguments, after the userdata,
+        the same for all the server engines. See Server for their meaning.
+    """
+    httpd.websocket_compression = websocket_compression
+    httpd.websocket_compression_window_bits = websocket_compression_window_bits
+    httpd.websocket_compression_threshold = websocket_compression_threshold
+    httpd.websocket_queue_length = websocket_queue_length
+    httpd.websocket_queue_policy = websocket_queue_policy
+    httpd.websocket_max_message_size = websocket_max_message_size
+    httpd.websocket_counters = WebSocketCounters()
+    httpd.sessions = SessionManager(session_timeout, max_sessions)
+    httpd.session_stats = session_stats
+    httpd.compressed_cache = CompressedCache(compressed_cache_size)
+
+
 class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
 
     daemon_threads = False
 
+    # (worker index, number of worker processes) when the sessions are sharded among processes
+    session_shard = None
+
     # noinspection PyPep8Naming
     def __init__(self, server_address, RequestHandlerClass,
                  auth, multiple_instance, enable_file_cache, update_interval,
                  websocket_timeout_timer_ms, pending_messages_queue_length,
                  title, server_starter_instance, certfile, keyfile, ssl_version,
                  dynamic_web_address,
-                 *userdata):
+                 *userdata, **options):
         HTTPServer.__init__(self, server_address, RequestHandlerClass)
         self.auth = auth
         self.multiple_instance = multiple_instance
@@ -845,6 +2100,7 @@ class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
         self.title = title
         self.server_starter_instance = server_starter_instance
         self.dynamic_web_address = dynamic_web_address
+        init_server_options(self, **options)
         self.userdata = userdata
 
         self.certfile = certfile
@@ -853,13 +2109,22 @@ class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
         if self.ssl_version!=None:
             self.socket = ssl.wrap_socket(self.socket, keyfile=self.keyfile, certfile=self.certfile, server_side=True, ssl_version=self.ssl_version, do_handshake_on_connect=True)
 
+    def serve_socket(self, sock):
+        """ Serves a connection accepted elsewhere, i.e. by the dispatcher of the multi-process server """
+        self.process_request(sock, sock.getpeername())
+
 
 class Server(object):
     # noinspection PyShadowingNames
     def __init__(self, gui_class, title='', start=True, address='127.0.0.1', port=0, username=None, password=None,
                  multiple_instance=False, enable_file_cache=True, update_interval=0.1, start_browser=True,
                  websocket_timeout_timer_ms=1000, pending_messages_queue_length=1000,
-                 certfile=None, keyfile=None, ssl_version=None,  userdata=(), dynamic_web_address=False):
+                 certfile=None, keyfile=None, ssl_version=None,  userdata=(), dynamic_web_address=False,
+                 engine='threaded', max_workers=None, websocket_compression=False,
+                 websocket_compression_window_bits=15, websocket_compression_threshold=1024,
+                 websocket_queue_length=100, websocket_queue_policy='disconnect', processes=1,
+                 session_timeout=None, max_sessions=None, session_stats=False,
+                 compressed_cache_size=4*1024*1024, websocket_max_message_size=16*1024*1024):
 
         self._gui = gui_class
         self._title = title or gui_class.__name__
@@ -879,6 +2144,19 @@ class Server(object):
         self._ssl_version = ssl_version
         self._userdata = userdata
         self._dynamic_web_address = dynamic_web_address
+        self._engine = engine
+        self._max_workers = max_workers
+        self._websocket_compression = websocket_compression
+        self._websocket_compression_window_bits = websocket_compression_window_bits
+        self._websocket_compression_threshold = websocket_compression_threshold
+        self._websocket_queue_length = websocket_queue_length
+        self._websocket_queue_policy = websocket_queue_policy
+        self._processes = processes
+        self._session_timeout = session_timeout
+        self._max_sessions = max_sessions
+        self._session_stats = session_stats
+        self._compressed_cache_size = compressed_cache_size
+        self._websocket_max_message_size = websocket_max_message_size
         if username and password:
             self._auth = base64.b64encode(encode_text("%s:%s" % (username, password)))
         else:
@@ -886,6 +2164,16 @@ class Server(object):
 
         if not isinstance(userdata, tuple):
             raise ValueError('userdata must be a tuple')
+        if not engine in ('threaded', 'asyncio'):
+            raise ValueError("engine must be 'threaded' or 'asyncio'")
+        if not 9 <= websocket_compression_window_bits <= 15:
+            raise ValueError('websocket_compression_window_bits must be in the range 9..15')
+        if not websocket_queue_policy in OutboundQueue.POLICIES:
+            raise ValueError('websocket_queue_policy must be one of %s' % (OutboundQueue.POLICIES,))
+        if processes < 1:
+            raise ValueError('processes must be at least 1')
+        if processes > 1 and not multiple_instance:
+            raise ValueError('processes > 1 requires multiple_instance=True, sessions are sharded among processes')
 
         self._log = logging.getLogger('remi.server')
         self._alive = True
@@ -902,15 +2190,48 @@ class Server(object):
     def address(self):
         return self._base_address
 
+    def _server_args(self, server_starter_instance, certfile, keyfile, ssl_version):
+        """ Returns the positional arguments of the http server classes, following the server address.
+        """
+        return (self._gui, self._auth,
+                self._multiple_instance, self._enable_file_cache,
+                self._update_interval, self._websocket_timeout_timer_ms,
+                self._pending_messages_queue_length, self._title,
+                server_starter_instance, certfile, keyfile, ssl_version,
+                self._dynamic_web_address) + self._userdata
+
+    def _server_options(self):
+        """ Returns the keyword arguments of the http server classes, see init_server_options.
+        """
+        return dict(websocket_compression=self._websocket_compression,
+                    websocket_compression_window_bits=self._websocket_compression_window_bits,
+                    websocket_compression_threshold=self._websocket_compression_threshold,
+                    websocket_queue_length=self._websocket_queue_length,
+                    websocket_queue_policy=self._websocket_queue_policy,
+                    session_timeout=self._session_timeout, max_sessions=self._max_sessions,
+                    session_stats=self._session_stats, compressed_cache_size=self._compressed_cache_size,
+                    websocket_max_message_size=self._websocket_max_message_size)
+
     def start(self):
         # Create a web server and define the handler to manage the incoming
         # request
-        self._sserver = ThreadedHTTPServer((self._address, self._sport), self._gui, self._auth,
-                                           self._multiple_instance, self._enable_file_cache,
-                                           self._update_interval, self._websocket_timeout_timer_ms,
-                                           self._pending_messages_queue_length, self._title,
-                                           self, self._certfile, self._keyfile, self._ssl_version, self._dynamic_web_address,
-                                           *self._userdata)
+        if self._processes > 1:
+            from remi.server_multiprocess import DispatcherServer
+            # the workers serve plain http on the loopback interface, ssl is terminated by the dispatcher
+            self._sserver = DispatcherServer((self._address, self._sport), self._processes, self._engine,
+                                             self._max_workers, self._server_args(None, None, None, None),
+                                             self._server_options(), self, self._certfile, self._keyfile,
+                                             self._ssl_version)
+        else:
+            server_class = ThreadedHTTPServer
+            if self._engine == 'asyncio':
+                from remi.server_asyncio import AsyncioHTTPServer
+                server_class = AsyncioHTTPServer
+            self._sserver = server_class((self._address, self._sport),
+                                         *self._server_args(self, self._certfile, self._keyfile, self._ssl_version),
+                                         **self._server_options())
+            if self._engine == 'asyncio':
+                self._sserver.max_workers = self._max_workers
         shost, sport = self._sserver.socket.getsockname()[:2]
         self._log.info('Started httpserver http://%s:%s/'%(shost,sport))
         # when listening on multiple net interfaces the browsers connects to localhost
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   asyncio server engine, selected by Server(..., engine='asyncio').
+   All the connections are served by a single event loop, while http requests
+   and websocket messages are processed by the App in a bounded pool of threads.
+   This way an idle connection (i.e. an open dashboard) does not hold an OS thread.
+"""
+import asyncio
+import concurrent.futures
+import http.client
+import io
+import logging
+import socket
+import ssl
+import struct
+import threading
+
+from .server import clients, WebSocketProtocol, WebSocketCounters, init_server_options, \
+    websocket_unmask, _OPCODE_CLOSE, _MessageTooBig, _CLOSE_MESSAGE_TOO_BIG
+
+
+class _StreamReaderFile(io.RawIOBase):
+    """ Blocking raw file, used by the request handlers running in the executor threads.
+        It returns the already received request head, followed by the request body
+        that is read on demand from the asyncio stream, never beyond its Content-Length.
+    """
+
+    def __init__(self, head, reader, body_length, server):
+        self._head = memoryview(head)
+        self._reader = reader
+        self._server = server
+        self.remaining = body_length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if len(self._head):
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        if self.remaining <= 0:
+            return 0
+        data = self._server.call_in_loop(self._reader.read(min(len(b), self.remaining)))
+        n = len(data)
+        b[:n] = data
+        self.remaining = self.remaining - n if n else 0
+        return n
+
+
+class _ExecutorConnection(object):
+    """ Socket-like object given as request to the App handler, in place of the real socket.
+        Writes are forwarded to the event loop, waiting the transport to drain,
+        so that big responses are streamed with backpressure instead of being buffered.
+    """
+
+    def __init__(self, rfile, writer, server):
+        self.rfile = rfile
+        self._writer = writer
+        self._server = server
+        # the first chunk written by BaseHTTPRequestHandler is the response status and headers
+        self.response_head = None
+
+    def makefile(self, mode, *args, **kwargs):
+        if 'r' in mode:
+            return self.rfile
+        return self
+
+    def sendall(self, data):
+        data = bytes(data)
+        if self.response_head is None:
+            self.response_head = data
+        self._server.call_in_loop(self._write(data))
+
+    def write(self, data):
+        self.sendall(data)
+        return len(data)
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def getsockname(self):
+        return self._writer.get_extra_info('sockname')
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def setblocking(self, flag):
+        pass
+
+    def shutdown(self, how):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class AsyncioWebSocketsHandler(WebSocketProtocol):
+    """ Websocket handler of the asyncio engine. Frames are read on the event loop and
+        the messages are dispatched, one at a time per connection, to the executor.
+    """
+
+    def __init__(self, headers, reader, writer, client_address, server):
+        self.headers = headers
+        self.server = server
+        self.client_address = client_address
+        self.handshake_done = False
+        self._reader = reader
+        self._writer = writer
+        self._loop = server.loop
+        self._outbound_event = asyncio.Event()
+        self.counters = WebSocketCounters()
+        self._log = logging.getLogger('remi.server.ws')
+
+    async def serve(self):
+        self._log.info('connection established: %r' % (self.client_address,))
+        response = self._handshake_response()
+        if response is None:
+            return
+        self._writer.write(response)
+        self.outbound_queue.notify = self._notify_writer
+        self.handshake_done = True
+        self._log.info('handshake complete')
+        writer_task = self._loop.create_task(self._write_outbound_messages())
+        try:
+            await self._loop.run_in_executor(self.server.executor,
+                                             clients[self.session].websocket_handshake_done, self)
+            while True:
+                message = await self._read_message()
+                if message is None:
+                    break
+                # waiting the message to be processed keeps the callbacks order, as in the threaded engine
+                await self._loop.run_in_executor(self.server.executor, self.on_message, message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except _MessageTooBig as e:
+            self._log.warning('closing websocket: %s' % e)
+            self._writer.write(self._close_frame(_CLOSE_MESSAGE_TOO_BIG))
+        except Exception:
+            self._log.error('Error managing incoming websocket message', exc_info=True)
+        finally:
+            self.handshake_done = False
+            self.outbound_queue.close()
+            writer_task.cancel()
+            if self.session in clients:
+                clients[self.session].websockets.discard(self)
+            self._log_counters()
+
+    async def _read_message(self):
+        message = None
+        while message is None:
+            head = bytearray(await self._reader.readexactly(2))
+            fin = head[0] >> 7 & 1
+            rsv1 = head[0] >> 6 & 1
+            opcode = head[0] & 0b1111
+            is_masked = head[1] >> 7 & 1
+            length = head[1] & 127
+
+            if length == 126:
+                length = struct.unpack('>H', await self._reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('>Q', await self._reader.readexactly(8))[0]
+
+            mask = (await self._reader.readexactly(4)) if is_masked else None
+
+            # the length is declared by the client, it is checked before reading the frame
+            self._check_frame_length(length)
+            frame_data = bytearray(await self._reader.readexactly(length))
+            if is_masked:
+                websocket_unmask(frame_data, mask)
+
+            if opcode == _OPCODE_CLOSE:
+                return None
+            message = self._on_frame(fin, opcode, frame_data, rsv1)
+        return message
+
+    def _write(self, data):
+        # called by any thread, the transport is only touched by the event loop
+        if self._loop.is_closed():
+            return False
+        self._loop.call_soon_threadsafe(self._writer.write, data)
+        return True
+
+    def _notify_writer(self):
+        # called by any thread when the outbound queue changes
+        try:
+            self._loop.call_soon_threadsafe(self._outbound_event.set)
+        except RuntimeError:
+            # the loop has been closed
+            pass
+
+    async def _write_outbound_messages(self):
+        # noinspection PyBroadException
+        try:
+            while True:
+                message = self.outbound_queue.pop()
+                if message is None:
+                    if self.outbound_queue.closed:
+                        break
+                    await self._outbound_event.wait()
+                    self._outbound_event.clear()
+                    continue
+                # frames are built in the writing order, as required by the deflate context
+                self._writer.write(self._message_frame(message))
+                await self._writer.drain()
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        except Exception:
+            self._log.error('Error writing websocket message', exc_info=True)
+        finally:
+            self.outbound_queue.close()
+
+    def send_message(self, message):
+        """ Queues the message for the writer task, returns False if the client has been disconnected """
+        if not self.handshake_done:
+            self._log.warning("ignoring message %s (handshake not done)" % message[:10])
+            return False
+
+        self._log.debug('send_message: %s... -> %s', message[:10], self.client_address)
+        return self.outbound_queue.put(message)
+
+    def close(self, terminate_server=True):
+        try:
+            self.handshake_done = False
+            if self.outbound_queue is not None:
+                self.outbound_queue.close()
+            if not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._writer.close)
+            if terminate_server:
+                self.server.shutdown()
+        except Exception:
+            self._log.error("exception in AsyncioWebSocketsHandler.close method", exc_info=True)
+
+
+class AsyncioHTTPServer(object):
+    """ Drop-in alternative to ThreadedHTTPServer, it accepts the same parameters.
+        The listening socket is bound at construction, serve_forever runs the event loop
+        and shutdown stops it, waiting serve_forever to return.
+    """
+
+    # maximum number of threads processing the requests and the callbacks, None for the executor default
+    max_workers = None
+
+    # (worker index, number of worker processes) when the sessions are sharded among processes
+    session_shard = None
+
+    request_queue_size = 128
+
+    # noinspection PyPep8Naming
+    def __init__(self, server_address, RequestHandlerClass,
+                 auth, multiple_instance, enable_file_cache, update_interval,
+                 websocket_timeout_timer_ms, pending_messages_queue_length,
+                 title, server_starter_instance, certfile, keyfile, ssl_version,
+                 dynamic_web_address,
+                 *userdata, **options):
+        self.RequestHandlerClass = RequestHandlerClass
+        self.auth = auth
+        self.multiple_instance = multiple_instance
+        self.enable_file_cache = enable_file_cache
+        self.update_interval = update_interval
+        self.websocket_timeout_timer_ms = websocket_timeout_timer_ms
+        self.pending_messages_queue_length = pending_messages_queue_length
+        self.title = title
+        self.server_starter_instance = server_starter_instance
+        self.dynamic_web_address = dynamic_web_address
+        init_server_options(self, **options)
+        self.userdata = userdata
+
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.ssl_version = ssl_version
+        self._ssl_context = None
+        if self.ssl_version != None:
+            self._ssl_context = ssl.SSLContext(self.ssl_version)
+            self._ssl_context.load_cert_chain(self.certfile, self.keyfile)
+
+        self._log = logging.getLogger('remi.server')
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(server_address)
+        self.socket.listen(self.request_queue_size)
+        self.server_address = self.socket.getsockname()
+
+        self.loop = asyncio.new_event_loop()
+        self.executor = None
+        self._loop_thread = None
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        self._loop_thread = threading.current_thread()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        asyncio.set_event_loop(self.loop)
+        listener = self.loop.create_task(self._listen())
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            if not listener.cancelled() and listener.exception() is None:
+                listener.result().close()
+            self.loop.close()
+            self.executor.shutdown(wait=False)
+            self._stopped.set()
+
+    async def _listen(self):
+        return await asyncio.start_server(self._serve_connection, sock=self.socket, ssl=self._ssl_context)
+
+    def shutdown(self):
+        if self._stopped.is_set():
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        except RuntimeError:
+            # the loop has just been closed
+            return
+        if threading.current_thread() is not self._loop_thread:
+            self._stopped.wait()
+
+    def call_in_loop(self, coro):
+        """ Runs a coroutine in the event loop and waits for its result, to be called by executor threads.
+            Raises ConnectionError if the server gets stopped in the meantime.
+        """
+        if self.loop.is_closed():
+            coro.close()
+            raise ConnectionError('server stopped')
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        while True:
+            try:
+                return future.result(0.5)
+            except concurrent.futures.TimeoutError:
+                if self._stopped.is_set():
+                    future.cancel()
+                    raise ConnectionError('server stopped')
+
+    def serve_socket(self, sock):
+        """ Serves a connection accepted elsewhere, i.e. by the dispatcher of the multi-process server.
+            It can be called by any thread.
+        """
+        self.loop.call_soon_threadsafe(self.loop.create_task, self._serve_socket(sock))
+
+    async def _serve_socket(self, sock):
+        try:
+            reader, writer = await asyncio.open_connection(sock=sock)
+        except OSError:
+            # the client reset the connection before the worker took it
+            sock.close()
+            return
+        await self._serve_connection(reader, writer)
+
+    def _process_request(self, connection, client_address):
+        # noinspection PyBroadException
+        try:
+            self.RequestHandlerClass(connection, client_address, self)
+        except Exception:
+            self._log.error('error processing request from %s' % (client_address,), exc_info=True)
+
+    async def _serve_connection(self, reader, writer):
+        client_address = writer.get_extra_info('peername')
+        # idle persistent connections are closed as in the threaded engine, see App.keep_alive_timeout
+        keep_alive_timeout = getattr(self.RequestHandlerClass, 'keep_alive_timeout', None)
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            # the head and the body of a response are written apart, see App.disable_nagle_algorithm
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), keep_alive_timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+                    return
+                request_line, _, header_lines = head.partition(b'\r\n')
+                headers = http.client.parse_headers(io.BytesIO(header_lines))
+
+                if headers.get('Upgrade', '').lower() == 'websocket':
+                    await AsyncioWebSocketsHandler(headers, reader, writer, client_address, self).serve()
+                    return
+
+                try:
+                    body_length = int(headers.get('Content-Length', 0))
+                except ValueError:
+                    return
+                raw = _StreamReaderFile(head, reader, body_length, self)
+                connection = _ExecutorConnection(io.BufferedReader(raw), writer, self)
+                await self.loop.run_in_executor(self.executor, self._process_request, connection, client_address)
+
+                # the connection is closed if the request body has not been consumed by the handler
+                if raw.remaining > 0 or not self._keep_alive(request_line, headers, connection.response_head):
+                    return
+        except asyncio.CancelledError:
+            # the server is shutting down
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _keep_alive(request_line, request_headers, response_head):
+        """ Returns True if the connection can be reused for the next request,
+            according to the http version and the headers of both request and response.
+        """
+        if not response_head:
+            return False
+        status_line, _, header_lines = response_head.partition(b'\r\n')
+        if not (request_line.rstrip().endswith(b'HTTP/1.1') and status_line.startswith(b'HTTP/1.1')):
+            return False
+        if request_headers.get('Connection', '').lower() == 'close':
+            return False
+        response_headers = http.client.parse_headers(io.BytesIO(header_lines))
+        if response_headers.get('Connection', '').lower() == 'close':
+            return False
+        # the responses without body, the 101 of a websocket takes the connection over
+        status = int(status_line.split()[1])
+        if request_line.startswith(b'HEAD ') or status in (204, 304) or (100 <= status < 200 and status != 101):
+            return True
+        return 'Content-Length' in response_headers or \
+            'chunked' in response_headers.get('Transfer-Encoding', '').lower()
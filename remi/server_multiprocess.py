@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+
+   Multi-process server, selected by Server(..., processes=N, multiple_instance=True).
+   The sessions are sharded among N worker processes. A dispatcher process accepts the
+   connections, peeks at the request head and passes the accepted socket, http and websocket
+   alike, to the worker owning the remi_session cookie, that serves it directly.
+   This way the callbacks and the traffic of different users do not compete for the same GIL.
+
+   Limits: a connection stays with the worker of its first request. With ssl, and where the
+   sockets can't be passed between processes (Windows), the dispatcher terminates the connection
+   and proxies its bytes to the worker, so the traffic goes again through the dispatcher;
+   to scale, terminate ssl in a reverse proxy in front of remi.
+
+   The session ids created by a worker are such that session % N is the worker index,
+   so the dispatcher routes the connections without sharing any state with the workers.
+   Connections without a session cookie are assigned to the workers in round robin.
+"""
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.reduction
+import os
+import select
+import socket
+import ssl
+import sys
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from .server import clients, parse_session_cookie, ThreadedHTTPServer
+
+
+# maximum length of the request head read by the dispatcher to find the session cookie
+_MAX_HEAD_LENGTH = 65536
+
+# seconds a client can take to send the request head to the dispatcher
+_HEAD_TIMEOUT = 10
+
+# seconds a worker process can take to start listening
+_WORKER_START_TIMEOUT = 30
+
+# the accepted sockets are passed to the workers, instead of proxying their bytes
+_PASS_SOCKETS = sys.platform != 'win32'
+
+
+def session_worker(session, processes):
+    """ Returns the index of the worker process owning the session, or None for no session.
+    """
+    if not session:
+        return None
+    return session % processes
+
+
+def parse_head_session(head):
+    """ Returns the remi_session cookie value of a raw http request head, or None.
+    """
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'cookie':
+            return parse_session_cookie(value.decode('latin-1'))
+    return None
+
+
+class _WorkerStarter(object):
+    """ Takes the place of the Server instance in a worker process.
+        App.close() stops the whole server, so the request is forwarded to the dispatcher.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def stop(self):
+        self._conn.send('close')
+
+
+def _receive_sockets(httpd, handles):
+    """ Serves the connections passed by the dispatcher, until it closes the pipe """
+    while True:
+        try:
+            fd = multiprocessing.reduction.recv_handle(handles)
+        except (EOFError, OSError):
+            return
+        sock = socket.socket(fileno=fd)
+        try:
+            httpd.serve_socket(sock)
+        except OSError:
+            # the client reset the connection before the worker took it
+            sock.close()
+
+
+def _serve_worker(index, processes, engine, max_workers, server_args, server_options, conn, handles):
+    """ Entry point of a worker process. It serves the sessions with session % processes == index
+        until the dispatcher sends the stop command. The connections are passed by the
+        dispatcher through handles, or proxied to the listening socket of the worker.
+    """
+    server_class = ThreadedHTTPServer
+    if engine == 'asyncio':
+        from remi.server_asyncio import AsyncioHTTPServer
+        server_class = AsyncioHTTPServer
+    httpd = server_class(('127.0.0.1', 0), *server_args, **server_options)
+    httpd.session_shard = (index, processes)
+    httpd.server_starter_instance = _WorkerStarter(conn)
+    if engine == 'asyncio':
+        httpd.max_workers = max_workers
+    conn.send(httpd.server_address[1])
+
+    th = threading.Thread(target=httpd.serve_forever)
+    th.daemon = True
+    th.start()
+    th = threading.Thread(target=_receive_sockets, args=(httpd, handles))
+    th.daemon = True
+    th.start()
+    try:
+        conn.recv()
+    except (EOFError, OSError):
+        # the dispatcher is gone
+        pass
+    httpd.shutdown()
+    for client in list(clients.values()):
+        client.on_close()
+
+
+class _DispatchHandler(socketserver.BaseRequestHandler):
+    """ Peeks at the request head and passes the connection to the worker owning the session.
+        Where the connection can't be passed, it reads the request head, connects to the worker
+        and pipes the two connections until one of them gets closed.
+    """
+
+    def handle(self):
+        # a client stalling in the request head does not hold a dispatcher thread forever
+        self.request.settimeout(_HEAD_TIMEOUT)
+        if not self.server.pass_sockets:
+            self._proxy()
+            return
+        head = self._peek_head()
+        if head is None:
+            return
+        self.request.settimeout(None)
+        self.server.pass_socket(parse_head_session(head), self.request)
+        # the worker got its own descriptor, the shutdown by the socket server must not reach the client
+        os.close(self.request.detach())
+
+    def _peek_head(self):
+        """ Returns the request head, left unread in the socket for the worker,
+            or None if the client disconnects, the head is too long or not received in _HEAD_TIMEOUT seconds.
+        """
+        deadline = time.time() + _HEAD_TIMEOUT
+        length = 0
+        while True:
+            try:
+                head = self.request.recv(_MAX_HEAD_LENGTH, socket.MSG_PEEK)
+            except socket.timeout:
+                head = None
+            if head == b'':
+                return None
+            if head is not None and b'\r\n\r\n' in head:
+                return head
+            if head is None or time.time() > deadline:
+                self.request.sendall(b'HTTP/1.0 408 Request Timeout\r\n\r\n')
+                return None
+            if len(head) >= _MAX_HEAD_LENGTH:
+                self.request.sendall(b'HTTP/1.0 431 Request Header Fields Too Large\r\n\r\n')
+                return None
+            if len(head) == length:
+                # the peeked data is still readable, select would not wait the rest of the head
+                time.sleep(0.005)
+            length = len(head)
+
+    def _proxy(self):
+        head = b''
+        while not b'\r\n\r\n' in head:
+            try:
+                data = self.request.recv(4096)
+            except socket.timeout:
+                self.request.sendall(b'HTTP/1.0 408 Request Timeout\r\n\r\n')
+                return
+            if not data:
+                return
+            head = head + data
+            if len(head) > _MAX_HEAD_LENGTH:
+                self.request.sendall(b'HTTP/1.0 431 Request Header Fields Too Large\r\n\r\n')
+                return
+
+        worker = self.server.worker_address(parse_head_session(head))
+        try:
+            upstream = socket.create_connection(worker)
+        except socket.error:
+            self.server._log.error('worker %s:%s unreachable' % worker, exc_info=True)
+            self.request.sendall(b'HTTP/1.0 502 Bad Gateway\r\n\r\n')
+            return
+        self.request.settimeout(None)
+        try:
+            upstream.sendall(head)
+            self._pipe(self.request, upstream)
+        finally:
+            upstream.close()
+
+    @staticmethod
+    def _pipe(downstream, upstream):
+        peers = {downstream: upstream, upstream: downstream}
+        while True:
+            # data already decrypted by the ssl layer is not signalled by select
+            readable = [s for s in peers if isinstance(s, ssl.SSLSocket) and s.pending()]
+            if not readable:
+                readable = select.select(list(peers), [], [])[0]
+            for s in readable:
+                try:
+                    data = s.recv(65536)
+                except socket.error:
+                    data = b''
+                if not data:
+                    return
+                peers[s].sendall(data)
+
+
+class DispatcherServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ Accepts the connections on the public address and forwards them to the worker processes.
+        It exposes the same serve_forever/shutdown interface of the other http servers.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, server_address, processes, engine, max_workers, server_args, server_options,
+                 server_starter_instance, certfile, keyfile, ssl_version):
+        socketserver.TCPServer.__init__(self, server_address, _DispatchHandler)
+        self._log = logging.getLogger('remi.server')
+        self.processes = processes
+        self.server_starter_instance = server_starter_instance
+        # the ssl connections are terminated here, the workers get the decrypted bytes
+        self.pass_sockets = _PASS_SOCKETS and ssl_version is None
+        if ssl_version != None:
+            self.socket = ssl.wrap_socket(self.socket, keyfile=keyfile, certfile=certfile, server_side=True,
+                                          ssl_version=ssl_version, do_handshake_on_connect=True)
+
+        self._round_robin = itertools.cycle(range(processes))
+        self._workers = []
+        self.worker_addresses = []
+        # the pipes passing the sockets to each worker, and their locks
+        self._handles = []
+        for index in range(processes):
+            conn, worker_conn = multiprocessing.Pipe()
+            handles, worker_handles = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_worker,
+                                              args=(index, processes, engine, max_workers, server_args,
+                                                    server_options, worker_conn, worker_handles))
+            process.daemon = True
+            process.start()
+            if not conn.poll(_WORKER_START_TIMEOUT):
+                process.terminate()
+                self._stop_workers()
+                raise RuntimeError('remi worker process %s did not start' % index)
+            self.worker_addresses.append(('127.0.0.1', conn.recv()))
+            self._workers.append((process, conn))
+            self._handles.append((handles, threading.Lock()))
+
+        for process, conn in self._workers:
+            th = threading.Thread(target=self._watch_worker, args=(conn,))
+            th.daemon = True
+            th.start()
+        self._log.info('Started %s worker processes' % processes)
+
+    def worker_index(self, session):
+        index = session_worker(session, self.processes)
+        if index is None:
+            index = next(self._round_robin)
+        return index
+
+    def worker_address(self, session):
+        return self.worker_addresses[self.worker_index(session)]
+
+    def pass_socket(self, session, sock):
+        """ Passes the accepted socket to the worker owning the session """
+        index = self.worker_index(session)
+        handles, lock = self._handles[index]
+        with lock:
+            multiprocessing.reduction.send_handle(handles, sock.fileno(), self._workers[index][0].pid)
+
+    def _watch_worker(self, conn):
+        try:
+            command = conn.recv()
+        except (EOFError, OSError):
+            return
+        if command == 'close':
+            self.server_starter_instance.stop()
+
+    def _stop_workers(self):
+        for process, conn in self._workers:
+            try:
+                conn.send('stop')
+            except (EOFError, OSError):
+                pass
+        for handles, lock in self._handles:
+            handles.close()
+        for process, conn in self._workers:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+
+    def shutdown(self):
+        socketserver.TCPServer.shutdown(self)
+        self._stop_workers()
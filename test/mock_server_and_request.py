@@ -8,6 +8,9 @@ except ImportError:
     from io import BytesIO as IO
 
 
+from remi.server import WebSocketCounters, SessionManager, CompressedCache
+
+
 class MockRequest(object):
     def makefile(self, *args, **kwargs):
         return IO(b"GET / HTTP/1.0")
@@ -18,6 +21,12 @@ class MockRequest(object):
     def sendall(self, *args):
         pass
 
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
 
 class MockServer(object):
     def __init__(self):
@@ -28,4 +37,15 @@ class MockServer(object):
     	self.server_address = ('0.0.0.0', 8888)
     	self.websocket_timeout_timer_ms = None
     	self.pending_messages_queue_length = None
+    	self.websocket_compression = False
+    	self.websocket_compression_window_bits = 15
+    	self.websocket_compression_threshold = 1024
+    	self.websocket_queue_length = 100
+    	self.websocket_queue_policy = 'disconnect'
+    	self.websocket_counters = WebSocketCounters()
+    	self.session_shard = None
+    	self.sessions = SessionManager()
+    	self.session_stats = False
+    	self.compressed_cache = CompressedCache(0)
+    	self.websocket_max_message_size = 16 * 1024 * 1024
     	self.userdata = {}
\ No newline at end of file
@@ -0,0 +1,1296 @@
+#!/usr/bin/env python
+
+import io
+import os
+import threading
+import json
+import http.client
+import struct
+import logging
+import unittest
+import remi.gui as gui
+import remi.server as server
+import zlib
+from mock_server_and_request import MockServer
+
+
+def masked_frame(payload, opcode=0x1, fin=True, mask=b'\x01\x02\x03\x04', rsv1=False):
+    head = bytearray([(0x80 if fin else 0) | (0x40 if rsv1 else 0) | opcode])
+    length = len(payload)
+    if length <= 125:
+        head.append(0x80 | length)
+    elif length <= 65535:
+        head.append(0x80 | 126)
+        head += struct.pack('>H', length)
+    else:
+        head.append(0x80 | 127)
+        head += struct.pack('>Q', length)
+    masked = bytearray(payload)
+    for i in range(len(masked)):
+        masked[i] ^= bytearray(mask)[i % 4]
+    return bytes(head) + mask + bytes(masked)
+
+
+class FakeWebSocketsHandler(server.WebSocketsHandler):
+    """ Bypasses the socket server machinery, exposes sent frames and received messages """
+    def __init__(self, data, headers=None):
+        self.server = MockServer()
+        self.headers = headers or {}
+        self.counters = server.WebSocketCounters()
+        self._frame_buffer = bytearray(16)
+        self._send_lock = threading.Lock()
+        self._log = logging.getLogger('remi.server.ws')
+        self.rfile = io.BufferedReader(io.BytesIO(data))
+        self.messages = []
+        self.frames = []
+
+    def on_message(self, message):
+        self.messages.append(message)
+
+    def _send_frame(self, opcode, payload):
+        self.frames.append((opcode, payload))
+
+
+class CloseRecorder(object):
+    """ The socket of a FakeWebSocketsHandler, it records the close frame """
+    data = b''
+
+    def sendall(self, data):
+        self.data += bytes(data)
+
+
+class TestWebSocketFrames(unittest.TestCase):
+    def test_unmask(self):
+        data = bytearray(b'hello websocket')
+        server.websocket_unmask(data, b'\x01\x02\x03\x04')
+        self.assertNotEqual(data, bytearray(b'hello websocket'))
+        server.websocket_unmask(memoryview(data), b'\x01\x02\x03\x04')
+        self.assertEqual(data, bytearray(b'hello websocket'))
+
+    def test_frame_header(self):
+        self.assertEqual(server.websocket_frame_header(0x1, 5), bytearray([0x81, 5]))
+        self.assertEqual(server.websocket_frame_header(0x1, 300), bytearray([0x81, 126]) + struct.pack('>H', 300))
+        self.assertEqual(server.websocket_frame_header(0x2, 70000), bytearray([0x82, 127]) + struct.pack('>Q', 70000))
+
+    def test_read_messages(self):
+        big = ('è' * 40000).encode('utf-8')
+        data = masked_frame(b'callback%2Fa') + masked_frame(big)
+        handler = FakeWebSocketsHandler(data)
+        self.assertTrue(handler.read_next_message())
+        self.assertTrue(handler.read_next_message())
+        self.assertFalse(handler.read_next_message())
+        self.assertEqual(handler.messages, ['callback/a', 'è' * 40000])
+
+    def test_read_fragmented_message_with_ping(self):
+        data = masked_frame(b'frag', fin=False) + masked_frame(b'ping', opcode=0x9) + \
+            masked_frame(b'mented', opcode=0x0) + masked_frame(b'', opcode=0x8)
+        handler = FakeWebSocketsHandler(data)
+        self.assertTrue(handler.read_next_message())
+        self.assertEqual(handler.messages, ['fragmented'])
+        self.assertEqual(handler.frames, [(0xA, b'ping')])
+        self.assertFalse(handler.read_next_message())
+
+
+def raw_deflate(payload):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return data[:-4]
+
+
+class TestPerMessageDeflate(unittest.TestCase):
+    def handler(self, data=b'', offer='permessage-deflate; client_max_window_bits', **settings):
+        handler = FakeWebSocketsHandler(data, {'Sec-WebSocket-Extensions': offer})
+        handler.server.websocket_compression = True
+        for k, v in settings.items():
+            setattr(handler.server, 'websocket_compression_' + k, v)
+        return handler
+
+    def test_parse_extensions(self):
+        self.assertEqual(server.parse_websocket_extensions(
+            'permessage-deflate; client_max_window_bits; server_max_window_bits="10", x-webkit-deflate-frame'),
+            [('permessage-deflate', {'client_max_window_bits': None, 'server_max_window_bits': '10'}),
+             ('x-webkit-deflate-frame', {})])
+
+    def test_negotiation(self):
+        self.assertEqual(self.handler()._negotiate_compression(), 'permessage-deflate')
+        self.assertEqual(self.handler(window_bits=10)._negotiate_compression(),
+                         'permessage-deflate; server_max_window_bits=10')
+        self.assertEqual(self.handler(offer='permessage-deflate; server_max_window_bits=12; '
+                                            'server_no_context_takeover')._negotiate_compression(),
+                         'permessage-deflate; server_no_context_takeover; server_max_window_bits=12')
+        # the unsupported offer is skipped, the fallback one is accepted
+        self.assertEqual(self.handler(offer='permessage-deflate; server_max_window_bits=8, '
+                                            'permessage-deflate; client_no_context_takeover')._negotiate_compression(),
+                         'permessage-deflate; client_no_context_takeover')
+        self.assertIsNone(self.handler(offer='permessage-deflate; unknown')._negotiate_compression())
+        self.assertIsNone(self.handler(offer='')._negotiate_compression())
+        disabled = self.handler()
+        disabled.server.websocket_compression = False
+        self.assertIsNone(disabled._negotiate_compression())
+        self.assertIsNone(disabled._deflate_params)
+
+    def test_send_compressed(self):
+        handler = self.handler(threshold=100)
+        handler._negotiate_compression()
+        small = handler._text_frame('1' * 10)
+        self.assertEqual(small[0], 0x81)
+        big_message = '1' + 'a repetitive message ' * 100
+        inflater = zlib.decompressobj(-15)
+        for i in range(2):
+            frame = handler._text_frame(big_message)
+            self.assertEqual(frame[0], 0xC1)
+            # highly compressible, the payload length fits in the first header byte
+            self.assertEqual(frame[1], len(frame) - 2)
+            payload = bytes(frame[2:])
+            self.assertEqual(inflater.decompress(payload + b'\x00\x00\xff\xff').decode('utf-8'), big_message)
+        c = handler.counters
+        self.assertEqual(c.payload_bytes_out, 10 + 2 * len(big_message))
+        self.assertLess(c.bytes_out, c.payload_bytes_out)
+        self.assertEqual(handler.server.websocket_counters.as_dict(), c.as_dict())
+
+    def test_broadcast_frame(self):
+        message = server.BroadcastMessage('1' + 'a broadcast message ' * 100)
+        plain, other_plain, compressed = self.handler(), self.handler(), self.handler(threshold=100)
+        compressed._negotiate_compression()
+        frame = plain._text_frame(message)
+        # the uncompressed frame is built once and shared
+        self.assertIs(other_plain._text_frame(message), frame)
+        self.assertEqual(frame, plain._text_frame(str(message)))
+        self.assertEqual(compressed._text_frame(message)[0], 0xC1)
+        self.assertEqual(other_plain.counters.payload_bytes_out, len(message))
+
+    def test_read_compressed(self):
+        payload = raw_deflate(b'callback%2Fcompressed')
+        data = masked_frame(payload[:3], fin=False, rsv1=True) + masked_frame(payload[3:], opcode=0x0) + \
+            masked_frame(b'callback%2Fplain')
+        handler = self.handler(data)
+        handler._negotiate_compression()
+        self.assertTrue(handler.read_next_message())
+        self.assertTrue(handler.read_next_message())
+        self.assertEqual(handler.messages, ['callback/compressed', 'callback/plain'])
+        self.assertEqual(handler.counters.bytes_in, len(payload) + len('callback%2Fplain'))
+        self.assertEqual(handler.counters.payload_bytes_in, len('callback%2Fcompressed') + len('callback%2Fplain'))
+
+    def test_max_message_size(self):
+        # the declared length is refused before reading the frame
+        huge = bytes(bytearray([0x81, 0x80 | 127])) + struct.pack('>Q', 2 ** 62) + b'\x01\x02\x03\x04'
+        handler = self.handler(huge)
+        handler.request = CloseRecorder()
+        self.assertFalse(handler.read_next_message())
+        self.assertEqual(handler.request.data, b'\x88\x02' + struct.pack('>H', 1009))
+
+        handler = self.handler(masked_frame(b'a' * 60, fin=False) + masked_frame(b'a' * 60, opcode=0x0))
+        handler.server.websocket_max_message_size = 100
+        handler.request = CloseRecorder()
+        self.assertFalse(handler.read_next_message())
+        self.assertEqual(handler.request.data[-2:], struct.pack('>H', 1009))
+
+        # a small deflated frame inflating beyond the limit
+        bomb = raw_deflate(b'\x00' * (1024 * 1024))
+        handler = self.handler(masked_frame(bomb, rsv1=True) + masked_frame(raw_deflate(b'callback'), rsv1=True))
+        handler.server.websocket_max_message_size = 64 * 1024
+        handler.request = CloseRecorder()
+        handler._negotiate_compression()
+        self.assertLess(len(bomb), 2048)
+        self.assertFalse(handler.read_next_message())
+        self.assertEqual(handler.messages, [])
+        self.assertEqual(handler.request.data[-2:], struct.pack('>H', 1009))
+
+        handler = self.handler(masked_frame(raw_deflate(b'a' * 100), rsv1=True))
+        handler.server.websocket_max_message_size = 100
+        handler._negotiate_compression()
+        self.assertTrue(handler.read_next_message())
+        self.assertEqual(handler.messages, ['a' * 100])
+
+    def test_compressed_frame_without_negotiation(self):
+        handler = self.handler(masked_frame(raw_deflate(b'callback'), rsv1=True), offer='')
+        handler._negotiate_compression()
+        self.assertFalse(handler.read_next_message())
+        self.assertEqual(handler.messages, [])
+
+
+class RecordingWebSocket(object):
+    def __init__(self, raw_payload):
+        self.raw_payload = raw_payload
+        self.messages = []
+
+    def encode_payload(self, payload):
+        return server.WebSocketProtocol.encode_payload(self, payload)
+
+    def send_message(self, message):
+        self.messages.append(message)
+        return True
+
+
+class TestRawPayloadProtocol(unittest.TestCase):
+    def handshake(self, protocols):
+        headers = {'Sec-WebSocket-Key': 'dGhlIHNhbXBsZSBub25jZQ==', 'cookie': 'remi_session=123'}
+        if protocols is not None:
+            headers['Sec-WebSocket-Protocol'] = protocols
+        handler = FakeWebSocketsHandler(masked_frame('callback/a/b/5|v=è%'.encode('utf-8')), headers)
+        server.clients[123] = None
+        try:
+            response = handler._handshake_response()
+        finally:
+            del server.clients[123]
+        return handler, response
+
+    def test_negotiation(self):
+        handler, response = self.handshake('chat, remi.v2')
+        self.assertIn(b'Sec-WebSocket-Protocol: remi.v2\r\n', response)
+        self.assertTrue(handler.raw_payload)
+        self.assertTrue(handler.read_next_message())
+        self.assertEqual(handler.messages, ['callback/a/b/5|v=è%'])
+        self.assertEqual(handler.encode_payload('<p>è %</p>'), '<p>è %</p>')
+
+        for protocols in (None, 'chat'):
+            handler, response = self.handshake(protocols)
+            self.assertNotIn(b'Sec-WebSocket-Protocol', response)
+            self.assertFalse(handler.raw_payload)
+            self.assertEqual(handler.encode_payload('<p>è</p>'), '%3Cp%3E%C3%A8%3C/p%3E')
+
+    def test_non_ascii_callback_per_protocol(self):
+        # the callback built by sendCallbackParam, as sent by remi.js _wsSend for each protocol
+        text = 'città è 5€ 日本'
+        message = 'callback/a/onchange/%d|new_value=%s' % (len('new_value=' + text), text)
+        # v1: encodeURIComponent(unescape(message)), the message has no % escapes to unescape
+        v1 = server.quote(message.encode('utf-8'), safe="-_.!~*'()")
+        # v2: the utf-8 text as is
+        v2 = message.encode('utf-8')
+        decoded = []
+        for raw_payload, payload in ((False, v1.encode('ascii')), (True, v2)):
+            handler = FakeWebSocketsHandler(masked_frame(payload))
+            handler.raw_payload = raw_payload
+            self.assertTrue(handler.read_next_message())
+            decoded.append(handler.messages[0])
+        self.assertEqual(decoded, [message, message])
+        params = decoded[0][len('callback/a/onchange/'):]
+        self.assertEqual(server.parse_parametrs(params), {'new_value': text})
+
+    def test_spontaneous_message_per_protocol(self):
+        app = server.App.__new__(server.App)
+        raw, legacy = RecordingWebSocket(True), RecordingWebSocket(False)
+        app.websockets = set([raw, legacy])
+        app._send_spontaneous_websocket_message('1id,', '<p>è</p>')
+        app._send_spontaneous_websocket_message('2alert(1);')
+        self.assertEqual(raw.messages, ['1id,<p>è</p>', '2alert(1);'])
+        self.assertEqual(legacy.messages, ['1id,%3Cp%3E%C3%A8%3C/p%3E', '2alert(1);'])
+
+    def test_stream_frame_message(self):
+        app = server.App.__new__(server.App)
+        raw, legacy = RecordingWebSocket(True), RecordingWebSocket(False)
+        app.websockets = set([raw, legacy])
+        image = gui.StreamImage()
+        image.identifier = 'cam'
+        app.send_stream_frame(image, b'\xff\xd8data', image.mimetype)
+        message = raw.messages[0]
+        self.assertIs(legacy.messages[0], message)
+        self.assertEqual(message, b'\x00\x0ecam,image/jpeg\xff\xd8data')
+        self.assertEqual(message.key, 'cam')
+        self.assertEqual(message.frame, bytes(bytearray([0x82, len(message)])) + message)
+
+    def test_stream_frame_long_header(self):
+        message = server.stream_frame_message('w' * 300, 'image/jpeg', b'data')
+        self.assertEqual(message[:2], b'\x01\x37')
+        self.assertEqual(message[2:313], ('w' * 300 + ',image/jpeg').encode())
+        self.assertRaises(ValueError, server.stream_frame_message, 'w' * 65536, 'image/jpeg', b'data')
+
+
+class TestBatchedUpdates(unittest.TestCase):
+    def app(self):
+        import threading
+        app = server.App.__new__(server.App)
+        app.update_lock = threading.RLock()
+        app._dirty_widgets = {}
+        app._dirty_lock = threading.Lock()
+        app.update_interval = 1
+        app.page = gui.HTML()
+        app.page.add_child('body', gui.BODY())
+        app.ws = RecordingWebSocket(True)
+        app.websockets = set([app.ws])
+        app.labels = [gui.Label('label %d' % i) for i in range(3)]
+        app.set_root_widget(gui.VBox(children=app.labels))
+        del app.ws.messages[:]
+        return app
+
+    def test_single_change(self):
+        app = self.app()
+        app.labels[0].set_text('changed')
+        app.do_gui_update()
+        self.assertEqual(len(app.ws.messages), 1)
+        self.assertTrue(app.ws.messages[0].startswith('4' + app.labels[0].identifier + ','))
+        self.assertEqual(json.loads(app.ws.messages[0].split(',', 1)[1]),
+                         {'text': 'changed'})
+        app.labels[0].add_child('child', gui.Label('child'))
+        app.do_gui_update()
+        self.assertTrue(app.ws.messages[1].startswith('1' + app.labels[0].identifier + ','))
+        # the patch is encoded as in a batch
+        app.labels[1].set_text('città')
+        app.do_gui_update()
+        self.assertEqual(app.ws.messages[2], '4%s,{"text":"città"}' % app.labels[1].identifier)
+
+    def test_batch(self):
+        app = self.app()
+        app.labels[0].set_text('città')
+        app.labels[2].style['color'] = 'red'
+        app.do_gui_update()
+        self.assertEqual(len(app.ws.messages), 1)
+        message = app.ws.messages[0]
+        self.assertEqual(message[0], server._MSG_BATCH)
+        updates = json.loads(message[1:])
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(updates[0], ['4', app.labels[0].identifier, {'text': 'città'}])
+        self.assertEqual(updates[1], ['4', app.labels[2].identifier, {'style': {'color': 'red'}}])
+        app.do_gui_update()
+        self.assertEqual(len(app.ws.messages), 1)
+
+    def test_dirty_widgets(self):
+        app = self.app()
+        # changes of widgets with refresh disabled are sent with the next update
+        app.labels[1].disable_refresh()
+        app.labels[1].set_text('quiet')
+        app.labels[1].enable_refresh()
+        app.labels[0].set_text('loud')
+        app.do_gui_update()
+        updates = json.loads(app.ws.messages[0][1:])
+        self.assertEqual([u[1] for u in updates], [app.labels[1].identifier, app.labels[0].identifier])
+        # the page is rendered with the last changes
+        self.assertIn('quiet', app.page.repr())
+
+        # the changes of detached widgets are not sent
+        app.root.remove_child(app.labels[2])
+        app.labels[2].set_text('removed')
+        gui.Label('detached').set_text('changed')
+        self.assertEqual(list(app._dirty_widgets), [app.root])
+        app.do_gui_update()
+        self.assertEqual(app.ws.messages[1][:len(app.root.identifier) + 2], '1' + app.root.identifier + ',')
+        self.assertNotIn('removed', app.ws.messages[1])
+
+
+class TestOutboundQueue(unittest.TestCase):
+    def queue(self, policy, maxlen=3, decode_payload=None):
+        self.counters = server.WebSocketCounters()
+        return server.OutboundQueue(maxlen, policy, decode_payload, (self.counters,))
+
+    def test_order_and_close(self):
+        queue = self.queue('disconnect')
+        self.assertTrue(queue.put('3'))
+        self.assertTrue(queue.put('2code'))
+        self.assertEqual(queue.depth, 2)
+        self.assertEqual(queue.get(), '3')
+        self.assertEqual(queue.pop(), '2code')
+        self.assertIsNone(queue.pop())
+        self.assertIsNone(queue.get(timeout=0.01))
+        queue.close()
+        self.assertIsNone(queue.get())
+        self.assertFalse(queue.put('3'))
+        self.assertEqual(queue.max_depth, 2)
+
+    def test_disconnect(self):
+        queue = self.queue('disconnect')
+        for i in range(3):
+            self.assertTrue(queue.put('2code%d' % i))
+        self.assertFalse(queue.put('2code3'))
+        self.assertTrue(queue.closed)
+        self.assertIsNone(queue.get())
+
+    def test_drop_oldest(self):
+        queue = self.queue('drop-oldest')
+        for i in range(5):
+            self.assertTrue(queue.put('1w%d,<p>' % i))
+        self.assertEqual([queue.pop() for i in range(3)], ['1w2,<p>', '1w3,<p>', '1w4,<p>'])
+        self.assertEqual(self.counters.dropped_messages, 2)
+
+    def test_overflow_keeps_acks_and_javascript(self):
+        for policy in ('drop-oldest', 'coalesce'):
+            queue = self.queue(policy, 2)
+            queue.put('3')
+            queue.put('2code')
+            # nothing can be discarded, the client reconnects instead of losing the ack
+            self.assertFalse(queue.put('1a,<p>'))
+            self.assertTrue(queue.closed)
+
+            queue = self.queue(policy, 3)
+            queue.put('3')
+            queue.put('1a,<p>')
+            queue.put('2code')
+            self.assertTrue(queue.put('1b,<p>'))
+            self.assertEqual([queue.pop() for i in range(3)], ['3', '2code', '1b,<p>'])
+            self.assertEqual(self.counters.dropped_messages, 1)
+
+    def test_coalesce(self):
+        queue = self.queue('coalesce', 4, server.from_websocket)
+        batch = server.to_websocket(json.dumps([['1', 'a', '<p id="a">'], ['4', 'b', {}]]))
+        queue.put('5' + batch)
+        queue.put('1b,<p id="b">')
+        queue.put('2code')
+        queue.put('4a,{}')
+        # the new update of b replaces the queued one, but neither the batch (a is not replaced) nor the patch of a
+        queue.put('1b,<p id="b">new')
+        self.assertEqual(self.counters.coalesced_messages, 1)
+        self.assertEqual(self.counters.dropped_messages, 0)
+        self.assertEqual(queue.depth, 4)
+        # a batch replacing both a and b supersedes all the queued updates
+        queue.put('5' + server.to_websocket(json.dumps([['1', 'a', ''], ['1', 'b', '']])))
+        self.assertEqual(self.counters.coalesced_messages, 4)
+        self.assertEqual([queue.pop(), queue.pop()], ['2code', '5' + server.to_websocket(
+            json.dumps([['1', 'a', ''], ['1', 'b', '']]))])
+
+    def test_coalesce_show_window(self):
+        queue = self.queue('coalesce', 2)
+        queue.put('1a,<p>')
+        queue.put('3')
+        queue.put('0root,<body>')
+        self.assertEqual([queue.pop(), queue.pop()], ['3', '0root,<body>'])
+        self.assertEqual(self.counters.coalesced_messages, 1)
+
+    def test_replace_stream_frames(self):
+        queue = self.queue('disconnect', 3)
+        queue.put(server.stream_frame_message('a', 'image/jpeg', b'1'))
+        queue.put('2code')
+        queue.put(server.stream_frame_message('b', 'image/jpeg', b'1'))
+        # the queue is full, but a newer frame of a widget takes the place of the queued one
+        self.assertTrue(queue.put(server.stream_frame_message('a', 'image/jpeg', b'2')))
+        self.assertFalse(queue.closed)
+        self.assertEqual(self.counters.dropped_messages, 1)
+        self.assertEqual([queue.pop() for i in range(3)], [b'\x00\x0ca,image/jpeg2', '2code', b'\x00\x0cb,image/jpeg1'])
+
+
+class MinimalApp(server.App):
+    def main(self):
+        return gui.Label('asyncio engine')
+
+
+class TestAsyncioEngine(unittest.TestCase):
+    def test_serve_page_and_resource(self):
+        from remi.server_asyncio import AsyncioHTTPServer
+        MinimalApp.log_request = (lambda *args: None)
+        # a session left by other tests would be reused
+        server.clients.clear()
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, engine='asyncio')
+        s.start()
+        try:
+            self.assertIsInstance(s._sserver, AsyncioHTTPServer)
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertIn(b'asyncio engine', response.read())
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/res:style.css')
+            self.assertEqual(conn.getresponse().status, 200)
+        finally:
+            s.stop()
+            del MinimalApp.log_request
+
+    def test_max_message_size(self):
+        import base64
+        import socket
+        MinimalApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, engine='asyncio',
+                          websocket_max_message_size=1000)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie').split(';')[0]
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(('GET / HTTP/1.1\r\nHost: a\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\nCookie: %s\r\n\r\n' %
+                          (base64.b64encode(os.urandom(16)).decode(), cookie)).encode())
+            sock.sendall(masked_frame(b'x' * 1001))
+            data = b''
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+            # the close frame follows the page message
+            self.assertTrue(data.endswith(b'\x88\x02' + struct.pack('>H', 1009)))
+            sock.close()
+        finally:
+            s.stop()
+            del MinimalApp.log_request
+
+    def test_keep_alive(self):
+        from remi.server_asyncio import AsyncioHTTPServer
+        request_headers = http.client.parse_headers(io.BytesIO(b'Host: a\r\n\r\n'))
+        self.assertTrue(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers,
+                                                      b'HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\n'))
+        self.assertFalse(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers,
+                                                       b'HTTP/1.0 200 OK\r\nContent-Length: 3\r\n\r\n'))
+        self.assertFalse(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers,
+                                                       b'HTTP/1.1 200 OK\r\n\r\n'))
+        self.assertFalse(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers, None))
+        # the responses without body
+        self.assertTrue(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers,
+                                                      b'HTTP/1.1 304 Not Modified\r\nETag: "a"\r\n\r\n'))
+        self.assertTrue(AsyncioHTTPServer._keep_alive(b'HEAD / HTTP/1.1', request_headers,
+                                                      b'HTTP/1.1 200 OK\r\n\r\n'))
+        self.assertFalse(AsyncioHTTPServer._keep_alive(b'GET / HTTP/1.1', request_headers,
+                                                       b'HTTP/1.1 101 Switching Protocols\r\n\r\n'))
+
+
+class TestStaticFiles(unittest.TestCase):
+    def test_parse_byte_range(self):
+        self.assertEqual(server.parse_byte_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(server.parse_byte_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(server.parse_byte_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(server.parse_byte_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(server.parse_byte_range('bytes=-200', 100), (0, 99))
+        self.assertFalse(server.parse_byte_range('bytes=100-', 100))
+        # not supported, the whole file is sent
+        self.assertIsNone(server.parse_byte_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(server.parse_byte_range('items=0-1', 100))
+        self.assertIsNone(server.parse_byte_range('bytes=5-1', 100))
+
+    def check_engine(self, engine):
+        MinimalApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, engine=engine)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            with open(os.path.join(os.path.dirname(server.__file__), 'res', 'style.css'), 'rb') as f:
+                content = f.read()
+
+            def get(headers={}):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/res:style.css', headers=headers)
+                response = conn.getresponse()
+                return response, response.read()
+
+            response, body = get()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(body, content)
+            self.assertEqual(int(response.getheader('Content-Length')), len(content))
+            etag = response.getheader('ETag')
+            last_modified = response.getheader('Last-Modified')
+
+            self.assertEqual(get({'If-None-Match': etag})[0].status, 304)
+            self.assertEqual(get({'If-None-Match': '"other"'})[0].status, 200)
+            self.assertEqual(get({'If-Modified-Since': last_modified})[0].status, 304)
+            # the connection is kept alive after a response without body
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            for i in range(2):
+                conn.request('GET', '/res:style.css', headers={'If-None-Match': etag})
+                response = conn.getresponse()
+                response.read()
+                self.assertEqual(response.status, 304)
+            conn.close()
+
+            response, body = get({'Range': 'bytes=10-19'})
+            self.assertEqual(response.status, 206)
+            self.assertEqual(body, content[10:20])
+            self.assertEqual(response.getheader('Content-Range'), 'bytes 10-19/%d' % len(content))
+            response, body = get({'Range': 'bytes=-5', 'If-Range': etag})
+            self.assertEqual(body, content[-5:])
+            # the resource changed, the whole file is sent
+            response, body = get({'Range': 'bytes=-5', 'If-Range': '"other"'})
+            self.assertEqual((response.status, body), (200, content))
+            self.assertEqual(get({'Range': 'bytes=%d-' % len(content)})[0].status, 416)
+        finally:
+            s.stop()
+            del MinimalApp.log_request
+
+    def test_internal_js(self):
+        MinimalApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            page = conn.getresponse().read().decode()
+            # only the settings are inlined
+            self.assertIn('<script src="/%s"></script>' % gui.INTERNAL_JS_PATH, page)
+            self.assertNotIn('Remi.prototype', page)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/' + gui.INTERNAL_JS_PATH)
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertIn(b'Remi.prototype', response.read())
+            self.assertIn('immutable', response.getheader('Cache-Control'))
+        finally:
+            s.stop()
+            del MinimalApp.log_request
+
+    def test_threaded(self):
+        self.check_engine('threaded')
+
+    def test_asyncio(self):
+        self.check_engine('asyncio')
+
+
+class PollingImage(gui.Image):
+    def get_image_data(self, index=0):
+        return b'frame' + index.encode(), {'Content-type': 'image/jpeg'}
+
+
+class PollingApp(server.App):
+    def main(self):
+        return PollingImage('/res:logo.png')
+
+
+class TestPersistentConnections(unittest.TestCase):
+    def check_engine(self, engine):
+        import socket
+        PollingApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(PollingApp, start=False, start_browser=False, port=0, engine=engine)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            response.read()
+            # the handler creating the session does not serve other requests
+            self.assertEqual(response.getheader('Connection'), 'close')
+            image_url = '/%s/get_image_data' % id(server.clients[0].page.children['body'].children['root'])
+
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/res:style.css')
+            conn.getresponse().read()
+            sock = conn.sock
+            self.assertIsNotNone(sock)
+            for path, status, body in ((image_url + '?index=1', 200, b'frame1'),
+                                       ('/res:missing.css', 404, b''),
+                                       ('/%s/missing' % id(s), 503, b''),
+                                       ('/missing', 404, b''),
+                                       (image_url + '?index=2', 200, b'frame2')):
+                conn.request('GET', path)
+                response = conn.getresponse()
+                self.assertEqual((response.status, response.read()), (status, body))
+                self.assertEqual(int(response.getheader('Content-Length')), len(body))
+                self.assertIs(conn.sock, sock)
+
+            # pipelined requests are answered in order
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            request = 'GET %s?index=%%d HTTP/1.1\r\nHost: a\r\n\r\n' % image_url
+            sock.sendall((request % 3 + request % 4).encode())
+            data = b''
+            while not data.endswith(b'frame4'):
+                chunk = sock.recv(4096)
+                self.assertTrue(chunk)
+                data += chunk
+            sock.close()
+            self.assertEqual(data.count(b'HTTP/1.1 200'), 2)
+            self.assertLess(data.index(b'frame3'), data.index(b'frame4'))
+        finally:
+            s.stop()
+            del PollingApp.log_request
+
+    def test_threaded(self):
+        self.check_engine('threaded')
+
+    def test_asyncio(self):
+        self.check_engine('asyncio')
+
+
+class StreamApp(server.App):
+    def main(self):
+        return gui.StreamImage()
+
+
+class TestStreamImage(unittest.TestCase):
+    def test_encode(self):
+        class FakeImage(object):
+            def __init__(self, error=None):
+                self.error = error
+                self.saved = []
+
+            def save(self, f, **params):
+                if self.error:
+                    raise self.error
+                self.saved.append(params)
+                f.write(b'img')
+
+        image = gui.StreamImage('png')
+        fake = FakeImage()
+        self.assertEqual(image.encode(fake), b'img')
+        # the quality applies only to the lossy formats
+        self.assertEqual(fake.saved, [{'format': 'PNG'}])
+        image = gui.StreamImage('jpeg', quality=50)
+        image.encode(fake)
+        self.assertEqual(fake.saved[-1], {'format': 'JPEG', 'quality': 50})
+        # the frames that can't be encoded are skipped
+        logging.disable(logging.ERROR)
+        try:
+            self.assertIsNone(image.encode(FakeImage(OSError('cannot write mode RGBA as JPEG'))))
+            self.assertFalse(image.set_frame(FakeImage(OSError('cannot write mode RGBA as JPEG'))))
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertIsNone(image._frame)
+
+    def recv_frame(self, rfile):
+        head = bytearray(rfile.read(2))
+        length = head[1] & 127
+        if length == 126:
+            length = struct.unpack('>H', rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', rfile.read(8))[0]
+        return head[0], rfile.read(length)
+
+    def check_engine(self, engine):
+        import base64
+        import socket
+        StreamApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(StreamApp, start=False, start_browser=False, port=0, engine=engine)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie').split(';')[0]
+            image = server.clients[0].page.children['body'].children['root']
+            # no frame yet
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', image.attributes['src'])
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(response.status, 503)
+
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(('GET / HTTP/1.1\r\nHost: a\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\nCookie: %s\r\n\r\n' %
+                          (base64.b64encode(os.urandom(16)).decode(), cookie)).encode())
+            rfile = sock.makefile('rb')
+            head = b''
+            while not head.endswith(b'\r\n\r\n'):
+                head += rfile.read(1)
+            self.assertEqual(self.recv_frame(rfile)[0], 0x81)
+            # the client gets registered by its first message
+            sock.sendall(masked_frame(b'connected'))
+            self.assertEqual(self.recv_frame(rfile), (0x81, b'3'))
+            self.assertTrue(image.set_frame(b'\xff\xd8frame'))
+            head = ('%s,image/jpeg' % image.identifier).encode()
+            self.assertEqual(self.recv_frame(rfile), (0x82, struct.pack('!H', len(head)) + head + b'\xff\xd8frame'))
+            sock.close()
+
+            conn.request('GET', image.attributes['src'])
+            response = conn.getresponse()
+            self.assertEqual(response.read(), b'\xff\xd8frame')
+            self.assertEqual(response.getheader('Content-type'), 'image/jpeg')
+            self.assertEqual(response.getheader('Cache-Control'), 'no-store')
+        finally:
+            s.stop()
+            del StreamApp.log_request
+
+    def test_threaded(self):
+        self.check_engine('threaded')
+
+    def test_asyncio(self):
+        self.check_engine('asyncio')
+
+
+class StreamingWidget(gui.Label):
+    closed = False
+
+    def chunks(self, count=0):
+        def generate():
+            try:
+                for i in range(int(count)):
+                    yield 'chunk%d,' % i
+            finally:
+                StreamingWidget.closed = True
+        return generate(), {'Content-type': 'text/plain'}
+
+    def buffer(self):
+        return io.BytesIO(b'x' * 100000), {'Content-type': 'text/plain'}
+
+
+class StreamingApp(server.App):
+    def main(self):
+        root = gui.VBox()
+        root.append(StreamingWidget('streaming'), 'stream')
+        root.append(gui.FileDownloader('download', server.__file__), 'download')
+        return root
+
+    def log_request(self, *args):
+        pass
+
+
+class TestStreamingResponses(unittest.TestCase):
+    def check_engine(self, engine):
+        import socket
+        server.clients.clear()
+        s = server.Server(StreamingApp, start=False, start_browser=False, port=0, engine=engine)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            root = server.clients[0].page.children['body'].children['root']
+            stream_id, download_id = id(root.children['stream']), id(root.children['download'])
+
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            StreamingWidget.closed = False
+            conn.request('GET', '/%s/chunks?count=3' % stream_id)
+            response = conn.getresponse()
+            self.assertEqual(response.getheader('Transfer-Encoding'), 'chunked')
+            self.assertEqual(response.read(), b'chunk0,chunk1,chunk2,')
+            self.assertTrue(StreamingWidget.closed)
+            sock = conn.sock
+
+            conn.request('GET', '/%s/buffer' % stream_id)
+            self.assertEqual(conn.getresponse().read(), b'x' * 100000)
+
+            # a regular file is sent with its length
+            conn.request('GET', '/%s/download' % download_id)
+            response = conn.getresponse()
+            with open(server.__file__, 'rb') as f:
+                content = f.read()
+            self.assertEqual(int(response.getheader('Content-Length')), len(content))
+            self.assertIn('attachment', response.getheader('Content-Disposition'))
+            self.assertEqual(response.read(), content)
+            self.assertIs(conn.sock, sock)
+
+            # without chunked encoding, the end of the content is the end of the connection
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(('GET /%s/chunks?count=2 HTTP/1.0\r\n\r\n' % stream_id).encode())
+            data = b''
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            sock.close()
+            self.assertTrue(data.endswith(b'\r\n\r\nchunk0,chunk1,'))
+        finally:
+            s.stop()
+
+    def test_threaded(self):
+        self.check_engine('threaded')
+
+    def test_asyncio(self):
+        self.check_engine('asyncio')
+
+
+def multipart_body(boundary, fields, files):
+    body = b''
+    for name, value in fields:
+        body += b'--' + boundary + b'\r\nContent-Disposition: form-data; name="' + name + b'"\r\n\r\n' + value + b'\r\n'
+    for name, filename, data in files:
+        body += b'--' + boundary + b'\r\nContent-Disposition: form-data; name="' + name + \
+            b'"; filename="' + filename + b'"\r\nContent-Type: application/octet-stream\r\n\r\n' + data + b'\r\n'
+    return body + b'--' + boundary + b'--\r\n'
+
+
+class TestMultipartParser(unittest.TestCase):
+    content_type = 'multipart/form-data; boundary="----bound"'
+
+    def test_parse_header_params(self):
+        self.assertEqual(server.parse_header_params('form-data; name="a"; filename="b; c.txt"'),
+                         {'name': 'a', 'filename': 'b; c.txt'})
+        self.assertEqual(server.parse_header_params(self.content_type), {'boundary': '----bound'})
+
+    def test_parse(self):
+        data = os.urandom(5000) + b'\r\n------boun' + os.urandom(100)
+        body = b'preamble\r\n' + multipart_body(b'----bound', [(b'field', b'value')],
+                                                  [(b'upload_file', b'a.bin', data)]) + b'epilogue'
+        for chunk_size in (1, 7, 65536):
+            fp = io.BytesIO(body + b'GET / HTTP/1.1')
+            parts = []
+            for part in server.MultipartParser(fp, self.content_type, len(body), chunk_size):
+                parts.append((part.name, part.filename, b''.join(part)))
+            self.assertEqual(parts, [('field', None, b'value'), ('upload_file', 'a.bin', data)])
+            # the whole body is consumed, not a byte more
+            self.assertEqual(fp.read(), b'GET / HTTP/1.1')
+
+    def test_skip_unread_part(self):
+        body = multipart_body(b'----bound', [(b'a', b'1' * 1000), (b'b', b'2')], [])
+        names = [part.name for part in server.MultipartParser(io.BytesIO(body), self.content_type, len(body), 16)]
+        self.assertEqual(names, ['a', 'b'])
+
+    def test_malformed(self):
+        body = multipart_body(b'----bound', [], [(b'f', b'a.bin', b'data')])
+        with self.assertRaises(ValueError):
+            list(server.MultipartParser(io.BytesIO(body), 'multipart/form-data', len(body)))
+        with self.assertRaises(ValueError):
+            for part in server.MultipartParser(io.BytesIO(body[:-20]), self.content_type, len(body) - 20):
+                b''.join(part)
+
+
+class UploadApp(server.App):
+    def main(self, savepath):
+        self.progress = []
+        self.uploader = gui.FileUploader(savepath, max_size=200000)
+        self.uploader.onprogress.do(lambda emitter, filename, loaded, total:
+                                    self.progress.append((filename, loaded, total)))
+        return self.uploader
+
+    def log_request(self, *args):
+        pass
+
+
+class TestUpload(unittest.TestCase):
+    def check_engine(self, engine):
+        import shutil
+        import tempfile
+        savepath = tempfile.mkdtemp()
+        server.clients.clear()
+        s = server.Server(UploadApp, start=False, start_browser=False, port=0, engine=engine, userdata=(savepath,))
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            app = server.clients[0]
+
+            def post(filename, data):
+                body = multipart_body(b'----bound', [], [(b'upload_file', filename.encode(), data)])
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('POST', '/', body, {'Content-Type': TestMultipartParser.content_type,
+                                                 'filename': filename, 'filesize': str(len(data)),
+                                                 'listener': str(id(app.uploader)), 'listener_function': 'ondata'})
+                return conn.getresponse().status
+
+            data = os.urandom(150000)
+            self.assertEqual(post('a.bin', data), 200)
+            with open(os.path.join(savepath, 'a.bin'), 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(app.progress[-1], ('a.bin', 150000, 150000))
+            self.assertLessEqual(len(app.progress), 101)
+
+            # too big, the partial file is removed
+            self.assertEqual(post('b.bin', os.urandom(250000)), 400)
+            self.assertEqual(os.listdir(savepath), ['a.bin'])
+
+            def post_chunk(offset, length):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('POST', '/', data[offset:offset + length], {
+                    'filename': 'c.bin', 'filesize': str(len(data)), 'listener': str(id(app.uploader)),
+                    'upload_id': 'c-1', 'upload_offset': str(offset)})
+                return conn.getresponse().status
+
+            def upload_status():
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/%s/upload_status?upload_id=c-1' % id(app.uploader))
+                return json.loads(conn.getresponse().read().decode())
+
+            # resumable upload, the chunks arrive in any order and possibly more than once
+            self.assertEqual(upload_status(), [])
+            self.assertEqual(post_chunk(100000, 50000), 200)
+            self.assertEqual(post_chunk(0, 50000), 200)
+            self.assertEqual(post_chunk(0, 50000), 200)
+            self.assertEqual(upload_status(), [0, 100000])
+            self.assertEqual(app.progress[-1], ('c.bin', 100000, 150000))
+            self.assertFalse(os.path.exists(os.path.join(savepath, 'c.bin')))
+            self.assertEqual(post_chunk(50000, 50000), 200)
+            with open(os.path.join(savepath, 'c.bin'), 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(app.progress[-1], ('c.bin', 150000, 150000))
+            self.assertEqual(upload_status(), [0, 50000, 100000])
+            # sent again after the upload is complete, it is ignored
+            self.assertEqual(post_chunk(50000, 50000), 200)
+            self.assertEqual(sorted(os.listdir(savepath)), ['a.bin', 'c.bin'])
+
+            # the chunks overlapping the ones received are rejected
+            data = os.urandom(150001)
+            self.assertEqual(post_chunk(0, 50000), 200)
+            self.assertEqual(post_chunk(25000, 50000), 400)
+            self.assertEqual(post_chunk(0, 60000), 400)
+            self.assertEqual(post_chunk(50000, 50000), 200)
+            self.assertEqual(post_chunk(100000, 50001), 200)
+            with open(os.path.join(savepath, 'c.bin'), 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertEqual(sorted(os.listdir(savepath)), ['a.bin', 'c.bin'])
+        finally:
+            s.stop()
+            shutil.rmtree(savepath)
+
+    def test_threaded(self):
+        self.check_engine('threaded')
+
+    def test_asyncio(self):
+        self.check_engine('asyncio')
+
+
+class TestCompressedCache(unittest.TestCase):
+    def test_select_encoding(self):
+        self.assertEqual(server.select_content_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(server.select_content_encoding('deflate, gzip;q=0'), None)
+        self.assertEqual(server.select_content_encoding(None), None)
+        self.assertEqual(server.select_content_encoding('br, gzip'), 'br' if server.brotli else 'gzip')
+
+    def test_cache(self):
+        cache = server.CompressedCache(400)
+        loads = []
+
+        def load(content):
+            loads.append(content)
+            return content
+
+        a = cache.get('a', 'gzip', lambda: load(b'a' * 100))
+        self.assertEqual(zlib.decompress(a, 16 + zlib.MAX_WBITS), b'a' * 100)
+        self.assertIs(cache.get('a', 'gzip', lambda: load(b'a' * 100)), a)
+        self.assertEqual((cache.hits, cache.misses, len(loads)), (1, 1, 1))
+        # the least recently used entries are discarded beyond the size
+        for i in range(20):
+            cache.get(i, 'gzip', lambda: load(os.urandom(50)))
+        self.assertLessEqual(cache.size, 400)
+        cache.get('a', 'gzip', lambda: load(b'a' * 100))
+        self.assertEqual(cache.misses, 22)
+        self.assertTrue(cache.fits(100))
+        self.assertFalse(cache.fits(101))
+
+    def test_compression_levels(self):
+        content = b'<div class="label">remi</div>' * 1000
+        for dynamic in (False, True):
+            self.assertEqual(zlib.decompress(server.compress_content(content, 'gzip', dynamic), 16 + zlib.MAX_WBITS),
+                             content)
+        if server.brotli:
+            self.assertEqual(server.brotli.decompress(server.compress_content(content, 'br', True)), content)
+
+    def test_static_file_and_page(self):
+        MinimalApp.log_request = (lambda *args: None)
+        server.clients.clear()
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0)
+        s.start()
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            with open(os.path.join(os.path.dirname(server.__file__), 'res', 'style.css'), 'rb') as f:
+                content = f.read()
+
+            def get(path, headers):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                return response, response.read()
+
+            for i in range(2):
+                response, body = get('/res:style.css', {'Accept-Encoding': 'gzip'})
+                self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+                self.assertEqual(zlib.decompress(body, 16 + zlib.MAX_WBITS), content)
+            self.assertEqual((s._sserver.compressed_cache.hits, s._sserver.compressed_cache.misses), (1, 1))
+            self.assertEqual(get('/res:style.css', {'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': response.getheader('ETag')})[0].status, 304)
+            # byte ranges refer to the identity encoding
+            response, body = get('/res:style.css', {'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9'})
+            self.assertEqual((response.status, response.getheader('Content-Encoding'), body), (206, None, content[:10]))
+            # binary files are not compressed
+            self.assertIsNone(get('/res:logo.png', {'Accept-Encoding': 'gzip'})[0].getheader('Content-Encoding'))
+
+            entries = s._sserver.compressed_cache.as_dict()
+            response, body = get('/', {'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+            self.assertIn(b'asyncio engine', zlib.decompress(body, 16 + zlib.MAX_WBITS))
+            # the page of a session is not cached
+            self.assertEqual(s._sserver.compressed_cache.as_dict(), entries)
+        finally:
+            s.stop()
+            del MinimalApp.log_request
+
+
+class TestSessionManager(unittest.TestCase):
+    class FakeApp(object):
+        def __init__(self):
+            self.websockets = set()
+            self.update_lock = threading.RLock()
+            self.page = gui.HTML()
+            self.page.add_child('body', gui.BODY())
+            self.page.children['body'].append(gui.VBox(children=[gui.Label('a'), gui.Label('b')]))
+            self.events = []
+
+        def on_session_evicted(self):
+            self.events.append('evicted')
+
+        def on_close(self):
+            self.events.append('closed')
+
+    def setUp(self):
+        server.clients.clear()
+
+    def tearDown(self):
+        server.clients.clear()
+
+    def test_max_sessions(self):
+        sessions = server.SessionManager(max_sessions=2)
+        apps = [self.FakeApp() for _ in range(3)]
+        sessions.add(1, apps[0])
+        sessions.add(2, apps[1])
+        sessions.touch(1)
+        sessions.add(3, apps[2])
+        # the least recently used session is evicted
+        self.assertEqual(sorted(server.clients.keys()), [1, 3])
+        self.assertEqual(apps[1].events, ['evicted', 'closed'])
+        self.assertEqual(apps[0].events, [])
+
+    def test_idle_timeout(self):
+        sessions = server.SessionManager(session_timeout=10)
+        apps = [self.FakeApp() for _ in range(3)]
+        for i, app in enumerate(apps):
+            sessions.add(i + 1, app)
+        apps[1].websockets.add(object())
+        sessions._last_access[1] -= 20
+        sessions._last_access[2] -= 20
+        sessions.evict_idle()
+        # a session with an open page is not idle
+        self.assertEqual(sorted(server.clients.keys()), [2, 3])
+        self.assertEqual(apps[0].events, ['evicted', 'closed'])
+
+        stats = sessions.stats()
+        self.assertEqual(stats['live_sessions'], 2)
+        self.assertEqual(stats['evicted_sessions'], 1)
+        # html, body with its loading animation, vbox and two labels
+        self.assertEqual([s['widgets'] for s in stats['sessions']], [7, 7])
+        self.assertEqual(sorted(s['websockets'] for s in stats['sessions']), [0, 1])
+
+
+class TestServerOptions(unittest.TestCase):
+    def test_positional_userdata(self):
+        from remi.server_asyncio import AsyncioHTTPServer
+        for server_class in (server.ThreadedHTTPServer, AsyncioHTTPServer):
+            # the arguments before the userdata are the same as ever, the newer settings are keywords
+            httpd = server_class(('127.0.0.1', 0), MinimalApp, None, False, True, 0.1, 1000, 1000, 'title',
+                                 None, None, None, None, False, 'a', 'b', websocket_queue_length=5)
+            try:
+                self.assertEqual(httpd.userdata, ('a', 'b'))
+                self.assertEqual(httpd.websocket_queue_length, 5)
+                self.assertEqual(httpd.websocket_queue_policy, 'disconnect')
+                self.assertEqual(httpd.websocket_max_message_size, 16 * 1024 * 1024)
+            finally:
+                httpd.socket.close()
+
+
+class TestMultiProcess(unittest.TestCase):
+    def test_routing(self):
+        from remi.server_multiprocess import session_worker, parse_head_session
+        self.assertEqual(parse_head_session(b'GET / HTTP/1.1\r\nHost: a\r\nCookie: x=1; remi_session=43\r\n\r\n'), 43)
+        self.assertIsNone(parse_head_session(b'GET / HTTP/1.1\r\nHost: a\r\n\r\n'))
+        self.assertEqual(session_worker(43, 4), 3)
+        self.assertIsNone(session_worker(None, 4))
+        with self.assertRaises(ValueError):
+            server.Server(MinimalApp, start=False, start_browser=False, processes=2)
+
+    def test_sessions_sharded(self):
+        from remi.server_multiprocess import DispatcherServer
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, processes=2, multiple_instance=True)
+        s.start()
+        try:
+            self.assertIsInstance(s._sserver, DispatcherServer)
+            port = s._sserver.socket.getsockname()[1]
+
+            def get(cookie=None):
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                conn.request('GET', '/', headers={'Cookie': cookie} if cookie else {})
+                response = conn.getresponse()
+                self.assertEqual(response.status, 200)
+                response.read()
+                return response.getheader('Set-Cookie').split(';')[0]
+
+            # new sessions are assigned in round robin, each worker creates its own session ids
+            first, second = get(), get()
+            sessions = [server.parse_session_cookie(c) for c in (first, second)]
+            self.assertEqual(sorted(session % 2 for session in sessions), [0, 1])
+            # a known session is served by its owner, that does not create a new one
+            self.assertEqual(get(second), second)
+            self.assertEqual(get(first), first)
+        finally:
+            s.stop()
+
+    def check_websocket(self, engine):
+        import base64
+        import socket
+        import time
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, processes=2,
+                          multiple_instance=True, engine=engine)
+        s.start()
+        try:
+            self.assertTrue(s._sserver.pass_sockets)
+            port = s._sserver.socket.getsockname()[1]
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            response = conn.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie').split(';')[0]
+            # the connection is kept by the worker for the next requests
+            conn.request('GET', '/res:style.css', headers={'Cookie': cookie})
+            self.assertEqual(conn.getresponse().status, 200)
+
+            def dispatching():
+                return len([t for t in threading.enumerate() if 'process_request_thread' in t.name])
+            before = dispatching()
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            sock.sendall(('GET / HTTP/1.1\r\nHost: a\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                          'Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\nCookie: %s\r\n\r\n' %
+                          (base64.b64encode(os.urandom(16)).decode(), cookie)).encode())
+            rfile = sock.makefile('rb')
+            head = b''
+            while not head.endswith(b'\r\n\r\n'):
+                head += rfile.read(1)
+            self.assertIn(b'101 Switching Protocols', head)
+            self.assertEqual(TestStreamImage.recv_frame(None, rfile)[0], 0x81)
+            sock.sendall(masked_frame(b'connected'))
+            self.assertEqual(TestStreamImage.recv_frame(None, rfile), (0x81, b'3'))
+            time.sleep(0.1)
+            # the dispatcher passed the socket to the worker, it does not proxy the traffic
+            self.assertEqual(dispatching(), before)
+            sock.close()
+        finally:
+            s.stop()
+
+    def test_head_timeout(self):
+        import socket
+        import remi.server_multiprocess as server_multiprocess
+        s = server.Server(MinimalApp, start=False, start_browser=False, port=0, processes=2, multiple_instance=True)
+        s.start()
+        timeout = server_multiprocess._HEAD_TIMEOUT
+        server_multiprocess._HEAD_TIMEOUT = 0.3
+        try:
+            port = s._sserver.socket.getsockname()[1]
+            sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+            # a part of the head, then the client stalls
+            sock.sendall(b'GET / HTTP/1.1\r\nHost: a\r\n')
+            self.assertEqual(sock.recv(1024), b'HTTP/1.0 408 Request Timeout\r\n\r\n')
+            sock.close()
+        finally:
+            server_multiprocess._HEAD_TIMEOUT = timeout
+            s.stop()
+
+    def test_receive_reset_socket(self):
+        import multiprocessing
+        import multiprocessing.reduction
+        import socket
+        from remi.server_multiprocess import _receive_sockets
+
+        class Worker(object):
+            served = []
+
+            def serve_socket(self, sock):
+                self.served.append(sock.getpeername())
+                sock.close()
+
+        handles, sender = multiprocessing.Pipe()
+        # a socket reset by the client before the worker takes it is not connected anymore
+        reset = socket.socket()
+        a, b = socket.socketpair()
+        for sock in (reset, a):
+            multiprocessing.reduction.send_handle(sender, sock.fileno(), os.getpid())
+        sender.close()
+        _receive_sockets(Worker(), handles)
+        self.assertEqual(len(Worker.served), 1)
+        for sock in (reset, a, b):
+            sock.close()
+
+    def test_sockets_passed_threaded(self):
+        self.check_websocket('threaded')
+
+    def test_sockets_passed_asyncio(self):
+        self.check_websocket('asyncio')
+
+
+if __name__ == '__main__':
+    unittest.main()
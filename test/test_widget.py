@@ -17,6 +17,107 @@ class TestWidget(unittest.TestCase):
     def test_init(self):
         widget = gui.Widget()
         assertValidHTML(widget.repr())
+
+    def test_repr_patch(self):
+        container = gui.Container()
+        label = gui.Label('text')
+        container.append(label)
+        container.repr({})
+
+        container.css_color = 'red'
+        label.attributes['title'] = 'a &amp; b'
+        changed = {}
+        container.repr(changed)
+        self.assertEqual(changed[container], {'style': {'color': 'red'}})
+        self.assertEqual(changed[label], {'attributes': {'title': 'a & b'}})
+
+        del label.attributes['title']
+        changed = {}
+        container.repr(changed)
+        self.assertEqual(changed, {label: {'attributes': {'title': None}}})
+
+        # a text change is a patch as well
+        label.set_text('a < b')
+        changed = {}
+        container.repr(changed)
+        self.assertEqual(changed, {label: {'text': 'a < b'}})
+
+        # any other children change requires the whole html
+        container.append(gui.Label('other'))
+        changed = {}
+        container.repr(changed)
+        self.assertIn('other', changed[container])
+        label.add_child('text', '<b>markup</b>')
+        changed = {}
+        container.repr(changed)
+        self.assertIn('<b>markup</b>', changed[label])
+
+    def test_render_cache(self):
+        container = gui.Container()
+        labels = [gui.Label('label %s' % i) for i in range(3)]
+        container.append(labels)
+        html = container.repr()
+        fragments = list(container._render_fragments)
+        inner = container.innerHTML({})
+        # nothing changed, the cached innerHTML is returned as is
+        self.assertIs(container.innerHTML({}), inner)
+
+        labels[1].set_text('changed')
+        self.assertIn('changed', container.repr())
+        # only the slot of the changed child is rendered again
+        self.assertIs(container._render_fragments[0], fragments[0])
+        self.assertIsNot(container._render_fragments[1], fragments[1])
+        self.assertIs(container._render_fragments[2], fragments[2])
+
+        container.remove_child(labels[0])
+        self.assertNotIn('label 0', container.repr())
+        container.css_color = 'red'
+        self.assertNotIn('label 0', container.repr())
+        self.assertNotEqual(html, container.repr())
+
+        head = gui.HEAD(title='first')
+        head.repr()
+        head.set_title('second')
+        self.assertIn('second', head.repr())
+
+    def test_compact_leaves(self):
+        image = gui.Image('/res:logo.png')
+        html = image.repr()
+        # a leaf without style and children does not allocate them
+        self.assertIsNone(image._style)
+        self.assertIsNone(image._children)
+        self.assertNotIn('style', html)
+        self.assertIs(image.attributes.changed_keys, gui._NO_CHANGED_KEYS)
+        self.assertEqual(image.__dict__, {})
+
+        image.style['color'] = 'red'
+        self.assertIn('style="color:red"', image.repr())
+        self.assertEqual(image.children, {})
+        # the subclasses still accept new attributes
+        image.custom = 1
+        self.assertEqual(image.__dict__, {'custom': 1})
+
+    def test_lazy_event_connectors(self):
+        class ClickCounter(gui.Button):
+            clicks = 0
+            @gui.decorate_event
+            def onclick(self):
+                self.clicks += 1
+                return super(ClickCounter, self).onclick()
+
+        button = ClickCounter('a')
+        self.assertNotIn('onclick', button.__dict__)
+        self.assertIn('onclick', gui.EventSource._event_methods[ClickCounter])
+        # the class gets the event method, the instance its connector
+        self.assertTrue(hasattr(ClickCounter.onclick, '__is_event'))
+        self.assertIsInstance(button.onclick, gui.ClassEventConnector)
+        self.assertIs(button.onclick, button.onclick)
+        self.assertIsNot(gui.Button('b').onclick, button.onclick)
+
+        clicked = []
+        button.onclick.do(lambda emitter, *userdata: clicked.append((emitter, userdata)), 'x')
+        button.onclick()
+        self.assertEqual((button.clicks, clicked), (1, [(button, ('x',))]))
         
 class TestHTML(unittest.TestCase):
     def test_init(self):
@@ -28,6 +129,16 @@ class TestHEAD(unittest.TestCase):
         widget = gui.HEAD(title="my remi app")
         self.assertIn('my remi app', widget.repr())
         assertValidHTML(widget.repr())
+
+    def test_internal_js(self):
+        widget = gui.HEAD(title="my remi app")
+        widget.set_internal_js('123', '</script>', '1000', '500')
+        html = widget.repr()
+        self.assertIn('"appIdentifier": "123"', html)
+        self.assertIn('"messagingTimeout": 500', html)
+        # the settings can't close the script
+        self.assertEqual(html.count('</script>'), 2)
+        self.assertIn('src="/%s"' % gui.INTERNAL_JS_PATH, html)
         
 class TestBODY(unittest.TestCase):
     def test_init(self):
@@ -165,6 +276,61 @@ class TestDropDownItem(unittest.TestCase):
         self.assertIn('test drop down item', widget.repr())
         assertValidHTML(widget.repr())
         
+class TestVirtualListView(unittest.TestCase):
+    def test_init(self):
+        widget = gui.VirtualListView.new_from_list(['tag %d' % i for i in range(50000)], viewport_rows=10, buffer_rows=5)
+        html = widget.repr()
+        assertValidHTML(html)
+        # only 15 ListItem, without a listener each
+        self.assertEqual(list(widget.list.children.keys()), [str(i) for i in range(15)] + ['bottom'])
+        self.assertIn('tag 14', html)
+        self.assertNotIn('tag 15', html)
+        self.assertNotIn('onclick', widget.list.children['0'].attributes)
+
+    def test_filter_and_selection(self):
+        widget = gui.VirtualListView(['tag %d' % i for i in range(50000)], viewport_rows=10, buffer_rows=5)
+        selected = []
+        widget.onselection.do(lambda emitter, index, value: selected.append((index, value)))
+        widget.set_filter('G 4999')
+        # the keys are the indexes of the items
+        self.assertEqual(list(widget.list.children.keys()), ['4999'] + [str(i) for i in range(49990, 50000)])
+        widget._on_item_click('49995')
+        self.assertEqual(selected, [(49995, 'tag 49995')])
+        self.assertEqual(widget.list.children['49995'].attributes['selected'], True)
+        self.assertEqual(widget.get_value(), 'tag 49995')
+
+        widget.set_filter('')
+        self.assertEqual(widget.list.children['bottom'].style['height'], '%dpx' % ((50000 - 15) * 24))
+        widget.onscroll(str(49995 * 24), '240')
+        self.assertEqual(widget.list.children['49995'].attributes['selected'], True)
+        widget.select_by_value('missing')
+        self.assertIsNone(widget.get_index())
+        self.assertEqual(widget.list.children['49995'].attributes['selected'], False)
+
+        # a click arriving after the items changed is ignored
+        widget.set_filter('G 4999')
+        widget._on_item_click('10')
+        widget.set_items(['a'])
+        widget._on_item_click('49995')
+        widget._on_item_click('x')
+        self.assertEqual(selected, [(49995, 'tag 49995')])
+        self.assertIsNone(widget.get_index())
+
+class TestVirtualDropDown(unittest.TestCase):
+    def test_selection(self):
+        widget = gui.VirtualDropDown(['address %d' % i for i in range(50000)])
+        assertValidHTML(widget.repr())
+        changed = []
+        widget.onchange.do(lambda emitter, value: changed.append(value))
+        widget.input.oninput('ss 1234', 'false')
+        self.assertEqual(widget.list.style['display'], 'block')
+        self.assertEqual(len(widget.list._filtered), 11)
+        widget.list._on_item_click('12345')
+        self.assertEqual(changed, ['address 12345'])
+        self.assertEqual(widget.input.get_value(), 'address 12345')
+        self.assertEqual(widget.list.style['display'], 'none')
+        self.assertEqual(widget.get_value(), 'address 12345')
+
 class TestImage(unittest.TestCase):
     def test_init(self):
         widget = gui.Image('http://placekitten.com/200/200')
@@ -200,6 +366,77 @@ class TestTableTitle(unittest.TestCase):
         widget = gui.TableTitle()
         assertValidHTML(widget.repr())
         
+class TestVirtualTable(unittest.TestCase):
+    def test_init(self):
+        model = gui.ListTableModel([(i, 'name %d' % i) for i in range(10000)], titles=('id', 'name'))
+        widget = gui.VirtualTable(model, viewport_rows=10, buffer_rows=5)
+        html = widget.repr()
+        assertValidHTML(html)
+        # the title, the 15 rows from the first and the bottom spacer
+        self.assertEqual(list(widget.table.children.keys()), ['title'] + [str(i) for i in range(15)] + ['bottom'])
+        self.assertIn('name 14', html)
+        self.assertNotIn('name 15', html)
+        self.assertIn('height:299550px', html)
+
+    def test_scroll(self):
+        model = gui.ListTableModel([(i, 'name %d' % i) for i in range(10000)])
+        widget = gui.VirtualTable(model, row_height=20, viewport_rows=10, buffer_rows=4)
+        widget.repr()
+        kept = widget.table.children['5']
+        scrolled = []
+        widget.onscroll.do(lambda emitter, first, last: scrolled.append((first, last)))
+        widget.onscroll('100', '300')
+        self.assertEqual(scrolled, [(5, 20)])
+        self.assertEqual(list(widget.table.children.keys()), ['top'] + [str(i) for i in range(1, 24)] + ['bottom'])
+        # the rows still shown are not created again
+        self.assertIs(widget.table.children['5'], kept)
+        self.assertEqual((widget.attributes['data-scroll-min'], widget.attributes['data-scroll-max']), ('60', '440'))
+        changed = {}
+        widget.repr(changed)
+        self.assertIn(widget.table, changed)
+
+        widget.onscroll('199900', '300')
+        self.assertEqual(list(widget.table.children.keys())[-1], '9999')
+        self.assertEqual(widget.attributes['data-scroll-max'], 'Infinity')
+
+    def test_events(self):
+        model = gui.ListTableModel([['a', 'b'], ['c', 'd']])
+        widget = gui.VirtualTable(model, editable=True)
+        clicked = []
+        changed = []
+        widget.on_table_row_click.do(lambda emitter, row, item: clicked.append((emitter, widget.item_coords(item))))
+        widget.on_item_changed.do(lambda emitter, item, value, row, column: changed.append((value, row, column)))
+        item = widget.table.children['1'].children['0']
+        item.onclick()
+        self.assertEqual(clicked, [(widget, (1, 0))])
+        item.onchange(item.editInput, 'e')
+        self.assertEqual(changed, [('e', 1, 0)])
+        self.assertEqual(model.rows[1], ['e', 'd'])
+
+    def test_update_block(self):
+        model = gui.ColumnarTableModel([list(range(1000)), [0.0] * 1000, ['idle'] * 1000], titles=('pid', 'cpu', 'state'))
+        widget = gui.VirtualTable(model, viewport_rows=10, buffer_rows=0)
+        widget.repr()
+        model.update_block(slice(5, 15), slice(1, 3), [[i + 0.5, 'running'] for i in range(10)])
+        self.assertEqual(model.columns[1][5:15], [i + 0.5 for i in range(10)])
+        self.assertEqual(model.get_row(14), [14, 9.5, 'running'])
+        # only the items shown changed, each one patched with its new text
+        changed = {}
+        widget.repr(changed)
+        self.assertEqual(len(changed), 10)
+        self.assertEqual(changed[widget.table.children['9'].children['2']],
+                         {'text': 'running'})
+        self.assertNotIn('10', widget.table.children)
+
+        model.update_block(-1, 0, [[-1]])
+        self.assertEqual(model.columns[0][-1], -1)
+        self.assertRaises(ValueError, model.update_block, slice(0, 2), 0, [[1]])
+        # a ragged block is rejected before any change
+        self.assertRaises(ValueError, model.update_block, slice(0, 2), slice(1, 3), [[1, 'a'], [2]])
+        self.assertRaises(ValueError, model.update_block, slice(0, 2), slice(1, 3), [[1, 'a', 'b'], [2, 'c']])
+        self.assertEqual(model.get_row(0), [0, 0.0, 'idle'])
+        self.assertEqual(model.get_row(1), [1, 0.0, 'idle'])
+
 class TestInput(unittest.TestCase):
     def test_init(self):
         widget = gui.Input()
@@ -299,6 +536,70 @@ class TestFileUploader(unittest.TestCase):
     def test_init(self):
         widget = gui.FileUploader()
         assertValidHTML(widget.repr())
+
+    def test_upload(self):
+        import os
+        import shutil
+        import tempfile
+        savepath = tempfile.mkdtemp()
+        try:
+            widget = gui.FileUploader(savepath, max_size=10)
+            received = []
+            widget.ondata.do(lambda emitter, filedata, filename: received.append((filedata, filename)))
+            upload = widget.open_upload('../a.txt', 6)
+            upload.write(b'abc')
+            upload.write(b'def')
+            self.assertFalse(os.path.exists(os.path.join(savepath, 'a.txt')))
+            upload.close()
+            self.assertEqual(received, [(b'abcdef', 'a.txt')])
+            self.assertRaises(ValueError, widget.open_upload, 'b.txt', 11)
+            upload = widget.open_upload('b.txt', 6)
+            self.assertRaises(ValueError, upload.write, b'x' * 11)
+            upload.abort()
+            self.assertEqual(os.listdir(savepath), ['a.txt'])
+        finally:
+            shutil.rmtree(savepath)
+
+    def test_resumable_upload(self):
+        import os
+        import shutil
+        import tempfile
+        savepath = tempfile.mkdtemp()
+        try:
+            widget = gui.FileUploader(savepath, upload_timeout=60)
+            upload = widget.open_upload('a.txt', 6, 'a-1')
+            upload.check_chunk(0, 3)
+            upload.write(b'abc', 0)
+            self.assertFalse(upload.add_chunk(0, 3))
+            # sent again, it does not count twice
+            upload.check_chunk(0, 3)
+            upload.write(b'abc', 0)
+            self.assertFalse(upload.add_chunk(0, 3))
+            self.assertEqual((upload.loaded, upload.received), (3, 3))
+            # overlapping the chunks received, or out of the file
+            self.assertRaises(ValueError, upload.check_chunk, 1, 3)
+            self.assertRaises(ValueError, upload.check_chunk, 0, 4)
+            self.assertRaises(ValueError, upload.check_chunk, 4, 3)
+            upload.check_chunk(3, 3)
+            upload.write(b'def', 3)
+            self.assertTrue(upload.add_chunk(3, 3))
+            upload.close()
+            # a chunk arriving after the upload is complete is ignored
+            self.assertIsNone(widget.open_upload('a.txt', 6, 'a-1'))
+            self.assertEqual(widget.upload_status('a-1')[0], '[0, 3]')
+            self.assertEqual(os.listdir(savepath), ['a.txt'])
+
+            # an idle upload is discarded with its partial file
+            upload = widget.open_upload('b.txt', 6, 'b-1')
+            upload.write(b'abc', 0)
+            upload.add_chunk(0, 3)
+            upload.last_activity -= 61
+            self.assertEqual(widget.upload_status('b-1')[0], '[]')
+            self.assertEqual(os.listdir(savepath), ['a.txt'])
+            widget._finished['a-1'] = widget._finished['a-1'][:3] + (0,)
+            self.assertIsNotNone(widget.open_upload('a.txt', 6, 'a-1'))
+        finally:
+            shutil.rmtree(savepath)
         
 class TestFileDownloader(unittest.TestCase):
     def test_init(self):